@@ -0,0 +1,5 @@
+import sys
+
+from anafora4python import cli
+
+sys.exit(cli.main())
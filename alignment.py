@@ -0,0 +1,119 @@
+"""
+One-to-one alignment of two lists of entities by their spans, exactly, or leniently by overlap,
+containment or a Jaccard threshold, as THYME evaluations also report.
+
+Lenient candidates are found with a sweep line over the spans of both lists sorted by start, keeping
+the spans still open on each side in a heap by end, so that only spans that overlap are ever compared:
+O((n + m) log(n + m)) plus the number of overlapping pairs, rather than every pair.
+Each span of a disjoint entity is swept on its own, and a pair of entities shares the characters
+shared by any of their spans. Candidates are then assigned greedily, most similar first.
+"""
+
+import heapq
+from collections import defaultdict as dd
+
+# exact: the same spans
+# overlap: at least one character in common
+# contains: the spans of one entity cover all of the other's
+# jaccard: characters in common over characters of either at least the threshold
+MODES = ("exact", "overlap", "contains", "jaccard")
+
+def align_entities(entities, other_entities, mode="exact", threshold=0.5):
+  """
+  Return: a list of (entity, other entity) tuples of the aligned pairs in the order of entities,
+  then (entity, None) for the entities left, and (None, other entity) for the other entities left
+  """
+  return [(entities[i] if i is not None else None, other_entities[j] if j is not None else None)\
+          for i, j in align_indexes(entities, other_entities, mode, threshold)]
+
+def align_indexes(entities, other_entities, mode="exact", threshold=0.5):
+  """
+  Aligns each entity with at most one other entity of the same document (see Entity.get_doc_id) that matches
+  it in mode, taking first the pairs with the highest Jaccard similarity, then of the same type, then in order.
+
+  Return: a list of (index, other index) as for align_entities, with None where an entity is left
+  """
+  if mode not in MODES:
+    raise ValueError("mode must be one of %s, not %r" % (", ".join(MODES), mode))
+  if mode == "exact":
+    candidates = _exact_candidates(entities, other_entities)
+  else:
+    candidates = _lenient_candidates(entities, other_entities, mode, threshold)
+
+  candidates.sort()
+  pairs = {}
+  taken = set()
+  for _, _, i, j in candidates:
+    if i not in pairs and j not in taken:
+      pairs[i] = j
+      taken.add(j)
+
+  aligned = sorted(pairs.items())
+  aligned += [(i, None) for i in range(len(entities)) if i not in pairs]
+  aligned += [(None, j) for j in range(len(other_entities)) if j not in taken]
+  return aligned
+
+def span_length(spans):
+  """
+  Return: the number of characters covered by spans, a list of (start, end)
+  """
+  return sum(end - start for start, end in spans if end > start)
+
+
+def _exact_candidates(entities, other_entities):
+  """
+  Return: a list of (-similarity, whether the types differ, index, other index) of the pairs with the same spans
+  """
+  by_spans = dd(list)
+  for j, other in enumerate(other_entities):
+    by_spans[(other.get_doc_id(), tuple(other.spans))].append(j)
+  candidates = []
+  for i, ent in enumerate(entities):
+    for j in by_spans.get((ent.get_doc_id(), tuple(ent.spans)), ()):
+      candidates.append((-1.0, ent.type != other_entities[j].type, i, j))
+  return candidates
+
+def _lenient_candidates(entities, other_entities, mode, threshold):
+  lengths = ([span_length(ent.spans) for ent in entities], [span_length(ent.spans) for ent in other_entities])
+  candidates = []
+  for (i, j), shared in _shared_characters(entities, other_entities).items():
+    length, other_length = lengths[0][i], lengths[1][j]
+    similarity = shared / float(length + other_length - shared)
+    if mode == "contains":
+      matched = shared == min(length, other_length)
+    elif mode == "jaccard":
+      matched = similarity >= threshold
+    else:
+      matched = True
+    if matched:
+      candidates.append((-similarity, entities[i].type != other_entities[j].type, i, j))
+  return candidates
+
+def _shared_characters(entities, other_entities):
+  """
+  The sweep line: spans are visited by document and start, and each one is paired with the spans of
+  the other side that are still open, which all started before it and end after its start
+
+  Return: a dict of {(index, other index): number of characters their spans share}, for the pairs sharing any
+  """
+  events = []
+  for side, side_entities in enumerate((entities, other_entities)):
+    for i, ent in enumerate(side_entities):
+      doc_id = ent.get_doc_id()
+      events += [(doc_id, start, end, side, i) for start, end in ent.spans if end > start]
+  events.sort()
+
+  shared = dd(int)
+  doc_id = None
+  for event_doc_id, start, end, side, i in events:
+    if event_doc_id != doc_id:
+      doc_id = event_doc_id
+      open_spans = ([], [])
+    for heap in open_spans:
+      while heap and heap[0][0] <= start:
+        heapq.heappop(heap)
+    for other_end, j in open_spans[1 - side]:
+      pair = (i, j) if side == 0 else (j, i)
+      shared[pair] += min(end, other_end) - start
+    heapq.heappush(open_spans[side], (end, i))
+  return dict(shared)
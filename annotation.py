@@ -4,14 +4,120 @@ Expects a BeautifulSoup object from an XML document
 '''
 
 import re
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict as dd
+from collections import namedtuple
+from functools import cached_property, wraps
+
+from bs4 import BeautifulSoup
+
+from anafora4python import alignment
+
+# Relation properties whose values are entity IDs
+ENTITY_ID_PROPERTIES = ["firstinstance", "coreferring_string", "set", "subset", "whole", "part", "source", "target"]
+
+class AnnotationID(str):
+  """
+  An Anafora annotation ID, number@kind@doc ID@annotator such as 12@e@ID028_clinic_082@gold,
+  parsed once into num (the number as written), number (an int, or None if it is not one),
+  kind ("e" or "r"), doc_id and annotator.
+
+  It is the ID string itself, so it hashes and compares equal to the string and can be used wherever
+  the string is, but AnnotationIDs sort numerically, by number then kind, doc ID and annotator.
+  """
+  __slots__ = ("num", "number", "kind", "doc_id", "annotator", "sort_key")
+
+  def __new__(cls, id_string):
+    parsed = super(AnnotationID, cls).__new__(cls, id_string)
+    parts = id_string.split("@")
+    parsed.num = parts[0]
+    parsed.number = int(parts[0]) if parts[0].isdigit() else None
+    parsed.kind = parts[1] if len(parts) > 1 else ""
+    parsed.doc_id = parts[2] if len(parts) > 2 else ""
+    parsed.annotator = parts[3] if len(parts) > 3 else ""
+    parsed.sort_key = (parsed.number is None, parsed.number or 0, parsed.kind, parsed.doc_id, parsed.annotator, str(parsed))
+    return parsed
+
+  def __reduce__(self):
+    return (AnnotationID, (str(self),))
+
+  def __hash__(self):
+    return str.__hash__(self)
+
+  def __eq__(self, other):
+    return str.__eq__(self, other)
+
+  def __ne__(self, other):
+    return str.__ne__(self, other)
+
+  def __lt__(self, other):
+    if isinstance(other, AnnotationID):
+      return self.sort_key < other.sort_key
+    return str.__lt__(self, other)
+
+  def __le__(self, other):
+    if isinstance(other, AnnotationID):
+      return self.sort_key <= other.sort_key
+    return str.__le__(self, other)
+
+  def __gt__(self, other):
+    if isinstance(other, AnnotationID):
+      return self.sort_key > other.sort_key
+    return str.__gt__(self, other)
+
+  def __ge__(self, other):
+    if isinstance(other, AnnotationID):
+      return self.sort_key >= other.sort_key
+    return str.__ge__(self, other)
+
+
+class IDTable(object):
+  """
+  Interns AnnotationIDs, so that each ID is parsed once and the same object is shared by everything using it.
+  Each Document has one; give the Documents of a corpus the same one to intern IDs across it.
+  """
+  def __init__(self):
+    self._ids = {}
+
+  def __len__(self):
+    return len(self._ids)
+
+  def __call__(self, id_string):
+    """
+    Return: the AnnotationID for id_string
+    """
+    parsed = self._ids.get(id_string)
+    if parsed is None:
+      parsed = self._ids[id_string] = AnnotationID(id_string)
+    return parsed
+
 
 class AbstractXML(object):
   '''
   Parent class for all objects that represent an XML
   '''
+  _soup = None
+
   def __init__(self, soup):
     self.soup = soup
 
+  @property
+  def soup(self):
+    '''
+    The BeautifulSoup node, rebuilt first if it was released (see Document.release_soup)
+    '''
+    if self._soup is None:
+      self._restore_soup()
+    return self._soup
+
+  @soup.setter
+  def soup(self, soup):
+    self._soup = soup
+
+  def _restore_soup(self):
+    pass
+
   def get_attributes(self, cat, special_soup=None):
     if not special_soup:
       special_soup = self.soup
@@ -30,7 +136,7 @@ class AbstractXML(object):
     return {}
 
   def number_of_diffs(self, other_xml):
-    return 0
+    return len(self.diff(other_xml))
 
   def update_soup(self):
     pass
@@ -45,6 +151,129 @@ class AbstractXML(object):
     return xml
 
 class Annotation(AbstractXML):
+  # {sub tag: attribute} compared by diff()
+  diff_fields = {}
+  # (name, value) of every property, kept in place of the soup by Document.release_soup
+  _released_items = None
+
+  def diff(self, other_annotation):
+    '''
+    Returns a dict of {sub_tag: [list of the two conflicting values]}.
+    Conflicting properties are under "properties", as {property name: [the two values]},
+    with a value of None where only one annotation has the property.
+    Properties pointing at entities are left to Document.diff, which can match entities across documents.
+    '''
+    diffs_dict = {}
+
+    for tag, attr in self.diff_fields.items():
+      val, other_val = getattr(self, attr), getattr(other_annotation, attr)
+      if val != other_val:
+        diffs_dict[tag] = [val, other_val]
+
+    props = _property_values(self.properties)
+    other_props = _property_values(other_annotation.properties)
+    prop_diffs = {}
+    for name in set(props) | set(other_props):
+      if props.get(name) != other_props.get(name):
+        prop_diffs[name] = [props.get(name), other_props.get(name)]
+    if prop_diffs:
+      diffs_dict["properties"] = prop_diffs
+
+    return diffs_dict
+
+  def number_of_diffs(self, other_annotation):
+    diffs_dict = self.diff(other_annotation)
+    return len(diffs_dict) - ("properties" in diffs_dict) + len(diffs_dict.get("properties", {}))
+
+  @cached_property
+  def properties(self):
+    """
+    A list of Property objects for the properties with a value, made on first access.
+    If the property does not have a value, we can treat it as not existing
+    """
+    if self._released_items is not None:
+      return [Property(None, name, value, self, i) for i, (name, value) in enumerate(self._released_items) if value]
+    return [Property(tag, annotation=self) for tag in _valued_property_tags(self.soup)]
+
+  def property_items(self):
+    """
+    Return: a list of (name, value) for the properties with a value.
+    Until self.properties has been accessed these are read straight from the soup,
+    so that only looking at property values does not make Property objects
+    """
+    if "properties" in self.__dict__:
+      return [(prop.name, prop.value) for prop in self.properties]
+    return [(name, value) for name, value in self._all_property_items() if value]
+
+  def get_property(self, name):
+    """
+    Return: the value of the first property called name, or "" if there is none
+    """
+    for prop_name, value in self._all_property_items():
+      if prop_name == name:
+        return value
+    return ""
+
+  def get_property_list(self, name):
+    """
+    Return: the values of all the properties called name, with or without a value
+    """
+    return [value for prop_name, value in self._all_property_items() if prop_name == name]
+
+  def _all_property_items(self):
+    """
+    Return: a list of (name, value) for every property tag, with or without a value
+    """
+    if self._released_items is not None:
+      return self._released_items
+    if not self.soup.properties:
+      return []
+    return [(c.name, c.get_text()) for c in self.soup.properties.children if c.name]
+
+  def _property_changed(self, prop):
+    """
+    Called when the value of one of the annotation's properties is set, which it also is in the released items
+    """
+    if self._released_items is not None and prop.released_index is not None:
+      items = list(self._released_items)
+      items[prop.released_index] = (prop.name, prop.value)
+      self._released_items = items
+
+  def _release_soup(self):
+    if "properties" in self.__dict__:
+      for prop in self.__dict__.pop("properties"):
+        prop.update_soup()
+    self._released_items = self._all_property_items()
+    self._soup = None
+
+  def _restore_soup(self):
+    if self._released_items is not None:
+      self.document.restore_soup()
+
+  def _build_soup(self, doc_soup):
+    """
+    Makes a new node for the annotation from its soup_fields and properties, when its Document restores its soup
+    """
+    node = doc_soup.new_tag(self.tag_name)
+    for tag, attr in self.soup_fields:
+      child = doc_soup.new_tag(tag)
+      child.string = getattr(self, attr)
+      node.append(child)
+    properties = doc_soup.new_tag("properties")
+    if "properties" in self.__dict__:
+      items = [(prop.name, prop.value) for prop in self.__dict__.pop("properties")]
+    else:
+      items = self._released_items
+    for name, value in items:
+      child = doc_soup.new_tag(name)
+      if value:
+        child.string = value
+      properties.append(child)
+    node.append(properties)
+    self._soup = node
+    self._released_items = None
+    return node
+
   def remove(self):
     """
     An annotation is responsible for removing itself, because it means that we already have a handle
@@ -56,15 +285,155 @@ class Annotation(AbstractXML):
     return self.soup.extract()
 
 
+def _writer(method):
+  """
+  Makes a Document method hold the Document's writer lock, and make a new version once it is done
+  """
+  @wraps(method)
+  def locked(self, *args, **kwargs):
+    with self.lock:
+      try:
+        return method(self, *args, **kwargs)
+      finally:
+        self.version += 1
+  return locked
+
+
 class Document(AbstractXML):
-  def __init__(self, soup, filename):
+  """
+  With read_only, the BeautifulSoup tree is released once the document is loaded,
+  see release_soup()
+
+  Threads: a Document can be shared by threads that read it through snapshot(), an immutable Snapshot
+  of the current version that never touches the soup, and which they can keep using while it changes.
+  Changes hold lock, a writer lock, so that they happen one at a time, and each makes a new version.
+  add_entity, add_tlink, remove_annotations, reindex_entity and changed take it themselves;
+  for other changes, or several that readers should only see together, hold it with writing().
+  Reading the Document itself, rather than a Snapshot, is only safe while nothing changes it.
+
+  parse_filter: the corpus.ParseFilter the soup was parsed with, if only part of the file was loaded
+  registry: a registry.EntityRegistry that relations look up the entities not in this document in
+  """
+  _skeleton = None
+  registry = None
+
+  def __init__(self, soup, filename, read_only=False, ids=None, parse_filter=None):
     super(Document, self).__init__(soup)
     self.filename = filename
+    self.parse_filter = parse_filter
+    self.lock = threading.RLock()
+    # Incremented by every change made through the Document
+    self.version = 0
+    self._snapshot = None
+    # {annotation ID: EntityRecord or RelationRecord} of the last snapshot, reused by the next one
+    self._records = {}
+    # The IDTable interning the IDs of the annotations
+    self.ids = ids if ids is not None else IDTable()
     self.status = self.get_text_safe(self.soup.data.info.progress)
     self.savetime = self.get_text_safe(self.soup.data.info.savetime)
     #self.schema = Schema(self.soup.schema)
     self.entities_dict = {}
+    self._reset_entity_indexes()
     self._populate_entities()
+    self.relations_dict = {}
+    self._entity_relations = dd(set)
+    # {doc ID: {relation ID: relation}} of the relations between entities of that document only,
+    # and of the cross-doc relations with an entity in it
+    self._doc_relations = dd(dict)
+    self._doc_cross_relations = dd(dict)
+    self._populate_relations()
+    if read_only:
+      self.release_soup()
+
+  def __getstate__(self):
+    # Locks do not pickle, each copy gets its own
+    state = self.__dict__.copy()
+    del state["lock"]
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self.lock = threading.RLock()
+
+  def writing(self):
+    """
+    Holds the writer lock for the changes made in a with block, which readers see as one new version.
+    Annotations changed in place must also be passed to changed()
+    """
+    return _Writing(self)
+
+  @_writer
+  def changed(self, *annotations):
+    """
+    Call after changing annotations in place, so that the next snapshot sees them
+    """
+    for ann in annotations:
+      self._records.pop(ann.id, None)
+
+  def snapshot(self):
+    """
+    Return: the Snapshot of the current version, made first if there is none yet, without locking if there is
+    """
+    snapshot = self._snapshot
+    if snapshot is not None and snapshot.version == self.version:
+      return snapshot
+    with self.lock:
+      if self._snapshot is None or self._snapshot.version != self.version:
+        self._snapshot = self._make_snapshot()
+      return self._snapshot
+
+  def _make_snapshot(self):
+    """
+    Makes records only for the annotations that have none from the last snapshot
+    """
+    records = {}
+    entities = {}
+    for ent in self.get_entities():
+      record = self._records.get(ent.id)
+      if record is None:
+        record = EntityRecord(ent.id, tuple(ent.spans), ent.type, ent.parentsType, tuple(ent.property_items()))
+      records[ent.id] = entities[ent.id] = record
+    relations = {}
+    for rel in self.get_all_relations():
+      record = self._records.get(rel.id)
+      if record is None:
+        record = RelationRecord(rel.id, rel.type, rel.parentsType, tuple(rel.property_items()), tuple(rel.entity_ids()))
+      records[rel.id] = relations[rel.id] = record
+    self._records = records
+    return Snapshot(self.version, self.filename, entities, relations)
+
+  def release_soup(self):
+    """
+    Drops the BeautifulSoup tree, which takes most of the memory of a loaded document, keeping
+    the properties of each annotation as plain (name, value) pairs, and the rest of the file without its annotations.
+    Reading entities and relations works as before. The tree is rebuilt from the annotations, in the order of
+    entities_dict then relations_dict, as soon as anything needs it: any change through the Document, pp(),
+    or the soup of any annotation. Entities with duplicate IDs only keep the one in entities_dict.
+    """
+    with self.lock:
+      if self._soup is None:
+        return
+      for ann in self.get_entities() + self.get_all_relations():
+        ann._release_soup()
+      self._soup.annotations.clear()
+      self._skeleton = str(self._soup)
+      self._soup = None
+
+  def restore_soup(self):
+    """
+    Rebuilds the BeautifulSoup tree dropped by release_soup, if it was
+    """
+    with self.lock:
+      if self._skeleton is None:
+        return
+      doc_soup = BeautifulSoup(self._skeleton, "xml")
+      self._skeleton = None
+      self._soup = doc_soup
+      for ann in self.get_entities() + self.get_all_relations():
+        doc_soup.annotations.append(ann._build_soup(doc_soup))
+
+  def _restore_soup(self):
+    self.restore_soup()
 
   def _populate_entities(self):
     """
@@ -72,8 +441,296 @@ class Document(AbstractXML):
     and the entities_dict attr, a dict of {entity ID: entity object}
     """
     for ent_soup in self.soup.annotations.find_all("entity"):
-      ent = Entity(ent_soup)
+      ent = Entity(ent_soup, self)
       self.entities_dict[ent.id] = ent
+      self._index_entity(ent, loading=True)
+    for span_index in self._span_index.values():
+      span_index.sort()
+
+  def _populate_relations(self):
+    """
+    populates the relations_dict attr, a dict of {relation ID: relation object},
+    holding a Relation of the matching subclass for each relation in the soup
+    """
+    for rel_soup in self.soup.annotations.find_all("relation"):
+      self._index_relation(_make_relation(rel_soup, self))
+
+  def _index_relation(self, rel):
+    """
+    Adds rel to relations_dict, and to _entity_relations, which maps each entity ID
+    to the set of IDs of the relations pointing at it
+    """
+    self.relations_dict[rel.id] = rel
+    self._link_relation(rel)
+
+  def _unindex_relation(self, rel_id):
+    rel = self.relations_dict.pop(rel_id, None)
+    if rel is None:
+      return
+    self._unlink_relation(rel)
+
+  def _link_relation(self, rel):
+    rel._indexed_entity_ids = rel.entity_ids()
+    for ent_id in rel._indexed_entity_ids:
+      self._entity_relations[ent_id].add(rel.id)
+    self._partition_relation(rel)
+
+  def _unlink_relation(self, rel):
+    """
+    Uses the entity IDs recorded at indexing time, so this is safe to call
+    after the relation itself has been modified
+    """
+    for ent_id in rel._indexed_entity_ids:
+      rel_ids = self._entity_relations.get(ent_id)
+      if rel_ids is not None:
+        rel_ids.discard(rel.id)
+        if not rel_ids:
+          del self._entity_relations[ent_id]
+    self._unpartition_relation(rel)
+
+  def _partition_relation(self, rel):
+    """
+    Works out the documents of rel's entities once, and adds rel to the partitions of those documents.
+    A relation without entities goes with the document in its own ID.
+    """
+    rel._entity_doc_ids = rel._find_entity_documents()
+    doc_ids = rel._entity_doc_ids or frozenset([rel.get_doc_id()])
+    if len(doc_ids) == 1:
+      self._doc_relations[next(iter(doc_ids))][rel.id] = rel
+    else:
+      for doc_id in doc_ids:
+        self._doc_cross_relations[doc_id][rel.id] = rel
+
+  def _unpartition_relation(self, rel):
+    doc_ids = rel._entity_doc_ids or frozenset([rel.get_doc_id()])
+    for partitions in (self._doc_relations, self._doc_cross_relations):
+      for doc_id in doc_ids:
+        partition = partitions.get(doc_id)
+        if partition is not None:
+          partition.pop(rel.id, None)
+          if not partition:
+            del partitions[doc_id]
+
+  def get_relations_with_entity(self, entity_id):
+    """
+    Return: a list of the relations that point at the entity with the given ID
+    """
+    return [self.relations_dict[rel_id] for rel_id in self._entity_relations.get(entity_id, ())]
+
+  def resolve_entity(self, entity_id):
+    """
+    Return: the entity with the given ID in this document, or else in another document of the registry
+    if there is one, or None
+    """
+    ent = self.entities_dict.get(entity_id)
+    if ent is None and self.registry is not None:
+      ent = self.registry.get(entity_id)
+    return ent
+
+  def dangling_entity_ids(self):
+    """
+    Return: a dict of {entity ID: set of relation IDs} for the entities that relations point at
+    but that are not in the document, such as those left out by a corpus.ParseFilter
+    """
+    return {ent_id: set(rel_ids) for ent_id, rel_ids in self._entity_relations.items() if ent_id not in self.entities_dict}
+
+  def _reset_entity_indexes(self):
+    """
+    Secondary indexes over the entities, each a dict of {key: set of entity IDs}.
+    They are built once at load time and kept up to date by add_entity and remove_entity,
+    so that query() and the helpers built on it never rescan the document.
+
+    _span_index is a dict of {doc ID: sorted list of (start, end, entity ID)}, one per span
+    of the entities of that document, since spans in different documents do not compare.
+    """
+    self._entity_indexes = {name: dd(set) for name in\
+                            ("type", "parentsType", "prop", "prop_value", "annotator", "doc_id", "preannotated")}
+    self._entity_index_keys = {}
+    self._entity_order = {}
+    self._next_entity_order = 0
+    self._span_index = dd(list)
+
+  def _entity_keys(self, ent):
+    """
+    Return: a list of (index name, key) pairs that ent should be found under
+    """
+    keys = [("type", ent.type), ("parentsType", ent.parentsType),
+            ("annotator", ent.id.annotator), ("doc_id", ent.get_doc_id()),
+            ("preannotated", ent.preannotated())]
+    for name, value in ent.property_items():
+      keys.append(("prop", name))
+      keys.append(("prop_value", (name, value)))
+
+    return keys
+
+  def _index_entity(self, ent, loading=False):
+    """
+    While loading, spans are appended, and _populate_entities sorts each span index once at the end
+    """
+    keys = self._entity_keys(ent)
+    for index, key in keys:
+      self._entity_indexes[index][key].add(ent.id)
+    self._entity_index_keys[ent.id] = (keys, list(ent.spans), ent.get_doc_id())
+    self._entity_order[ent.id] = self._next_entity_order
+    self._next_entity_order += 1
+    span_index = self._span_index[ent.get_doc_id()]
+    for start, end in ent.spans:
+      if loading:
+        span_index.append((start, end, ent.id))
+      else:
+        insort(span_index, (start, end, ent.id))
+
+  def _unindex_entity(self, ent_id):
+    """
+    Uses the keys recorded at indexing time, so this is safe to call
+    after the entity itself has been modified
+    """
+    keys, spans, doc_id = self._entity_index_keys.pop(ent_id, ([], [], None))
+    for index, key in keys:
+      ids = self._entity_indexes[index][key]
+      ids.discard(ent_id)
+      if not ids:
+        del self._entity_indexes[index][key]
+    self._entity_order.pop(ent_id, None)
+    for start, end in spans:
+      span_index = self._span_index[doc_id]
+      i = bisect_left(span_index, (start, end, ent_id))
+      if i < len(span_index) and span_index[i] == (start, end, ent_id):
+        del span_index[i]
+    if spans and not self._span_index[doc_id]:
+      del self._span_index[doc_id]
+
+  @_writer
+  def remap_spans(self, remap, doc_id=None):
+    """
+    Moves the spans of many entities at once, such as after edits to the raw text (see edits.EditLog),
+    rebuilding the span index in one pass rather than reindexing entity by entity.
+
+    remap: a function from an Entity to its new list of spans
+    doc_id: only remap the entities of this document
+
+    Return: the entities whose spans changed
+    """
+    changed = []
+    for ent in (self.query(doc_id=doc_id) if doc_id is not None else self.get_entities()):
+      spans = [(int(start), int(end)) for start, end in remap(ent)]
+      if spans == ent.spans:
+        continue
+      ent._spans = spans
+      ent.span_string = ";".join("%d,%d" % span for span in spans)
+      if ent._soup is not None:
+        ent._soup.span.string = ent.span_string
+      keys, _, ent_doc_id = self._entity_index_keys[ent.id]
+      self._entity_index_keys[ent.id] = (keys, list(spans), ent_doc_id)
+      self._records.pop(ent.id, None)
+      changed.append(ent)
+
+    if changed:
+      self._span_index = dd(list)
+      for ent_id, (_, spans, ent_doc_id) in self._entity_index_keys.items():
+        self._span_index[ent_doc_id] += [(start, end, ent_id) for start, end in spans]
+      for span_index in self._span_index.values():
+        span_index.sort()
+    return changed
+
+  @_writer
+  def reindex_entity(self, ent):
+    """
+    Makes query() and the next snapshot see the new type, spans or properties of an entity changed in place.
+    Setting them calls this; call it by hand after changing the list of spans itself
+    """
+    self._records.pop(ent.id, None)
+    order = self._entity_order.get(ent.id)
+    self._unindex_entity(ent.id)
+    self._index_entity(ent)
+    if order is not None:
+      self._entity_order[ent.id] = order
+
+  @_writer
+  def reindex_relation(self, rel):
+    """
+    Makes get_relations_with_entity() and the next snapshot see the new properties of a relation changed in place,
+    such as the entities it points at. Setting the value of a property calls this
+    """
+    self._records.pop(rel.id, None)
+    self._unlink_relation(rel)
+    self._link_relation(rel)
+
+  def _ids_within_span(self, span, doc_ids=None):
+    """
+    Return: the set of IDs of entities of the documents in doc_ids, or of any document,
+    with at least one span inside span (inclusive), found by bisecting the sorted span index of each
+    """
+    start, end = int(span[0]), int(span[1])
+    if doc_ids is None:
+      doc_ids = list(self._span_index)
+    ids = set()
+    for doc_id in doc_ids:
+      span_index = self._span_index.get(doc_id, ())
+      i = bisect_left(span_index, (start,))
+      while i < len(span_index) and span_index[i][0] <= end:
+        if span_index[i][1] <= end:
+          ids.add(span_index[i][2])
+        i += 1
+
+    return ids
+
+  def _index_lookup(self, index, values):
+    """
+    Return: the set of IDs under any of values in the given index
+    """
+    if not isinstance(values, (list, set, frozenset)):
+      values = [values]
+    ids = set()
+    for value in values:
+      ids |= self._entity_indexes[index].get(value, set())
+
+    return ids
+
+  def query(self, type=None, parentsType=None, prop=None, span_within=None,\
+            doc_id=None, annotator=None, preannotated=None):
+    """
+    Return: a list of the entities matching every given filter, in document order.
+
+    type, parentsType, doc_id and annotator take a value or a list of values (any of which may match).
+    prop takes a property name, a (name, value) tuple, or a list of those (all of which must match).
+    span_within takes a (start, end) tuple, and matches entities with a span inside it,
+    like get_annotations_by_span.
+    preannotated takes a Boolean.
+
+    The filters are answered from the secondary indexes and intersected smallest first.
+    With both span_within and doc_id, only the span indexes of those documents are searched.
+    """
+    candidates = []
+    for index, values in (("type", type), ("parentsType", parentsType),\
+                          ("doc_id", None if span_within is not None else doc_id), ("annotator", annotator)):
+      if values is not None:
+        candidates.append(self._index_lookup(index, values))
+    if preannotated is not None:
+      candidates.append(self._index_lookup("preannotated", bool(preannotated)))
+    if prop is not None:
+      props = prop if isinstance(prop, list) else [prop]
+      for p in props:
+        if isinstance(p, tuple):
+          candidates.append(self._index_lookup("prop_value", p))
+        else:
+          candidates.append(self._index_lookup("prop", p))
+    if span_within is not None:
+      if doc_id is not None and not isinstance(doc_id, (list, set, frozenset)):
+        doc_id = [doc_id]
+      candidates.append(self._ids_within_span(span_within, doc_id))
+
+    if not candidates:
+      return self.get_entities()
+
+    candidates.sort(key=len)
+    ids = set(candidates[0])
+    for other in candidates[1:]:
+      ids &= other
+      if not ids:
+        break
+
+    return [self.entities_dict[i] for i in sorted(ids, key=self._entity_order.get)]
 
   def get_entities(self):
     """
@@ -81,45 +738,41 @@ class Document(AbstractXML):
     """
     return list(self.entities_dict.values())
 
+  def doc_ids(self):
+    """
+    Return: the IDs of the documents that the entities belong to, more than one for cross-doc files
+    """
+    return list(self._entity_indexes["doc_id"].keys())
+
+  def view(self, doc_id):
+    """
+    Return: a DocumentView of the entities and relations of one of the documents of a cross-doc file
+    """
+    return DocumentView(self, doc_id)
+
   def get_sorted_entity_ids(self):
     """
     Return: a list of all entity ids in the Document from lowest to highest int
     """
-    return list(sorted(self.entities_dict.keys()))
+    return sorted(ent.id for ent in self.get_entities())
 
   def get_tlinks(self):
     """
     Return: A list of Tlink objects for all Tlinks in the document.
-
-    This traverses the beautiful soup structure each time it is called.
     """
-    tlink_soups = self.soup.annotations.find_all('type',\
-                   text='TLINK')
-    tlink_soups = tlink_soups if tlink_soups else []
-
-    return [Tlink(tlink_soup.find_parent('relation'), self)\
-             for tlink_soup in tlink_soups]
+    return [rel for rel in self.get_all_relations() if isinstance(rel, Tlink)]
 
   def get_contains_subevent_tlinks(self):
     """
     Return: A list of ContainsSubevent objects for all
      CONTAINS-SUBEVENT Tlinks in the document.
-
-    This traverses the beautiful soup structure each time it is called.
     """
-    cons_sub_soups = self.soup.annotations.find_all('Type',\
-                      text='CONTAINS-SUBEVENT')
-    cons_sub_soups = cons_sub_soups if cons_sub_soups else []
-
-    return [ContainsSubevent(cons_sub_soup.find_parent('relation'), self)\
-            for cons_sub_soup in cons_sub_soups]
+    return [rel for rel in self.get_all_relations() if isinstance(rel, ContainsSubevent)]
 
   def get_cross_doc_contains_subevent_tlinks(self):
     """
     Return: A list of ContainsSubevent objects for all
      CONTAINS-SUBEVENT Tlinks in the document that are cross-doc.
-
-    This traverses the beautiful soup structure each time it is called.
     """
 
     return [con_sub for con_sub in self.get_contains_subevent_tlinks() if con_sub.is_cross_doc()]
@@ -128,8 +781,6 @@ class Document(AbstractXML):
     """
     Return: A list of ContainsSubevent objects for all
      CONTAINS-SUBEVENT Tlinks in the document that are within-doc.
-
-    This traverses the beautiful soup structure each time it is called.
     """
 
     return [con_sub for con_sub in self.get_contains_subevent_tlinks() if not con_sub.is_cross_doc()]
@@ -138,22 +789,13 @@ class Document(AbstractXML):
     """
     Return: A list of IdenticalChain objects for all
      Identical relations in the document.
-
-    This traverses the beautiful soup structure each time it is called.
     """
-    ident_soups = self.soup.annotations.find_all('type',\
-                   text='Identical')
-    ident_soups = ident_soups if ident_soups else []
-
-    return[IdenticalChain(ident_soup.find_parent('relation'), self)\
-           for ident_soup in ident_soups]
+    return [rel for rel in self.get_all_relations() if isinstance(rel, IdenticalChain)]
 
   def get_cross_doc_identical_chains(self):
     """
     Return: A list of IDENT objects for all
     IDENTs in the document that are cross-doc.
-
-    This traverses the beautiful soup structure each time it is called.
     """
     return [ident for ident in self.get_identical_chains() if ident.is_cross_doc()]
 
@@ -161,8 +803,6 @@ class Document(AbstractXML):
     """
     Return: A list of IDENT objects for all
     IDENTs in the document that are within-doc.
-
-    This traverses the beautiful soup structure each time it is called.
     """
     return [ident for ident in self.get_identical_chains() if not ident.is_cross_doc()]
 
@@ -170,22 +810,13 @@ class Document(AbstractXML):
     """
     Return: A list of SetSubset objects for all
      Set/Subset relations in the document.
-
-    This traverses the beautiful soup structure each time it is called.
     """
-    s_ss_soups = self.soup.annotations.find_all('type', \
-                                                text='Set/Subset')
-    s_ss_soups = s_ss_soups if s_ss_soups else []
-
-    return [SetSubset(s_ss_soup.find_parent('relation'), self) \
-            for s_ss_soup in s_ss_soups]
+    return [rel for rel in self.get_all_relations() if isinstance(rel, SetSubset)]
 
   def get_cross_doc_set_subsets(self):
     """
     Return: A list of SetSubset objects for all
      Set/Subset relations in the document that are crossdoc.
-
-    This traverses the beautiful soup structure each time it is called.
     """
     return [s_ss for s_ss in self.get_set_subsets() if s_ss.is_cross_doc()]
 
@@ -193,8 +824,6 @@ class Document(AbstractXML):
     """
     Return: A list of SetSubset objects for all
      Set/Subset relations in the document that are within-doc.
-
-    This traverses the beautiful soup structure each time it is called.
     """
     return [s_ss for s_ss in self.get_set_subsets() if not s_ss.is_cross_doc()]
 
@@ -202,21 +831,13 @@ class Document(AbstractXML):
     """
     Return: A list of WholePart objects for all
      Whole/Part relations in the document.
-
-    This traverses the beautiful soup structure each time it is called.
     """
-    w_p_soups = self.soup.annotations.find_all('type', text='Whole/Part')
-    w_p_soups = w_p_soups if w_p_soups else []
-
-    return [WholePart(w_p_soup.find_parent('relation'), self) \
-            for w_p_soup in w_p_soups]
+    return [rel for rel in self.get_all_relations() if isinstance(rel, WholePart)]
 
   def get_cross_doc_whole_parts(self):
     """
     Return: A list of WholePart objects for all
      Whole/Part relations in the document that are crossdoc.
-
-    This traverses the beautiful soup structure each time it is called.
     """
     return [w_p for w_p in self.get_whole_parts() if w_p.is_cross_doc()]
 
@@ -224,25 +845,20 @@ class Document(AbstractXML):
     """
     Return: A list of WholePart objects for all
      Whole/Part relations in the document that are within-doc.
-
-    This traverses the beautiful soup structure each time it is called.
     """
     return [w_p for w_p in self.get_whole_parts() if not w_p.is_cross_doc()]
 
   def get_all_relations(self):
     """
     Return all relations of any type
-
-    This traverses the beautiful soup structure each time it is called.
     """
-    return [Relation(rel_soup, self) for rel_soup in\
-            self.soup.annotations.find_all("relation")]
+    return list(self.relations_dict.values())
 
   def get_single_doc_idents(self):
     return [ident for ident in self.get_identical_chains() if ident.single_doc()]
 
   def entity_types(self):
-    return list(set([entity.type for entity in self.get_entities()]))
+    return list(self._entity_indexes["type"].keys())
 
   def contains_span(self, span):
     """
@@ -271,22 +887,7 @@ class Document(AbstractXML):
     Given a span (tuple of numbers),
     return all annotations within it's range
     """
-    annotations = []
-
-    start, end = span
-    span_range = range(int(start), int(end)+1)
-
-    for ann in self.get_annotations():
-      if doc_id is not None:
-        if ann.get_doc_id() != doc_id:
-          continue
-      # Check entire 'spans' list to account for disjoint spans
-      for span in ann.spans:
-        start, end = span
-        if start in span_range and end in span_range:
-          annotations.append(ann)
-
-    return annotations
+    return self.query(span_within=span, doc_id=doc_id)
 
   def get_tlinks_by_span(self, span, doc_id):
     """
@@ -302,54 +903,101 @@ class Document(AbstractXML):
     '''
     This is just for entities for now
     '''
-    return list(set([propname for entity in self.get_entities() for propname in entity.property_names()]))
+    return list(self._entity_indexes["prop"].keys())
 
   def annotator(self):
     for entity in self.get_entities():
       # Find first entity that is not preannotated, and return that as it will ahve the name of the annotator
-      if entity.id.split("@")[-1] != "gold":
-        return entity.id.split("@")[-1]
+      if entity.id.annotator != "gold":
+        return entity.id.annotator
     # If no entity id's have annotator name in them, return gold or empty string
     try:
-      return self.get_entities()[0].id.split("@")[-1]
+      return self.get_entities()[0].id.annotator
     except:
       return ""
 
   def get_preannotated_entities(self):
-    return [e for e in self.get_entities() if e.preannotated()]
+    return self.query(preannotated=True)
 
   def get_annotator_annotated_entities(self):
-    return [e for e in self.get_entities() if not e.preannotated()]
+    return self.query(preannotated=False)
 
-  def align_entities_with(self, other_document):
+  def align_entities_with(self, other_document, mode="exact", threshold=0.5):
     """
     Returns list of tuples where tuple[0] is an entity from document
     and tuple[1] is the aligned entity from other document.
     Where there is no alignment, the list will have None
-    in the position of the document with no aligned entity
+    in the position of the document with no aligned entity.
+
+    mode: how spans have to match, one of alignment.MODES, with threshold for "jaccard"
     """
-    aligned = []
-    leftover_anns = []
-    anns = self.get_annotations()[::]
-    other_anns = other_document.get_annotations()[::]
+    return alignment.align_entities(self.get_annotations(), other_document.get_annotations(), mode, threshold)
 
-    for i, ann in enumerate(anns):
-      match = False
-      for j, other_ann in enumerate(other_anns):
-        if ann.is_aligned_with(other_ann):
-          aligned.append((ann, other_ann))
-          # These 2 are aligned, so safely remove annotation from other_anns
-          other_anns.pop(j)
-          match = True
-          break
-      if not match:
-        leftover_anns.append(ann)
+  def diff(self, other_document, match_ids=True):
+    """
+    A structural diff against another version of this document, or another annotator's copy of it.
 
-    # Add those with no alignment
-    aligned += [(ann, None) for ann in leftover_anns]
-    aligned += [(None, other_ann) for other_ann in other_anns] # Other anns will only have leftovers
+    Entities are matched by ID (unless match_ids is False), then the rest by doc ID and span,
+    preferring an entity of the same type. Relations are matched by a canonical key of their type
+    and the matched entities they point to, so a relation only has to point at the same annotations,
+    not the same IDs. Everything is matched through dicts, so this is linear in the size of the documents.
 
-    return aligned
+    Return: a list of edits, each a dict of
+      {"op": "added", "removed" or "changed", "kind": "entity" or "relation",
+       "id": ID in this document or None, "other_id": ID in other_document or None,
+       "changes": the Entity.diff or Relation.diff of a changed pair, else {}}
+    """
+    edits = []
+    # Each matched pair of entities shares a token, which stands in for
+    # both of their IDs in the relation keys
+    tokens = {}
+    other_tokens = {}
+    for n, (ent, other_ent) in enumerate(self._match_entities(other_document, match_ids)):
+      if ent and other_ent:
+        tokens[ent.id] = other_tokens[other_ent.id] = "#%d" % n
+      edits.append(_make_edit("entity", ent, other_ent))
+
+    other_rels = dd(list)
+    for other_rel in other_document.get_all_relations():
+      other_rels[_relation_key(other_rel, other_tokens)].append(other_rel)
+    for rel in self.get_all_relations():
+      candidates = other_rels.get(_relation_key(rel, tokens))
+      edits.append(_make_edit("relation", rel, candidates.pop(0) if candidates else None))
+    for leftover in other_rels.values():
+      edits += [_make_edit("relation", None, other_rel) for other_rel in leftover]
+
+    return [edit for edit in edits if edit]
+
+  def _match_entities(self, other_document, match_ids=True):
+    """
+    Return: a list of (entity, other entity) tuples, with None on either side of an unmatched entity
+    """
+    pairs = []
+    leftovers = []
+    others = dict(other_document.entities_dict)
+    for ent in self.get_entities():
+      other_ent = others.pop(ent.id, None) if match_ids else None
+      if other_ent is None:
+        leftovers.append(ent)
+      else:
+        pairs.append((ent, other_ent))
+
+    by_span = dd(list)
+    for other_ent in others.values():
+      by_span[(other_ent.get_doc_id(), other_ent.span_string)].append(other_ent)
+    for ent in leftovers:
+      candidates = by_span.get((ent.get_doc_id(), ent.span_string))
+      if candidates:
+        same_type = [c for c in candidates if c.type == ent.type]
+        other_ent = (same_type or candidates)[0]
+        candidates.remove(other_ent)
+        del others[other_ent.id]
+        pairs.append((ent, other_ent))
+      else:
+        pairs.append((ent, None))
+
+    pairs += [(None, other_ent) for other_ent in others.values()]
+    return pairs
 
   def get_annotations(self):
     """
@@ -361,13 +1009,13 @@ class Document(AbstractXML):
     """
     returns the highest id on any entity in the document
     """
-    return max([int(ent.id.split("@")[0]) for ent in self.get_entities()])
+    return max([ent.id.number for ent in self.get_entities()])
 
   def max_relation_id_integer(self):
     """
     returns the highest id on any relation in the document
     """
-    return max([int(rel.id.split("@")[0]) for rel in self.get_all_relations()])
+    return max([rel.id.number for rel in self.get_all_relations()])
 
   def get_contains_subevent_tuples(self):
     """
@@ -377,6 +1025,7 @@ class Document(AbstractXML):
     """
     return [cons_sub.entity_tuple for cons_sub in self.get_contains_subevent_tlinks()]
 
+  @_writer
   def add_entity(self, annotator, _span, _type, _parentsType):
     #TODO need to investigate if this is incorrect in the case of a cross-doc file, which will have a simpler docname
     docname = self.filename.split(".")[0]
@@ -403,15 +1052,89 @@ class Document(AbstractXML):
     new_ent.append(properties)
     self.soup.annotations.append(new_ent)
     # Add to document
-    ent_obj = Entity(new_ent)
+    ent_obj = Entity(new_ent, self)
+    self._records.pop(ent_obj.id, None)
     self.entities_dict[ent_obj.id] = ent_obj
+    self._index_entity(ent_obj)
 
     return new_ent
 
+  def remove_entity(self, entity, cascade=None):
+    """
+    Removes the entity from the soup, the entities_dict and the secondary indexes.
+    See remove_annotations for cascade.
+
+    Return: the soup that was removed
+    """
+    return self.remove_annotations([entity], cascade=cascade)[0]
+
+  @_writer
+  def remove_annotations(self, annotations, cascade=None):
+    """
+    Removes many entities and/or relations at once, detaching their nodes
+    with a single scan of each parent node rather than one per annotation,
+    and updating entities_dict, relations_dict and the indexes.
+
+    cascade decides what happens to the relations pointing at a removed entity:
+      None: they are left as they are, pointing at IDs that no longer exist
+      "remove": they are removed too
+      "prune": the properties pointing at removed entities are removed from them
+
+    Return: a list of the soups that were removed, annotations first
+    """
+    self.restore_soup()
+    entities = {}
+    relations = {}
+    for ann in annotations:
+      if isinstance(ann, Relation):
+        relations[ann.id] = ann
+      else:
+        entities[ann.id] = ann
+
+    affected = set()
+    for ent_id in entities:
+      affected |= self._entity_relations.get(ent_id, set())
+    affected -= set(relations)
+
+    nodes = []
+    if cascade == "remove":
+      for rel_id in affected:
+        relations[rel_id] = self.relations_dict[rel_id]
+    elif cascade == "prune":
+      for rel_id in affected:
+        rel = self.relations_dict[rel_id]
+        self._unpartition_relation(rel)
+        for prop in rel.properties[::]:
+          if prop.value in entities and prop.name.lower() in ENTITY_ID_PROPERTIES:
+            rel.properties.remove(prop)
+            nodes.append(prop.soup)
+            self._entity_relations[prop.value].discard(rel_id)
+        self._partition_relation(rel)
+        self._records.pop(rel_id, None)
+    elif cascade is not None:
+      raise ValueError("cascade must be None, 'remove' or 'prune', not %r" % (cascade,))
+
+    for ent_id, ent in entities.items():
+      self.entities_dict.pop(ent_id, None)
+      self._unindex_entity(ent_id)
+      self._records.pop(ent_id, None)
+    for rel_id in relations:
+      self._unindex_relation(rel_id)
+      self._records.pop(rel_id, None)
+    for ent_id in entities:
+      if not self._entity_relations.get(ent_id, True):
+        del self._entity_relations[ent_id]
+
+    removed = [ann.soup for ann in list(entities.values()) + list(relations.values())]
+    _extract_all(removed + nodes)
+    return removed
+
+  @_writer
   def add_tlink(self, _source_id, _target_id, _parentsType, _subtype):
     # Crossdoc/single doc distinction
-    if _source_id.split("@")[2] == _target_id.split("@")[2]:
-      docname = _source_id.split("@")[2]
+    source_id, target_id = self.ids(_source_id), self.ids(_target_id)
+    if source_id.doc_id == target_id.doc_id:
+      docname = source_id.doc_id
     else:
       docname = self.filename.split(".")[0]
 
@@ -450,8 +1173,9 @@ class Document(AbstractXML):
     new_rel.append(properties)
     self.soup.annotations.append(new_rel)
     # Add to document
-    rel_obj = Relation(new_rel, self)
-    self.get_tlinks().append(rel_obj)
+    rel_obj = _make_relation(new_rel, self)
+    self._records.pop(rel_obj.id, None)
+    self._index_relation(rel_obj)
 
     return new_rel
 
@@ -468,6 +1192,180 @@ class Document(AbstractXML):
       rel.update_soup()
 
 
+class _Writing(object):
+  """
+  The context manager of Document.writing()
+  """
+  def __init__(self, document):
+    self.document = document
+
+  def __enter__(self):
+    self.document.lock.acquire()
+    return self.document
+
+  def __exit__(self, *args):
+    self.document.version += 1
+    self.document.lock.release()
+
+
+# Immutable records of an entity or relation in a Snapshot, with the (name, value) of its properties with a value
+EntityRecord = namedtuple("EntityRecord", ["id", "spans", "type", "parentsType", "properties"])
+RelationRecord = namedtuple("RelationRecord", ["id", "type", "parentsType", "properties", "entity_ids"])
+
+
+class Snapshot(object):
+  """
+  A Document at one version, as EntityRecords and RelationRecords in document order, with the indexes
+  to look them up built once. Nothing in it changes, and reading it never touches the soup or the Document,
+  so any number of threads can read it at once without locks. The records of annotations
+  that did not change are shared with the snapshots of the versions before and after.
+  """
+  def __init__(self, version, filename, entities, relations):
+    self.version = version
+    self.filename = filename
+    # {ID: record}
+    self.entities = entities
+    self.relations = relations
+    by_type = dd(list)
+    span_index = dd(list)
+    for order, record in enumerate(entities.values()):
+      by_type[record.type].append(record)
+      for start, end in record.spans:
+        span_index[record.id.doc_id].append((start, end, order))
+    entity_relations = dd(list)
+    for record in relations.values():
+      for ent_id in record.entity_ids:
+        entity_relations[ent_id].append(record)
+    self._by_type = dict(by_type)
+    self._span_index = dict((doc_id, sorted(spans)) for doc_id, spans in span_index.items())
+    self._entity_relations = dict(entity_relations)
+    self._entity_list = list(entities.values())
+
+  def get_entities(self):
+    return list(self._entity_list)
+
+  def get_all_relations(self):
+    return list(self.relations.values())
+
+  def get_entity(self, entity_id):
+    return self.entities.get(entity_id)
+
+  def get_relation(self, relation_id):
+    return self.relations.get(relation_id)
+
+  def get_entities_of_type(self, type):
+    return list(self._by_type.get(type, ()))
+
+  def get_relations_with_entity(self, entity_id):
+    return list(self._entity_relations.get(entity_id, ()))
+
+  def get_annotations_by_span(self, span, doc_id=None):
+    """
+    Return: the entities with at least one span inside span (inclusive), in document order,
+    as Document.get_annotations_by_span
+    """
+    start, end = int(span[0]), int(span[1])
+    orders = set()
+    for index_doc_id in ([doc_id] if doc_id is not None else self._span_index):
+      span_index = self._span_index.get(index_doc_id, ())
+      i = bisect_left(span_index, (start,))
+      while i < len(span_index) and span_index[i][0] <= end:
+        if span_index[i][1] <= end:
+          orders.add(span_index[i][2])
+        i += 1
+    return [self._entity_list[order] for order in sorted(orders)]
+
+
+class DocumentView(object):
+  """
+  The part of a Document about one of the documents (notes) of a cross-doc file, which reads like
+  a Document of that note alone: its entities, and the relations between them. It copies nothing,
+  answering from the indexes of the Document, which are partitioned by document ID, so it is cheap to make
+  and sees changes made to the Document. Changes go through the Document; attributes of the Document
+  that are not about annotations, such as filename, status or pp(), are the Document's.
+  """
+  def __init__(self, document, doc_id):
+    self.document = document
+    self.doc_id = doc_id
+
+  def __getattr__(self, name):
+    return getattr(self.document, name)
+
+  @property
+  def entities_dict(self):
+    return dict((ent.id, ent) for ent in self.get_entities())
+
+  @property
+  def relations_dict(self):
+    return dict(self.document._doc_relations.get(self.doc_id, {}))
+
+  def doc_ids(self):
+    return [self.doc_id] if self.doc_id in self.document._entity_indexes["doc_id"] else []
+
+  def get_entities(self):
+    return self.document.query(doc_id=self.doc_id)
+
+  def query(self, doc_id=None, **filters):
+    """
+    Document.query over the entities of this document only
+    """
+    if doc_id is not None and self.doc_id not in (doc_id if isinstance(doc_id, (list, set, frozenset)) else [doc_id]):
+      return []
+    return self.document.query(doc_id=self.doc_id, **filters)
+
+  def get_all_relations(self):
+    return list(self.document._doc_relations.get(self.doc_id, {}).values())
+
+  def get_cross_doc_relations(self):
+    """
+    Return: the relations of the cross-doc file between entities of this document and of others,
+    which a Document of this note alone would not have
+    """
+    return list(self.document._doc_cross_relations.get(self.doc_id, {}).values())
+
+  def get_relations_with_entity(self, entity_id):
+    relations = self.document._doc_relations.get(self.doc_id, {})
+    return [rel for rel in self.document.get_relations_with_entity(entity_id) if rel.id in relations]
+
+  def get_annotations_by_span(self, span, doc_id=None):
+    return self.query(span_within=span, doc_id=doc_id)
+
+  def entity_types(self):
+    return sorted(set(ent.type for ent in self.get_entities()))
+
+  def property_names(self):
+    return sorted(set(name for ent in self.get_entities() for name, _ in ent.property_items()))
+
+  # The rest reads through the methods above, so is shared with Document
+  get_sorted_entity_ids = Document.get_sorted_entity_ids
+  get_tlinks = Document.get_tlinks
+  get_contains_subevent_tlinks = Document.get_contains_subevent_tlinks
+  get_cross_doc_contains_subevent_tlinks = Document.get_cross_doc_contains_subevent_tlinks
+  get_within_doc_contains_subevent_tlinks = Document.get_within_doc_contains_subevent_tlinks
+  get_identical_chains = Document.get_identical_chains
+  get_cross_doc_identical_chains = Document.get_cross_doc_identical_chains
+  get_within_doc_identical_chains = Document.get_within_doc_identical_chains
+  get_set_subsets = Document.get_set_subsets
+  get_cross_doc_set_subsets = Document.get_cross_doc_set_subsets
+  get_within_doc_set_subsets = Document.get_within_doc_set_subsets
+  get_whole_parts = Document.get_whole_parts
+  get_cross_doc_whole_parts = Document.get_cross_doc_whole_parts
+  get_within_doc_whole_parts = Document.get_within_doc_whole_parts
+  get_single_doc_idents = Document.get_single_doc_idents
+  contains_span = Document.contains_span
+  get_tlinks_by_span = Document.get_tlinks_by_span
+  annotator = Document.annotator
+  get_preannotated_entities = Document.get_preannotated_entities
+  get_annotator_annotated_entities = Document.get_annotator_annotated_entities
+  align_entities_with = Document.align_entities_with
+  diff = Document.diff
+  _match_entities = Document._match_entities
+  get_annotations = Document.get_annotations
+  max_entity_id_integer = Document.max_entity_id_integer
+  max_relation_id_integer = Document.max_relation_id_integer
+  get_contains_subevent_tuples = Document.get_contains_subevent_tuples
+
+
 class Schema(AbstractXML):
   '''
     Not sure if this is needed, this is Anafora-specific schema info
@@ -481,58 +1379,78 @@ class Schema(AbstractXML):
 
 class Relation(Annotation):
   """
-  A lot like entities, but with no spans
+  A lot like entities, but with no spans.
+  properties and subtype are only made when first accessed.
   """
+  diff_fields = {"type": "type", "parentsType": "parentsType"}
+  tag_name = "relation"
+  # (sub tag, attribute) of the node, in order, for Document.restore_soup
+  soup_fields = [("id", "id"), ("type", "type"), ("parentsType", "parentsType")]
+  # Lower case names of the properties holding the IDs of the entities the relation points at
+  entity_id_names = ENTITY_ID_PROPERTIES
+  # The set of IDs of the documents of those entities, and the entity IDs, kept by the Document
+  _entity_doc_ids = None
+  _indexed_entity_ids = ()
+
   def __init__(self, soup, doc):
     super(Relation, self).__init__(soup)
     self.document = doc
-    self.id = self.get_text_safe(self.soup.id)
-    self.id_num = self.id.split("@")[0]
+    self.id = _parse_id(self.get_text_safe(self.soup.id), doc)
+    self.id_num = self.id.num
     self.type = self.get_text_safe(self.soup.type)
     self.parentsType = self.get_text_safe(self.soup.parentsType)
-    # If the property does not have a value, we can treat it as not existing
-    self.properties = self.properties()
-    self.subtype = self._get_subtype()
-
-  def properties(self):
-    valued_props = []
 
-    for c in self.soup.properties.children:
-      prop = Property(c)
-      if prop.name and prop.value:
-        valued_props.append(prop)
-
-    return valued_props
+  @cached_property
+  def subtype(self):
+    return self._get_subtype()
 
   def _get_subtype(self):
     return None
 
+  def _property_changed(self, prop):
+    super(Relation, self)._property_changed(prop)
+    self.__dict__.pop("subtype", None)
+    if self.document is not None and self.document.relations_dict.get(self.id) is self:
+      self.document.reindex_relation(self)
+
   def entity_ids(self):
     """
-    Returns a list of every entity ID in the coref string
-    This is a catch all, that should find coref string for any relation type
-    *** NOTE beautifulSoup lowercases these strings automatically? ***
+    Returns a list of every entity ID in the properties named in entity_id_names
     """
-    names = ["firstinstance", "coreferring_string", "set", "subset", "whole", "part", "source", "target"]
-    return [prop.value for prop in self.properties if prop.name in names]
+    return [value for name, value in self.property_items() if name.lower() in self.entity_id_names]
 
   def entity_documents(self):
     """
     A list of unique document id's that the relation points to
     """
-    return list(set([id.split("@")[2] for id in self.entity_ids()]))
+    return list(self._entity_documents())
 
   def single_doc(self):
-    return len(self.entity_documents()) < 2
+    return len(self._entity_documents()) < 2
 
   def is_cross_doc(self):
-    return len(self.entity_documents()) > 1
+    return len(self._entity_documents()) > 1
+
+  def get_doc_id(self):
+    return self.id.doc_id
+
+  def _entity_documents(self):
+    """
+    The set worked out by the Document when it indexed the relation, if it did
+    """
+    if self._entity_doc_ids is None:
+      return self._find_entity_documents()
+    return self._entity_doc_ids
+
+  def _find_entity_documents(self):
+    return frozenset(_parse_id(ent_id, self.document).doc_id for ent_id in self.entity_ids())
 
   def get_entities(self):
     """
-    return: A list of the actual entity objects
+    return: A list of the actual entity objects, with None for those that cannot be found,
+    in the document or through its registry
     """
-    return [self.document.entities_dict[e] for e in self.entity_ids()]
+    return [self.document.resolve_entity(e) for e in self.entity_ids()]
 
   def identical_entities_with(self, other):
     """
@@ -559,6 +1477,12 @@ class Relation(Annotation):
     for prop in self.properties:
       prop.update_soup()
 
+  def remove(self):
+    """
+    Go through the Document, so that it stops indexing this relation
+    """
+    return self.document.remove_annotations([self])[0]
+
   def get_head(self):
     return None
 
@@ -576,8 +1500,18 @@ class Tlink(Relation):
   """
   Tlinks, which are a type of relation
   """
+  entity_id_names = ["source", "target"]
+
   def _get_subtype(self):
-    return [prop.value for prop in self.properties if prop.name.lower() == "type"][0]
+    subtypes = [value for name, value in self.property_items() if name.lower() == "type"]
+    return subtypes[0] if subtypes else None
+
+  def _property_changed(self, prop):
+    """
+    A TLINK is a ContainsSubevent exactly while its subtype is CONTAINS-SUBEVENT, as in _make_relation
+    """
+    self.__class__ = ContainsSubevent if self._get_subtype() == "CONTAINS-SUBEVENT" else Tlink
+    super(Tlink, self)._property_changed(prop)
 
   def update_subtype(self, subtype):
     """
@@ -590,30 +1524,25 @@ class Tlink(Relation):
 
   def get_source(self):
     """
-    Just use the soup, there is only one source and this is faster
-    than looping over property objects. Then lookup the entity in the dictionary
+    Read the property value rather than making property objects,
+    there is only one source. Then lookup the entity in the dictionary
 
     return the actual Entity object that source points to
     """
-    if self.get_text_safe(self.soup.properties.Source):
-      return self.document.entities_dict.get(self.get_text_safe(self.soup.properties.Source))
+    source = self.get_property("Source")
+    if source:
+      return self.document.resolve_entity(source)
 
   def get_target(self):
     """
-    Just use the soup, there is only one source and this is faster
-    than looping over property objects. Then lookup the entity in the dictionary
+    Read the property value rather than making property objects,
+    there is only one target. Then lookup the entity in the dictionary
 
     return the actual Entity object that target points to
     """
-    if self.get_text_safe(self.soup.properties.Target):
-      return self.document.entities_dict.get(self.get_text_safe(self.soup.properties.Target))
-
-  def entity_ids(self):
-    """
-    Returns a list of every entity ID in the coref string
-    """
-    names = ["Source", "Target"]
-    return [prop.value for prop in self.properties if prop.name in names]
+    target = self.get_property("Target")
+    if target:
+      return self.document.resolve_entity(target)
 
   def get_head(self):
     """
@@ -659,6 +1588,8 @@ class IdenticalChain(Relation):
   """
   Identical chains, which are a type of relation
   """
+  entity_id_names = ["firstinstance", "coreferring_string"]
+
   def __eq__(self, other):
     """
     Check if 2 ident are equivalent.
@@ -670,47 +1601,36 @@ class IdenticalChain(Relation):
 
   def get_first_instance(self):
     """
-    Just use the soup, there is only one FirstInstance and this is faster
-    than looping over property objects. Then lookup the entity in the dictionary
+    Read the property value rather than making property objects,
+    there is only one FirstInstance. Then lookup the entity in the dictionary
 
     return the actual Entity object that FirstInstance points to
     """
-    if self.get_text_safe(self.soup.properties.FirstInstance):
-      return self.document.entities_dict.get(self.get_text_safe(self.soup.properties.FirstInstance))
+    first_instance = self.get_property("FirstInstance")
+    if first_instance:
+      return self.document.resolve_entity(first_instance)
 
   def get_coref_strings(self):
     """
-    Just use the soup, there is only one source and this is faster
-    than looping over property objects. Then lookup the entity in the dictionary
-
-    return the actual Entity object that source points to
-    """
-    if self.soup.find_all("Coreferring_String") is not None:
-      c_strings = [self.get_text_safe(c) for c in self.soup.findAll("Coreferring_String")]
-      return [self.document.entities_dict.get(c) for c in c_strings]
+    Read the property values rather than making property objects.
+    Then lookup the entities in the dictionary
 
-  def entity_ids(self):
+    return the actual Entity objects that the coreferring strings point to
     """
-    Returns a list of every entity ID in the coref string
-    """
-    names = ["firstinstance", "coreferring_string"]
-    #print([(prop.value, prop.name) for prop in self.properties])
-    return [prop.value for prop in self.properties if prop.name.lower() in names]
+    return [self.document.resolve_entity(c) for c in self.get_property_list("Coreferring_String")]
 
   def entity_id_nums(self):
     """
     Returns a list of every entity ID in the coref string
     """
-    names = ["firstinstance", "coreferring_string"]
-    # print([(prop.value, prop.name) for prop in self.properties])
-    return [prop.value.split("@")[0] for prop in self.properties if prop.name.lower() in names]
+    return [_parse_id(ent_id, self.document).num for ent_id in self.entity_ids()]
 
-  def entity_id_nums(self):
+  def entity_id_doc_nums(self):
     """
     Returns a list of every entity ID@doc_id in the coref string
     """
-    names = ["firstinstance", "coreferring_string"]
-    return [prop.value.split("@")[0] + "@" + prop.value.split("@")[3] for prop in self.properties if prop.name.lower() in names]
+    ids = [_parse_id(ent_id, self.document) for ent_id in self.entity_ids()]
+    return [ent_id.num + "@" + ent_id.doc_id for ent_id in ids]
 
   def get_head(self):
     """
@@ -728,6 +1648,8 @@ class SetSubset(Relation):
   """
   Set-Subset, which are a type of relation
   """
+  entity_id_names = ["set", "subset"]
+
   def __eq__(self, other):
     """
     Check if 2 set-subset are equivalent.
@@ -739,21 +1661,12 @@ class SetSubset(Relation):
       return set([e.id_doc_num for e in self.get_subset()]) == set([e.id_doc_num for e in other.get_subset()])
 
   def get_set(self):
-    if self.get_text_safe(self.soup.properties.Set):
-      return self.document.entities_dict.get(self.get_text_safe(self.soup.properties.Set))
+    set_id = self.get_property("Set")
+    if set_id:
+      return self.document.resolve_entity(set_id)
 
   def get_subset(self):
-    if self.soup.find_all("Subset") is not None:
-      ss_strings = [self.get_text_safe(c) for c in self.soup.findAll("Subset")]
-      return [self.document.entities_dict.get(c) for c in ss_strings]
-
-  def entity_ids(self):
-    """
-    Returns a list of every entity ID in the coref string
-    """
-    names = ["set", "subset"]
-
-    return [prop.value for prop in self.properties if prop.name.lower() in names]
+    return [self.document.resolve_entity(c) for c in self.get_property_list("Subset")]
 
   def get_head(self):
     """
@@ -772,6 +1685,8 @@ class WholePart(Relation):
   """
   Whole-Part, which are a type of relation
   """
+  entity_id_names = ["whole", "part"]
+
   def __eq__(self, other):
     """
     Check if 2 whole-part are equivalent.
@@ -784,23 +1699,13 @@ class WholePart(Relation):
 
 
   def get_whole(self):
-    if self.get_text_safe(self.soup.properties.Whole):
-      return self.document.entities_dict.get(self.get_text_safe(self.soup.properties.Whole))
+    whole = self.get_property("Whole")
+    if whole:
+      return self.document.resolve_entity(whole)
 
 
   def get_part(self):
-    if self.soup.find_all("Part") is not None:
-      ss_strings = [self.get_text_safe(c) for c in self.soup.findAll("Part")]
-      return [self.document.entities_dict.get(c) for c in ss_strings]
-
-
-  def entity_ids(self):
-    """
-    Returns a list of every entity ID in the coref string
-    """
-    names = ["whole", "part"]
-
-    return [prop.value for prop in self.properties if prop.name.lower() in names]
+    return [self.document.resolve_entity(c) for c in self.get_property_list("Part")]
 
   def get_head(self):
     """
@@ -816,17 +1721,61 @@ class WholePart(Relation):
 
 
 class Entity(Annotation):
-  def __init__(self, soup):
+  diff_fields = {"span": "span_string", "type": "type", "parentsType": "parentsType"}
+  tag_name = "entity"
+  # (sub tag, attribute) of the node, in order, for Document.restore_soup
+  soup_fields = [("id", "id"), ("span", "span_string"), ("type", "type"), ("parentsType", "parentsType")]
+
+  def __init__(self, soup, doc=None):
     super(Entity, self).__init__(soup)
-    self.id = self.get_text_safe(self.soup.id)
-    self.id_num = self.id.split("@")[0]
-    self.id_doc_num = self.id_num + "@" + self.get_doc_id()
+    self.document = doc
+    self.id = _parse_id(self.get_text_safe(self.soup.id), doc)
+    self.id_num = self.id.num
+    self.doc_id = self.id.doc_id
+    self.id_doc_num = self.id.num + "@" + self.doc_id
     self.span_string = self.get_text_safe(self.soup.span)
-    self.spans = self._get_spans()
-    self.type = self.get_text_safe(self.soup.type)
-    self.parentsType = self.get_text_safe(self.soup.parentsType)
-    # If the property does not have a value, we can treat it as not existing
-    self.properties = self.properties()
+    self._spans = self._get_spans()
+    self._type = self.get_text_safe(self.soup.type)
+    self._parentsType = self.get_text_safe(self.soup.parentsType)
+
+  @property
+  def type(self):
+    return self._type
+
+  @type.setter
+  def type(self, value):
+    self._type = value
+    self._reindex()
+
+  @property
+  def parentsType(self):
+    return self._parentsType
+
+  @parentsType.setter
+  def parentsType(self, value):
+    self._parentsType = value
+    self._reindex()
+
+  @property
+  def spans(self):
+    return self._spans
+
+  @spans.setter
+  def spans(self, spans):
+    self._spans = [(int(start), int(end)) for start, end in spans]
+    self.span_string = ";".join("%d,%d" % span for span in self._spans)
+    self._reindex()
+
+  def _reindex(self):
+    """
+    Keeps the indexes of the Document up to date after a change in place
+    """
+    if self.document is not None and self.document.entities_dict.get(self.id) is self:
+      self.document.reindex_entity(self)
+
+  def _property_changed(self, prop):
+    super(Entity, self)._property_changed(prop)
+    self._reindex()
 
   def _get_spans(self):
     spans = []
@@ -840,7 +1789,7 @@ class Entity(Annotation):
     return spans
 
   def get_doc_id(self):
-    return self.id.split("@")[2]
+    return self.doc_id
 
   def is_disjointed(self):
     return ";" in self.span_string
@@ -854,22 +1803,11 @@ class Entity(Annotation):
     else:
       return self.spans[0][1]
 
-  def properties(self):
-    valued_props = []
-
-    if self.soup.properties:
-      for c in self.soup.properties.children:
-        prop = Property(c)
-        if prop.name and prop.value:
-          valued_props.append(prop)
-
-    return valued_props
-
   def property_names(self):
-    return list(set([prop.name for prop in self.properties]))
+    return list(set([name for name, _ in self.property_items()]))
 
   def is_aligned_with(self, other_entity):
-    return self.span == other_entity.span
+    return self.span_string == other_entity.span_string
 
   def agrees_with(self, other_entity):
     return self.type == other_entity.type
@@ -880,18 +1818,13 @@ class Entity(Annotation):
   def has_modality(self, modality):
     return len([p for p in self.properties if p.has_modality(modality)]) > 0
 
-  def diff(self, other_entity):
-    '''
-    Returns a dict of {entity_sub_tag: [list of the two conflicting values]}
-    '''
-    other_entity_dict = dict(other_entity)
-    diffs_dict = {}
-
-    for attr, val in dict(self).items():
-      if other_entity_dict[attr] and other_entity_dict[attr] == val:
-          diffs_dict[attr] = [dict(self)[attr], other_entity_dict[attr]]
-
-    return diffs_dict
+  def remove(self, cascade=None):
+    """
+    Go through the Document when there is one, so that it stops indexing this entity
+    """
+    if self.document is not None:
+      return self.document.remove_entity(self, cascade=cascade)
+    return super(Entity, self).remove()
 
   def align_properties_with(self, other_entity):
     aligned = []
@@ -922,13 +1855,38 @@ class Entity(Annotation):
     self.soup.span.string = self.span_string
     self.soup.type.string = self.type
     self.soup.parentsType.string = self.parentsType
+    for prop in self.__dict__.get("properties", ()):
+      prop.update_soup()
 
 
 class Property(Annotation):
-  def __init__(self, soup):
+  """
+  Properties of an annotation whose soup was released have no soup, but a name and value,
+  the released_index-th of the annotation's released items.
+  Setting the value writes it to the soup, and tells annotation, the Entity or Relation it belongs to,
+  so that its Document reindexes it
+  """
+  def __init__(self, soup, name=None, value=None, annotation=None, released_index=None):
     super(Property, self).__init__(soup)
-    self.name = self.soup.name
-    self.value = self.get_text_safe(self.soup)
+    self.annotation = annotation
+    self.released_index = released_index
+    if soup is None:
+      self.name = name
+      self._value = value
+    else:
+      self.name = self.soup.name
+      self._value = self.get_text_safe(self.soup)
+
+  @property
+  def value(self):
+    return self._value
+
+  @value.setter
+  def value(self, value):
+    self._value = value
+    self.update_soup()
+    if self.annotation is not None:
+      self.annotation._property_changed(self)
 
   def has_modality(self, modality):
     return self.name.lower() == "contextualmodality" and self.value.lower() == modality.lower()
@@ -940,4 +1898,89 @@ class Property(Annotation):
     return self.name == other_prop.name and self.value == other_prop.value
 
   def update_soup(self):
-    self.soup.string = self.value
+    if self._soup is not None:
+      self.soup.string = self.value
+
+
+# The Relation subclass for each relation type
+RELATION_CLASSES = {"TLINK": Tlink, "Identical": IdenticalChain, "Set/Subset": SetSubset, "Whole/Part": WholePart}
+
+
+def _parse_id(id_string, doc):
+  """
+  Return: the AnnotationID for id_string, interned in doc's IDTable if there is a doc
+  """
+  return doc.ids(id_string) if doc is not None else AnnotationID(id_string)
+
+
+def _valued_property_tags(soup):
+  """
+  Return: the tags under the properties tag of an annotation's soup that have a value
+  """
+  if not soup.properties:
+    return []
+  return [c for c in soup.properties.children if c.name and c.get_text()]
+
+
+def _make_relation(soup, doc):
+  """
+  Return: a Relation of the subclass for the type in soup,
+  and for a TLINK, a ContainsSubevent if that is its subtype
+  """
+  cls = RELATION_CLASSES.get(soup.type.get_text() if soup.type else "", Relation)
+  if cls is Tlink and soup.properties:
+    subtype = soup.properties.find(re.compile("^type$", re.I), recursive=False)
+    if subtype is not None and subtype.get_text() == "CONTAINS-SUBEVENT":
+      cls = ContainsSubevent
+
+  return cls(soup, doc)
+
+
+def _extract_all(nodes):
+  """
+  Extracts every node from its tree. Tag.extract() has to look each node up in its parent's
+  contents, so instead nodes are grouped by parent, their positions found in one scan of it,
+  and they are extracted from last to first so that the remaining positions stay valid
+  """
+  parents = {}
+  children = dd(set)
+  for node in nodes:
+    if node.parent is not None:
+      parents[id(node.parent)] = node.parent
+      children[id(node.parent)].add(id(node))
+
+  for key, parent in parents.items():
+    positions = [i for i, child in enumerate(parent.contents) if id(child) in children[key]]
+    for i in reversed(positions):
+      parent.contents[i].extract(_self_index=i)
+
+
+def _property_values(properties):
+  """
+  Return: a dict of {property name: value} for the properties that do not point at entities
+  """
+  return {prop.name: prop.value for prop in properties if prop.name.lower() not in ENTITY_ID_PROPERTIES}
+
+
+def _relation_key(relation, tokens):
+  """
+  A hashable key for a relation made of its type and the entities it points to,
+  where each entity ID is replaced by its token in tokens when it has one
+  """
+  args = sorted((prop.name.lower(), tokens.get(prop.value, prop.value))\
+                for prop in relation.properties if prop.name.lower() in ENTITY_ID_PROPERTIES)
+  return (relation.type, tuple(args))
+
+
+def _make_edit(kind, annotation, other_annotation):
+  """
+  Return: the Document.diff edit for a pair of matched annotations, or None if they do not differ
+  """
+  if annotation is None:
+    return {"op": "added", "kind": kind, "id": None, "other_id": other_annotation.id, "changes": {}}
+  if other_annotation is None:
+    return {"op": "removed", "kind": kind, "id": annotation.id, "other_id": None, "changes": {}}
+
+  changes = annotation.diff(other_annotation)
+  if changes:
+    return {"op": "changed", "kind": kind, "id": annotation.id, "other_id": other_annotation.id, "changes": changes}
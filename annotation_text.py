@@ -83,10 +83,22 @@ class Document(object):
       # rejoin the lines, removing first and last line ([start section] and [end section])
       text = ("\n").join(lines[1:-1])
       start, end = section_span
-      sections.append(Section(self, id, start, end, text))
+      content_start = start + len(lines[0]) + 1
+      sections.append(Section(self, id, start, end, text, content_start, content_start + len(text)))
 
     return sections
 
+  def apply_edits(self, edit_log, doc_id=None):
+    """
+    Makes the edits of an edits.EditLog to the raw text, moves the spans of the annotation to match,
+    and finds the sections again
+
+    Return: the list of (Entity, old span) intersecting the edits, see edits.EditLog.apply
+    """
+    flagged = edit_log.apply(self.raw, [self.annotation], doc_id)
+    self.sections = self._get_sections()
+    return flagged
+
   def get_entity_text(self, entity):
     if type(entity) == annotation.Entity:
       """
@@ -103,12 +115,18 @@ class Document(object):
       raise Exception("get_entity_text takes either a tuple, representing the span, or an Entity object from the annotation module")
 
 class Section(object):
-  def __init__(self, document, id, start_span, end_span, text):
+  """
+  content_start and content_end are the offsets of text in the raw text,
+  which for sections found by Document leaves out their start and end section lines
+  """
+  def __init__(self, document, id, start_span, end_span, text, content_start=None, content_end=None):
     self.document = document
     self.start_span = start_span
     self.end_span = end_span
     self.text = text
     self.id = id
+    self.content_start = start_span if content_start is None else content_start
+    self.content_end = end_span if content_end is None else content_end
 
   def find_text_spans_by_regex(self, regex):
     """
@@ -160,14 +178,15 @@ class TextSpan(object):
     """
     return self.section.document.annotation.get_tlinks_by_span(self.span, doc_id=doc_id)
 
-  def remove_annotations(self, doc_id):
+  def remove_annotations(self, doc_id, cascade=None):
     """
-    Remove all annotations from the Annotation Document that are within this text span
+    Remove all annotations from the Annotation Document that are within this text span,
+    in one batch. See annotation.Document.remove_annotations for cascade.
 
     ***See above note, which applies here similarly***
     """
-    for ann in self.get_annotations(doc_id):
-      ann.remove()
+    ann_doc = self.section.document.annotation
+    ann_doc.remove_annotations(self.get_annotations(doc_id), cascade=cascade)
 
   def truncate_end(self, trunc):
     """
@@ -0,0 +1,503 @@
+"""
+Command line interface for batch jobs over Anafora project directories:
+
+  python -m anafora4python <command> [options] PATH [PATH ...]
+
+Each command runs over every annotation file found under the given paths,
+in --jobs worker processes, and reports its throughput on stderr when it is done.
+
+A command is an entry in COMMANDS: "items" turns the files found into work items,
+"worker" is called on each item in a worker process and returns (number of annotations, result),
+and "reduce" is a generator that is sent each (item, result) in the main process, then None,
+after which it yields whether the command failed.
+A command can instead have a "run" function, which does all of that itself.
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from functools import partial
+
+from anafora4python import alignment, corpus
+
+def main(argv=None):
+  parser = _make_parser()
+  options = parser.parse_args(argv)
+  if not hasattr(options, "command"):
+    parser.print_help()
+    return 2
+
+  paths = corpus.find_annotation_files(options.paths, options.pattern)
+  roots = [p if os.path.isdir(p) else os.path.dirname(p) for p in options.paths]
+  options.root = os.path.commonpath([os.path.abspath(r) for r in roots]) if roots else "."
+
+  start = time.time()
+  run = COMMANDS[options.command].get("run", _run_workers)
+  n_files, n_annotations, failed = run(paths, options)
+
+  elapsed = max(time.time() - start, 1e-9)
+  sys.stderr.write("%d files, %d annotations in %.2fs (%.1f files/s, %.1f annotations/s)\n" %\
+                   (n_files, n_annotations, elapsed, n_files / elapsed, n_annotations / elapsed))
+  return 1 if failed else 0
+
+
+def _make_parser():
+  parser = argparse.ArgumentParser(prog="anafora4python", description=__doc__.strip().split("\n")[0])
+  subparsers = parser.add_subparsers(title="commands")
+  for name, command in COMMANDS.items():
+    sub = subparsers.add_parser(name, help=command["help"])
+    sub.set_defaults(command=name)
+    sub.add_argument("paths", nargs="+", help="annotation files, or directories to search for them")
+    sub.add_argument("--pattern", default="*.xml", help="file name pattern of the annotation files (default: %(default)s)")
+    sub.add_argument("--jobs", "-j", type=int, default=1, help="number of worker processes (default: %(default)s)")
+    for args, kwargs in command.get("arguments", []):
+      sub.add_argument(*args, **kwargs)
+
+  return parser
+
+
+def _run_workers(paths, options):
+  """
+  Runs a command through its items, worker and reduce functions.
+
+  Return: a tuple of (number of files processed, number of annotations in them, whether the command failed)
+  """
+  command = COMMANDS[options.command]
+  items = command["items"](paths, options)
+  n_files = 0
+  n_annotations = 0
+  failed = False
+  reducer = command["reduce"](options)
+  next(reducer)
+  for item, (status, count, result) in corpus.map_files(partial(_process, options.command, options), items, options.jobs):
+    n_files += len(item) if isinstance(item, tuple) else 1
+    n_annotations += count
+    if status == "error":
+      failed = True
+      sys.stderr.write("%s: %s\n" % (item, result))
+    else:
+      reducer.send((item, result))
+  failed = reducer.send(None) or failed
+
+  return n_files, n_annotations, failed
+
+def _process(command, options, item):
+  """
+  Runs a command's worker on one item in a worker process.
+
+  Return: a tuple of ("ok", number of annotations, result), or ("error", 0, message)
+  """
+  try:
+    count, result = COMMANDS[command]["worker"](item, options)
+    return ("ok", count, result)
+  except Exception as e:
+    return ("error", 0, "%s: %s" % (type(e).__name__, e))
+
+def _files(paths, options):
+  return paths
+
+def _count(doc):
+  return len(doc.entities_dict) + len(doc.relations_dict)
+
+
+# stats
+
+def _stats_run(paths, options):
+  """
+  stats summarizes the files through stats.CorpusStats, which with --cache
+  only parses the files that changed since the last run
+  """
+  from anafora4python import stats
+  if options.cache and os.path.isfile(options.cache):
+    corpus_stats = stats.CorpusStats.load(options.cache)
+  else:
+    corpus_stats = stats.CorpusStats()
+  summarized = corpus_stats.update(paths, options.jobs)
+  if options.cache:
+    corpus_stats.save(options.cache)
+
+  for path, error in sorted(corpus_stats.errors.items()):
+    sys.stderr.write("%s: %s\n" % (path, error))
+  _write_json(corpus_stats.total.to_dict(), options)
+  n_annotations = sum(corpus_stats.summaries[path][1].annotations() for path in summarized if path in corpus_stats.summaries)
+  return len(summarized), n_annotations, bool(corpus_stats.errors)
+
+
+# dedup
+
+def _dedup_run(paths, options):
+  """
+  dedup works on the raw texts of the notes rather than on the annotation files, and with --index
+  keeps their signatures in that file, so that only new or changed notes are read again
+  """
+  from anafora4python import dedup
+  if options.index and os.path.isfile(options.index):
+    index = dedup.NoteIndex.load(options.index)
+    index.threshold = options.threshold
+  else:
+    index = dedup.NoteIndex(dedup.MinHasher(num_perm=options.num_perm, shingle=options.shingle),\
+                            bands=options.bands, threshold=options.threshold)
+  signed = index.update(dedup.find_raw_texts(options.paths), options.jobs)
+  if options.index:
+    index.save(options.index)
+
+  for path, error in sorted(index.errors.items()):
+    sys.stderr.write("%s: %s\n" % (path, error))
+  pairs = []
+  for path, other, similarity in index.pairs():
+    pair = {"notes": [path, other], "similarity": similarity}
+    overlap = dedup.annotation_overlap(path, other, options.pattern)
+    if overlap is not None:
+      pair["annotations"] = overlap
+    pairs.append(pair)
+  _write_json({"notes": len(index), "threshold": index.threshold, "clusters": index.clusters(), "pairs": pairs}, options)
+  return len(signed), 0, bool(index.errors)
+
+
+# watch
+
+def _watch_run(paths, options):
+  """
+  watch keeps the statistics of the directories current through watch.Watcher, writing a JSON line
+  with the totals, the status and savetime of the files that changed, and the removed files
+  after the first pass and every change, until interrupted
+  """
+  from anafora4python import stats, watch
+  corpus_stats = stats.CorpusStats.load(options.cache) if options.cache and os.path.isfile(options.cache) else None
+  counts = {"files": 0, "annotations": 0}
+
+  def report(watcher, summarized, removed):
+    documents = watcher.documents()
+    counts["files"] += len(summarized)
+    counts["annotations"] += sum(documents[path].annotations() for path in summarized if path in documents)
+    changed = dict((path, {"status": documents[path].status, "savetime": documents[path].savetime})\
+                   for path in summarized if path in documents)
+    changed.update((path, {"error": error}) for path, error in watcher.stats.errors.items() if path in summarized)
+    sys.stdout.write(json.dumps({"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "changed": changed, "removed": removed,
+                                 "total": watcher.stats.total.to_dict()}, sort_keys=True) + "\n")
+    sys.stdout.flush()
+    if options.cache:
+      watcher.stats.save(options.cache)
+
+  with watch.Watcher(options.paths, options.pattern, options.jobs, corpus_stats=corpus_stats,\
+                     inotify=False if options.poll else None) as watcher:
+    try:
+      watcher.watch(report, options.interval)
+    except KeyboardInterrupt:
+      pass
+  return counts["files"], counts["annotations"], False
+
+
+# iaa
+
+def _iaa_items(paths, options):
+  """
+  Groups the annotation files by note, keeping the notes with exactly --raters files
+  """
+  notes = {}
+  for path in paths:
+    notes.setdefault((os.path.dirname(path), corpus.note_name(path)), []).append(path)
+  for note, note_paths in sorted(notes.items()):
+    if len(note_paths) != options.raters:
+      sys.stderr.write("skipping %s: %d annotation files, not %d\n" % (note[1], len(note_paths), options.raters))
+  return [tuple(p) for _, p in sorted(notes.items()) if len(p) == options.raters]
+
+def _iaa_worker(paths, options):
+  from anafora4python.iaa import agreement
+  docs = [corpus.load_annotation(path) for path in paths]
+  result = {"entities": agreement.get_entity_reliability(docs, options.match, options.threshold),
+            "properties": agreement.get_property_reliability(docs, mode=options.match, threshold=options.threshold)}
+  if len(docs) == 2:
+    result["confusion"] = agreement.get_entity_confusion(docs[0], docs[1], options.match, options.threshold)
+  return sum(_count(doc) for doc in docs), result
+
+def _iaa_reduce(options):
+  totals = {"properties": {}}
+  notes = 0
+  while True:
+    received = yield
+    if received is None:
+      break
+    notes += 1
+    result = received[1]
+    for key in ("entities", "confusion"):
+      if key in result:
+        totals[key] = totals[key] + result[key] if key in totals else result[key]
+    for name, counts in result["properties"].items():
+      props = totals["properties"]
+      props[name] = props[name] + counts if name in props else counts
+
+  report = {"notes": notes, "raters": options.raters}
+  if "entities" in totals:
+    report["entity_types"] = _reliability_report(totals["entities"])
+  if "confusion" in totals:
+    report["entity_types"]["cohen_kappa"] = totals["confusion"].cohen_kappa()
+    report["entity_types"]["confusion"] = totals["confusion"].to_dict()
+  report["properties"] = dict((name, _reliability_report(counts)) for name, counts in sorted(totals["properties"].items()))
+  _write_json(report, options)
+  yield False
+
+def _reliability_report(counts):
+  return {"fleiss_kappa": _json_float(counts.fleiss_kappa()),
+          "krippendorff_alpha": _json_float(counts.krippendorff_alpha())}
+
+
+# score
+
+def _schema_name(path):
+  """
+  The schema an annotation file is for, the second part of its name
+  """
+  parts = os.path.basename(path).split(".")
+  return parts[1] if len(parts) > 4 else ""
+
+def _score_items(paths, options):
+  """
+  Pairs each system file with the gold file of the same note and schema under --gold,
+  the one of annotator "gold" where there are several
+  """
+  gold = {}
+  for path in corpus.find_annotation_files(options.gold, options.pattern):
+    key = (corpus.note_name(path), _schema_name(path))
+    if key not in gold or os.path.basename(path).split(".")[-3:-2] == ["gold"]:
+      gold[key] = path
+  gold_paths = set(gold.values())
+  items = []
+  for path in paths:
+    if path in gold_paths:
+      continue
+    gold_path = gold.get((corpus.note_name(path), _schema_name(path)))
+    if gold_path is None:
+      sys.stderr.write("skipping %s: no gold file under %s\n" % (path, options.gold))
+    else:
+      items.append((path, gold_path))
+  return items
+
+def _score_worker(paths, options):
+  from anafora4python.iaa import scoring
+  system, gold = [corpus.load_annotation(path) for path in paths]
+  return _count(system) + _count(gold), scoring.score_entities(gold, system, options.match, options.threshold, by_type=True)
+
+def _score_reduce(options):
+  from anafora4python.iaa import scoring
+  by_type = {}
+  while True:
+    received = yield
+    if received is None:
+      break
+    for ent_type, scores in received[1].items():
+      by_type[ent_type] = by_type[ent_type] + scores if ent_type in by_type else scores
+
+  total = scoring.Scores()
+  for scores in by_type.values():
+    total += scores
+  report = {"match": options.match, "entities": _scores_report(total),
+            "entity_types": dict((ent_type, _scores_report(scores)) for ent_type, scores in sorted(by_type.items()))}
+  if options.match == "jaccard":
+    report["threshold"] = options.threshold
+  _write_json(report, options)
+  yield False
+
+def _scores_report(scores):
+  return dict((key, _json_float(value)) for key, value in scores.to_dict().items())
+
+
+# export
+
+def _export_worker(path, options):
+  doc = corpus.load_annotation(path)
+  raw = corpus.load_raw_text(path)
+  entities = []
+  for ent in doc.get_entities():
+    entity = {"id": ent.id, "type": ent.type, "parentsType": ent.parentsType, "spans": ent.spans,
+              "properties": dict(ent.property_items())}
+    if raw is not None:
+      entity["text"] = [raw.find_string_by_span(span) for span in ent.spans]
+    entities.append(entity)
+  relations = [{"id": rel.id, "type": rel.type, "parentsType": rel.parentsType,
+                "properties": [list(item) for item in rel.property_items()]} for rel in doc.get_all_relations()]
+  return _count(doc), {"file": path, "entities": entities, "relations": relations}
+
+def _export_reduce(options):
+  out = open(options.output, "w") if options.output else sys.stdout
+  try:
+    while True:
+      received = yield
+      if received is None:
+        break
+      out.write(json.dumps(received[1]) + "\n")
+  finally:
+    if out is not sys.stdout:
+      out.close()
+  yield False
+
+
+# validate
+
+def _validate_worker(path, options):
+  doc = corpus.load_annotation(path)
+  raw = corpus.load_raw_text(path)
+  errors = []
+  n_entities = len(doc.soup.annotations.find_all("entity"))
+  if n_entities != len(doc.entities_dict):
+    errors.append("%d duplicate entity IDs" % (n_entities - len(doc.entities_dict)))
+  for rel in doc.get_all_relations():
+    for ent_id in rel.entity_ids():
+      if ent_id not in doc.entities_dict:
+        errors.append("relation %s points at missing entity %s" % (rel.id, ent_id))
+  if raw is not None:
+    length = len(raw.text)
+    for ent in doc.get_entities():
+      if any(start > end or end > length for start, end in ent.spans):
+        errors.append("entity %s has span %s outside the text" % (ent.id, ent.span_string))
+  if options.schema:
+    from anafora4python import schema
+    # Missing entities were reported above
+    errors += [str(v) for v in schema.validate_document(doc, schema.cached_schema(options.schema))\
+               if v.code != "missing_entity"]
+  return _count(doc), errors
+
+def _validate_reduce(options):
+  invalid = 0
+  while True:
+    received = yield
+    if received is None:
+      break
+    path, errors = received
+    if errors:
+      invalid += 1
+    for error in errors:
+      sys.stdout.write("%s: %s\n" % (path, error))
+  yield invalid > 0
+
+
+# bio
+
+def _bio_worker(path, options):
+  from anafora4python import annotation_text, sequence
+  types = set(options.types.split(",")) if options.types else None
+  # Only the entities to tag, and the property they are labelled with, are needed
+  parse_filter = corpus.ParseFilter(entity_types=types, relation_types=(),
+                                    properties=[options.label] if options.label else ())
+  doc = corpus.load_annotation(path, parse_filter=parse_filter)
+  raw = corpus.load_raw_text(path)
+  if raw is None:
+    raise IOError("no raw text for %s" % path)
+  sequences = sequence.iter_sequences(annotation_text.Document(doc, raw), scheme=options.scheme,\
+                                      label=options.label, types=types, sentences=options.sentences)
+  out = io.StringIO()
+  sequence.write_conll(sequences, out)
+  return _count(doc), out.getvalue()
+
+def _bio_reduce(options):
+  out = open(options.output, "w") if options.output else sys.stdout
+  try:
+    while True:
+      received = yield
+      if received is None:
+        break
+      out.write(received[1])
+  finally:
+    if out is not sys.stdout:
+      out.close()
+  yield False
+
+
+# reserialize
+
+def _reserialize_worker(path, options):
+  doc = corpus.load_annotation(path)
+  if options.output:
+    out_path = os.path.join(options.output, os.path.relpath(os.path.abspath(path), options.root))
+  else:
+    out_path = path
+  status, _ = corpus.write_document(doc, out_path)
+  return _count(doc), status
+
+def _reserialize_reduce(options):
+  counts = {"written": 0, "unchanged": 0}
+  while True:
+    received = yield
+    if received is None:
+      break
+    counts[received[1]] += 1
+  sys.stderr.write("%(written)d written, %(unchanged)d unchanged\n" % counts)
+  yield False
+
+
+def _write_json(obj, options):
+  text = json.dumps(obj, indent=2, sort_keys=True)
+  if getattr(options, "output", None):
+    with open(options.output, "w") as f:
+      f.write(text + "\n")
+  else:
+    sys.stdout.write(text + "\n")
+
+def _json_float(value):
+  """
+  JSON has no NaN
+  """
+  return None if value != value else value
+
+
+MATCH_ARGUMENT = {"choices": alignment.MODES, "default": "exact",
+                  "help": "how the spans of entities have to match to be aligned (default: %(default)s)"}
+THRESHOLD_ARGUMENT = {"type": float, "default": 0.5, "help": "the least Jaccard similarity of spans for --match jaccard (default: %(default)s)"}
+
+COMMANDS = {
+  "stats": {
+    "help": "count entity types, property values, relation types and subtypes, cross-doc relations and span lengths",
+    "run": _stats_run,
+    "arguments": [(("--output", "-o"), {"help": "write the JSON report here instead of stdout"}),
+                  (("--cache",), {"help": "keep per-file statistics in this file, and only parse the files that changed since"})]},
+  "dedup": {
+    "help": "find clusters of near-duplicate notes by MinHash signatures of their section text, and the annotations they share",
+    "run": _dedup_run,
+    "arguments": [(("--threshold",), {"type": float, "default": 0.8, "help": "least estimated Jaccard similarity of near-duplicates (default: %(default)s)"}),
+                  (("--index",), {"help": "keep the signatures in this file, and only read the notes that changed since"}),
+                  (("--num-perm",), {"type": int, "default": 128, "help": "length of new signatures (default: %(default)s)"}),
+                  (("--bands",), {"type": int, "default": 16, "help": "LSH bands of new indexes, dividing --num-perm (default: %(default)s)"}),
+                  (("--shingle",), {"type": int, "default": 5, "help": "tokens per shingle of new signatures (default: %(default)s)"}),
+                  (("--output", "-o"), {"help": "write the JSON report here instead of stdout"})]},
+  "watch": {
+    "help": "keep statistics current as files are saved, re-parsing only the changed files; one JSON line per change",
+    "run": _watch_run,
+    "arguments": [(("--interval",), {"type": float, "default": 2.0, "help": "seconds between refreshes at most (default: %(default)s)"}),
+                  (("--poll",), {"action": "store_true", "help": "compare modification times instead of using inotify"}),
+                  (("--cache",), {"help": "keep per-file statistics in this file, as for stats"})]},
+  "iaa": {
+    "help": "inter-annotator agreement between the annotation files of each note",
+    "items": _iaa_items, "worker": _iaa_worker, "reduce": _iaa_reduce,
+    "arguments": [(("--raters",), {"type": int, "default": 2, "help": "use the notes with this many annotation files (default: %(default)s)"}),
+                  (("--match",), MATCH_ARGUMENT), (("--threshold",), THRESHOLD_ARGUMENT),
+                  (("--output", "-o"), {"help": "write the JSON report here instead of stdout"})]},
+  "score": {
+    "help": "precision, recall and F1 of the entities of system annotation files against the gold files of the same notes",
+    "items": _score_items, "worker": _score_worker, "reduce": _score_reduce,
+    "arguments": [(("--gold",), {"required": True, "help": "directory of the gold annotation files"}),
+                  (("--match",), MATCH_ARGUMENT), (("--threshold",), THRESHOLD_ARGUMENT),
+                  (("--output", "-o"), {"help": "write the JSON report here instead of stdout"})]},
+  "export": {
+    "help": "export entities and relations as JSON lines, one document per line",
+    "items": _files, "worker": _export_worker, "reduce": _export_reduce,
+    "arguments": [(("--output", "-o"), {"help": "write here instead of stdout"})]},
+  "validate": {
+    "help": "check entity IDs, relation arguments and spans, and with --schema types and properties; exits with 1 if any file is invalid",
+    "items": _files, "worker": _validate_worker, "reduce": _validate_reduce,
+    "arguments": [(("--schema",), {"help": "Anafora schema file to check entity and relation types, properties and values against"})]},
+  "bio": {
+    "help": "export token-level BIO or BIOES entity tags, one token and tag per line and a blank line after each section",
+    "items": _files, "worker": _bio_worker, "reduce": _bio_reduce,
+    "arguments": [(("--scheme",), {"choices": ["BIO", "BIOES"], "default": "BIO", "help": "tagging scheme (default: %(default)s)"}),
+                  (("--label",), {"help": "tag entities with the value of this property instead of their type"}),
+                  (("--types",), {"help": "comma-separated entity types to tag; default is all"}),
+                  (("--sentences",), {"action": "store_true", "help": "a blank line after each sentence instead of each section"}),
+                  (("--output", "-o"), {"help": "write here instead of stdout"})]},
+  "reserialize": {
+    "help": "load and write back annotation files, in place or under --output, atomically and only if they change",
+    "items": _files, "worker": _reserialize_worker, "reduce": _reserialize_reduce,
+    "arguments": [(("--output", "-o"), {"help": "directory to write the files under, mirroring their paths; default is in place"})]},
+}
@@ -0,0 +1,303 @@
+"""
+Finding, loading and processing the files of an Anafora project directory,
+which holds one directory per note, with the raw text in a file named after the note,
+and its annotation files as <note>.<schema>.<annotator>.<status>.xml beside it
+"""
+
+import fnmatch
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import time
+from functools import partial
+from multiprocessing import Pool
+
+from bs4 import BeautifulSoup as soup
+from lxml import etree
+
+from anafora4python import annotation, raw_text
+
+def find_annotation_files(paths, pattern="*.xml"):
+  """
+  paths: a file or directory, or a list of them
+  Return: a sorted list of the files matching pattern in paths and the directories below them
+  """
+  if isinstance(paths, str):
+    paths = [paths]
+
+  found = []
+  for path in paths:
+    if os.path.isdir(path):
+      for dirpath, _, filenames in os.walk(path):
+        found += [os.path.join(dirpath, f) for f in fnmatch.filter(filenames, pattern)]
+    else:
+      found.append(path)
+
+  return sorted(found)
+
+def note_name(path):
+  """
+  The note an annotation file belongs to, the first part of its name
+  """
+  return os.path.basename(path).split(".")[0]
+
+def raw_text_path(path):
+  """
+  Return: the path of the raw text for the annotation file at path
+  """
+  return os.path.join(os.path.dirname(path), note_name(path))
+
+def load_annotation(path, read_only=False, ids=None, parse_filter=None):
+  """
+  Return: an annotation.Document for the file at path, with its soup released if read_only,
+  interning its IDs in the annotation.IDTable ids if given,
+  and with only what the ParseFilter parse_filter keeps if given
+  """
+  if parse_filter is not None and not parse_filter.keeps_all():
+    with open(path, "rb") as f:
+      doc_soup = parse_filter.parse(f)
+  else:
+    parse_filter = None
+    with open(path) as f:
+      doc_soup = soup(f, "xml")
+  return annotation.Document(doc_soup, os.path.basename(path), read_only=read_only, ids=ids, parse_filter=parse_filter)
+
+
+class ParseFilter(object):
+  """
+  What load_annotation keeps of an annotation file. The file is first parsed with lxml, which is
+  much cheaper than BeautifulSoup, the annotations and properties left out are dropped from that tree,
+  and only what remains is built into BeautifulSoup, and then into Entities and Relations.
+
+  entity_types, relation_types: the types of the entities and relations to keep, or None for all
+  properties: the names of the properties to keep, or None for all. Properties pointing at entities
+              (annotation.ENTITY_ID_PROPERTIES) are always kept, so that relations keep their arguments
+  spans_only: keep only the ID and span of each entity, and no relations
+
+  Relations may then point at entities that were left out, see Document.dangling_entity_ids().
+  A filtered Document lacks part of its file, so write_document refuses to write it.
+  """
+  def __init__(self, entity_types=None, relation_types=None, properties=None, spans_only=False):
+    self.entity_types = frozenset(entity_types) if entity_types is not None else None
+    self.relation_types = frozenset(relation_types) if relation_types is not None else None
+    self.properties = frozenset(properties) if properties is not None else None
+    self.spans_only = spans_only
+
+  def __repr__(self):
+    return "ParseFilter(entity_types=%r, relation_types=%r, properties=%r, spans_only=%r)" %\
+           (self.entity_types, self.relation_types, self.properties, self.spans_only)
+
+  def keeps_all(self):
+    return self.entity_types is None and self.relation_types is None and self.properties is None and not self.spans_only
+
+  def parse(self, f):
+    """
+    f: an annotation file opened in binary mode
+    Return: the BeautifulSoup of f, with only what the filter keeps
+    """
+    events = etree.iterparse(f, events=("end",), tag=("entity", "relation"), recover=True, huge_tree=True)
+    for _, node in events:
+      self._filter(node)
+    return soup(etree.tostring(events.root), "xml")
+
+  def _filter(self, node):
+    if node.tag == "entity":
+      keep_types = self.entity_types
+    elif self.spans_only:
+      node.getparent().remove(node)
+      return
+    else:
+      keep_types = self.relation_types
+    if keep_types is not None:
+      type_node = node.find("type")
+      if ((type_node.text or "") if type_node is not None else "") not in keep_types:
+        node.getparent().remove(node)
+        return
+
+    if self.spans_only:
+      for child in list(node):
+        if child.tag not in ("id", "span"):
+          node.remove(child)
+    elif self.properties is not None:
+      properties = node.find("properties")
+      if properties is not None:
+        for child in list(properties):
+          if isinstance(child.tag, str) and child.tag not in self.properties\
+             and child.tag.lower() not in annotation.ENTITY_ID_PROPERTIES:
+            properties.remove(child)
+
+def load_raw_text(path, mapped=False):
+  """
+  Return: a raw_text.Document for the raw text of the note the annotation file at path belongs to,
+  a MappedDocument if mapped, or None if there is no raw text
+  """
+  text_path = raw_text_path(path)
+  if not os.path.isfile(text_path):
+    return None
+  if mapped:
+    return raw_text.MappedDocument(text_path, name=note_name(path))
+  with open(text_path) as f:
+    return raw_text.Document(f.read(), name=note_name(path))
+
+def map_files(function, items, jobs=1, chunksize=8):
+  """
+  Calls function on each of items (usually paths), in a pool of jobs processes if jobs > 1.
+  function must be picklable, i.e. defined at the top level of a module, or a functools.partial of one.
+
+  Return: an iterator of (item, result) tuples, in the order the results are ready
+  """
+  if jobs <= 1:
+    for item in items:
+      yield item, function(item)
+    return
+
+  pool = Pool(jobs)
+  try:
+    for result in pool.imap_unordered(_ItemCall(function), items, chunksize):
+      yield result
+    pool.close()
+  finally:
+    pool.terminate()
+    pool.join()
+
+
+class _ItemCall(object):
+  """
+  Picklable wrapper returning (item, function(item)), so unordered results keep their item
+  """
+  def __init__(self, function):
+    self.function = function
+
+  def __call__(self, item):
+    return item, self.function(item)
+
+
+def write_atomic(path, data, fsync=True):
+  """
+  Writes the bytes data to path through a temporary file in the same directory, renamed over path,
+  so that path always holds either its old or its new content, even if the process dies midway.
+  A new file gets the permissions of the old one, or the default ones.
+  """
+  directory = os.path.dirname(path) or "."
+  fd, temp_path = tempfile.mkstemp(dir=directory, prefix="." + os.path.basename(path) + ".", suffix=".tmp")
+  try:
+    with os.fdopen(fd, "wb") as f:
+      f.write(data)
+      if fsync:
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+      mode = os.stat(path).st_mode & 0o7777
+    except OSError:
+      umask = os.umask(0)
+      os.umask(umask)
+      mode = 0o666 & ~umask
+    os.chmod(temp_path, mode)
+    os.replace(temp_path, path)
+  except BaseException:
+    if os.path.exists(temp_path):
+      os.remove(temp_path)
+    raise
+
+def same_content(path, data):
+  """
+  Return: whether the file at path holds the bytes data, by size then content hash
+  """
+  try:
+    if os.path.getsize(path) != len(data):
+      return False
+    with open(path, "rb") as f:
+      return hashlib.sha1(f.read()).digest() == hashlib.sha1(data).digest()
+  except OSError:
+    return False
+
+def write_document(doc, path, fsync=True):
+  """
+  Writes an annotation Document to path with write_atomic, after update_soup so that changes to its annotations
+  are kept, unless the file already holds the same XML
+
+  Return: a tuple of ("written" or "unchanged", number of bytes)
+  """
+  if doc.parse_filter is not None:
+    raise ValueError("%s was loaded with %r, and writing it would lose what was left out" % (doc.filename, doc.parse_filter))
+  doc.update_soup()
+  data = doc.pp().encode("utf-8")
+  if same_content(path, data):
+    return "unchanged", len(data)
+  directory = os.path.dirname(path)
+  if directory and not os.path.isdir(directory):
+    os.makedirs(directory)
+  write_atomic(path, data, fsync)
+  return "written", len(data)
+
+
+class WriteSummary(object):
+  """
+  What write_documents did: the paths written and left unchanged, {path: error message} for
+  the documents that could not be written, the number of bytes of XML and the seconds it took
+  """
+  def __init__(self):
+    self.written = []
+    self.unchanged = []
+    self.errors = {}
+    self.bytes = 0
+    self.seconds = 0.0
+
+  def add(self, path, result):
+    status, value = result
+    if status == "error":
+      self.errors[path] = value
+      return
+    (self.written if status == "written" else self.unchanged).append(path)
+    self.bytes += value
+
+  def __str__(self):
+    n = len(self.written) + len(self.unchanged)
+    seconds = max(self.seconds, 1e-9)
+    return "%d written, %d unchanged, %d failed in %.2fs (%.1f documents/s, %.1f MB/s)" %\
+           (len(self.written), len(self.unchanged), len(self.errors), self.seconds, n / seconds, self.bytes / seconds / 1e6)
+
+
+def write_documents(documents, jobs=1, fsync=True, chunksize=4):
+  """
+  Writes each of documents, a list of (annotation Document, path), with write_document,
+  in a pool of jobs processes if jobs > 1.
+  The workers are forked, so they serialize the documents from the memory they share with this process,
+  rather than having them pickled over. Where processes cannot be forked, documents are written in turn.
+
+  Return: a WriteSummary
+  """
+  global _documents_to_write
+  items = list(documents)
+  summary = WriteSummary()
+  start = time.time()
+  if jobs > 1 and len(items) > 1 and "fork" in multiprocessing.get_all_start_methods():
+    _documents_to_write = items
+    try:
+      pool = multiprocessing.get_context("fork").Pool(min(jobs, len(items)))
+      try:
+        for i, result in pool.imap_unordered(partial(_write_nth, fsync=fsync), range(len(items)), chunksize):
+          summary.add(items[i][1], result)
+        pool.close()
+      finally:
+        pool.terminate()
+        pool.join()
+    finally:
+      _documents_to_write = None
+  else:
+    for i in range(len(items)):
+      summary.add(items[i][1], _write_nth(i, fsync, items)[1])
+
+  summary.seconds = time.time() - start
+  return summary
+
+# The documents of the write_documents call in progress, inherited by its forked workers
+_documents_to_write = None
+
+def _write_nth(i, fsync=True, items=None):
+  doc, path = (items or _documents_to_write)[i]
+  try:
+    return i, write_document(doc, path, fsync)
+  except Exception as e:
+    return i, ("error", "%s: %s" % (type(e).__name__, e))
@@ -0,0 +1,267 @@
+"""
+Finding near-duplicate notes, such as copy-forward notes, by the text of their sections.
+
+Each raw text is tokenized, its sections found as by annotation_text.Document, and the lower-cased
+k-token shingles of their contents (leaving out the section marker lines, which every note shares)
+are summarized by a MinHash signature: for each of num_perm hash functions, the least hash of any shingle.
+The fraction of equal entries of two signatures estimates the Jaccard similarity of the shingle sets.
+
+A NoteIndex keeps the signatures and a locality-sensitive hashing table: signatures are cut into bands,
+and notes sharing any whole band are candidates, so a note is only compared with the few notes likely
+to be similar, not the whole corpus. Signatures are computed in a pool of processes,
+and the index is saved between runs, so that update() only reads the notes that are new or changed.
+"""
+
+import os
+import pickle
+import zlib
+from collections import Counter
+from collections import defaultdict as dd
+
+import numpy as np
+
+from anafora4python import annotation_text, corpus, raw_text
+
+# The universal hash functions are (a * x + b) mod a Mersenne prime larger than any 32-bit hash,
+# with a below 2 ** 31, so that a * x + b of a 32-bit x stays below 2 ** 64 and is computed exactly in uint64
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_MAX_A = (1 << 31) - 1
+
+class MinHasher(object):
+  """
+  num_perm: the length of the signatures
+  shingle: the number of tokens in a shingle
+  sections: the IDs of the sections to use, or None for all of them
+  """
+  def __init__(self, num_perm=128, shingle=5, sections=None, seed=1):
+    self.num_perm = num_perm
+    self.shingle = shingle
+    self.sections = frozenset(sections) if sections is not None else None
+    generator = np.random.RandomState(seed)
+    self._a = generator.randint(1, _MAX_A, size=num_perm, dtype=np.uint64)
+    self._b = generator.randint(0, _MAX_HASH, size=num_perm, dtype=np.uint64)
+
+  def shingles(self, raw):
+    """
+    Return: the set of shingles of the raw_text.Document raw, as strings of shingle tokens
+    """
+    raw.tokenize()
+    sections = annotation_text.Document(None, raw).sections
+    if sections:
+      regions = [(section.content_start, section.content_end) for section in sections\
+                 if self.sections is None or section.id in self.sections]
+    else:
+      regions = [(0, len(raw.text))]
+
+    shingles = set()
+    for start, end in regions:
+      tokens = raw.span_to_tokens((start, end))
+      if tokens is None:
+        continue
+      words = [token.lower() for token in raw.tokens[tokens[0]:tokens[1]]]
+      size = min(self.shingle, len(words))
+      shingles.update(" ".join(words[i:i + size]) for i in range(len(words) - size + 1))
+    return shingles
+
+  def signature(self, shingles):
+    """
+    Return: the MinHash signature of a set of shingles, an array of num_perm 32-bit hashes
+    """
+    if not shingles:
+      return np.full(self.num_perm, _MAX_HASH, dtype=np.uint32)
+    hashes = np.array([zlib.crc32(s.encode("utf-8")) for s in shingles], dtype=np.uint64)
+    permuted = (np.outer(self._a, hashes) + self._b[:, np.newaxis]) % _PRIME & _MAX_HASH
+    return permuted.min(axis=1).astype(np.uint32)
+
+  def __call__(self, path):
+    """
+    Return: the signature of the raw text at path, or an error message
+    """
+    try:
+      with open(path) as f:
+        raw = raw_text.Document(f.read(), name=os.path.basename(path))
+      return self.signature(self.shingles(raw))
+    except Exception as e:
+      return "%s: %s" % (type(e).__name__, e)
+
+
+def similarity(signature, other_signature):
+  """
+  Return: the estimated Jaccard similarity of the shingles of two signatures
+  """
+  return float(np.mean(signature == other_signature))
+
+
+class NoteIndex(object):
+  """
+  The MinHash signatures of the notes of a corpus, keyed by the path of their raw text, and their LSH table.
+
+  bands: the number of bands signatures are cut into. Notes with a similarity s share a band
+         with a probability of 1 - (1 - s ** rows) ** bands, where rows = num_perm / bands,
+         so more bands find less similar notes, at the cost of more candidates
+  threshold: the least estimated similarity of near-duplicates
+  """
+  def __init__(self, hasher=None, bands=16, threshold=0.8):
+    self.hasher = hasher if hasher is not None else MinHasher()
+    if self.hasher.num_perm % bands:
+      raise ValueError("bands must divide num_perm (%d), not %d" % (self.hasher.num_perm, bands))
+    self.bands = bands
+    self.rows = self.hasher.num_perm // bands
+    self.threshold = threshold
+    # {path: ((mtime, size), signature)}
+    self.signatures = {}
+    # {path: error message} for the raw texts that could not be read
+    self.errors = {}
+    # One {band bytes: set of paths} per band
+    self._buckets = [dd(set) for _ in range(bands)]
+
+  @classmethod
+  def load(cls, filename):
+    with open(filename, "rb") as f:
+      return pickle.load(f)
+
+  def save(self, filename):
+    with open(filename, "wb") as f:
+      pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+
+  def __len__(self):
+    return len(self.signatures)
+
+  def update(self, paths, jobs=1):
+    """
+    Brings the index up to date with the raw texts in paths: texts that are no longer there are dropped,
+    and new or changed ones are signed in a pool of jobs processes
+
+    Return: a list of the paths that were signed
+    """
+    paths = set(paths)
+    for path in [path for path in list(self.signatures) + list(self.errors) if path not in paths]:
+      self.remove(path)
+    keys = {}
+    for path in sorted(paths):
+      key = _file_key(path)
+      if path not in self.signatures or self.signatures[path][0] != key:
+        keys[path] = key
+    for path, signature in corpus.map_files(self.hasher, sorted(keys), jobs):
+      self.remove(path)
+      if isinstance(signature, str):
+        self.errors[path] = signature
+      else:
+        self.add(path, keys[path], signature)
+    return sorted(keys)
+
+  def add(self, path, key, signature):
+    self.errors.pop(path, None)
+    self.signatures[path] = (key, signature)
+    for band, bucket in zip(self._bands(signature), self._buckets):
+      bucket[band].add(path)
+
+  def remove(self, path):
+    self.errors.pop(path, None)
+    if path not in self.signatures:
+      return
+    _, signature = self.signatures.pop(path)
+    for band, bucket in zip(self._bands(signature), self._buckets):
+      bucket[band].discard(path)
+      if not bucket[band]:
+        del bucket[band]
+
+  def query(self, signature, exclude=None):
+    """
+    Return: a list of (path, estimated similarity) of the notes whose similarity with signature
+    is at least threshold, most similar first, leaving out the note at exclude
+    """
+    candidates = set()
+    for band, bucket in zip(self._bands(signature), self._buckets):
+      candidates |= bucket.get(band, set())
+    candidates.discard(exclude)
+    found = [(path, similarity(signature, self.signatures[path][1])) for path in candidates]
+    return sorted([(path, s) for path, s in found if s >= self.threshold], key=lambda found: (-found[1], found[0]))
+
+  def check(self, path):
+    """
+    Return: the near-duplicates of the raw text at path, as query(), without adding it
+    """
+    signature = self.hasher(path)
+    if isinstance(signature, str):
+      raise IOError(signature)
+    return self.query(signature, exclude=path)
+
+  def pairs(self):
+    """
+    Return: a sorted list of (path, other path, estimated similarity) of every pair of near-duplicates
+    """
+    pairs = set()
+    for path, (_, signature) in self.signatures.items():
+      for other, s in self.query(signature, exclude=path):
+        pairs.add((min(path, other), max(path, other), s))
+    return sorted(pairs)
+
+  def clusters(self):
+    """
+    Return: a list of the sorted lists of paths connected by near-duplicate pairs, largest first
+    """
+    parent = {}
+
+    def find(path):
+      while parent.setdefault(path, path) != path:
+        parent[path] = parent[parent[path]]
+        path = parent[path]
+      return path
+
+    for path, other, _ in self.pairs():
+      parent[find(other)] = find(path)
+    groups = dd(list)
+    for path in parent:
+      groups[find(path)].append(path)
+    return sorted((sorted(group) for group in groups.values()), key=lambda group: (-len(group), group))
+
+  def _bands(self, signature):
+    return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+
+def find_raw_texts(paths):
+  """
+  Return: a sorted list of the raw texts under paths, the files named after the note directory they are in
+  """
+  if isinstance(paths, str):
+    paths = [paths]
+  found = []
+  for path in paths:
+    if os.path.isfile(path):
+      found.append(path)
+      continue
+    for dirpath, _, filenames in os.walk(path):
+      name = os.path.basename(dirpath)
+      if name in filenames:
+        found.append(os.path.join(dirpath, name))
+  return sorted(found)
+
+def annotation_overlap(path, other_path, pattern="*.xml"):
+  """
+  Compares the annotations of two notes given the paths of their raw texts, using for each
+  its gold annotation file, or else the first one matching pattern. Entities are compared by type and text,
+  since the offsets of the same text differ between notes.
+
+  Return: a dict of {"entities": [number in each], "shared": number of (type, text) in both},
+  or None if either has no annotation file
+  """
+  counts = []
+  for text_path in (path, other_path):
+    ann_paths = [p for p in corpus.find_annotation_files(os.path.dirname(text_path), pattern)\
+                 if corpus.note_name(p) == os.path.basename(text_path)]
+    if not ann_paths:
+      return None
+    gold = [p for p in ann_paths if os.path.basename(p).split(".")[-3:-2] == ["gold"]]
+    doc = corpus.load_annotation((gold or ann_paths)[0], read_only=True)
+    with open(text_path) as f:
+      text = f.read()
+    counts.append(Counter((ent.type, " ".join(text[start:end] for start, end in ent.spans).lower())\
+                          for ent in doc.get_entities()))
+  return {"entities": [sum(c.values()) for c in counts], "shared": sum((counts[0] & counts[1]).values())}
+
+
+def _file_key(path):
+  stat = os.stat(path)
+  return (stat.st_mtime_ns, stat.st_size)
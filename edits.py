@@ -0,0 +1,169 @@
+"""
+Replacing parts of a raw text, such as names for de-identification, and moving the spans
+of its annotations to match.
+
+An EditLog collects a batch of replacements, then builds once a table of the edits in order
+with the cumulative change in length before each, so that any offset of the old text is moved
+to the new text by bisecting that table. The spans of every entity are then moved in one pass
+over the Document, whatever the number of edits:
+
+  log = edits.EditLog()
+  log.replace_matches(raw, r"Dr\\. \\w+", "Dr. [NAME]")
+  flagged = log.apply(raw, [annotation_doc])
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+
+from anafora4python import raw_text
+
+class EditLog(object):
+  """
+  Replacements of (start, end) character spans of the old text by new strings. Replaced spans may not
+  overlap, but insertions (empty spans) may be next to them, and several at one offset go in the order given.
+
+  A span of an annotation moves with the text around it. A span starting or ending inside a replaced span
+  is stretched to the whole replacement, and spans that lose or gain any character, by overlapping
+  a replaced span or having text inserted inside them, are flagged by apply()
+  """
+  def __init__(self):
+    # (start, end, replacement, order added)
+    self.edits = []
+    self._table = None
+
+  def __len__(self):
+    return len(self.edits)
+
+  def replace(self, start, end, replacement):
+    if not 0 <= start <= end:
+      raise ValueError("invalid span to replace: (%r, %r)" % (start, end))
+    self.edits.append((start, end, replacement, len(self.edits)))
+    self._table = None
+
+  def delete(self, start, end):
+    self.replace(start, end, "")
+
+  def insert(self, offset, text):
+    self.replace(offset, offset, text)
+
+  def replace_matches(self, raw, regex, replacement):
+    """
+    Replaces every match of regex in the raw_text.Document raw with replacement,
+    a string, or a function from the matched string to its replacement
+
+    Return: the number of matches
+    """
+    matches = raw.find_spans_and_strings_by_regex(regex)
+    for start, end, matched in matches:
+      self.replace(start, end, replacement(matched) if callable(replacement) else replacement)
+    return len(matches)
+
+  def _get_table(self):
+    """
+    Return: arrays of the starts and ends of the edits in the old text, the starts and ends
+    of their replacements in the new text, and the change in length before each edit and after the last
+    """
+    if self._table is None:
+      edits = sorted(self.edits, key=lambda edit: (edit[0], edit[1], edit[3]))
+      starts, ends = array("q"), array("q")
+      new_starts, new_ends = array("q"), array("q")
+      shifts = array("q", [0])
+      for start, end, replacement, _ in edits:
+        if ends and start < ends[-1]:
+          raise ValueError("replaced spans overlap at (%d, %d)" % (start, end))
+        starts.append(start)
+        ends.append(end)
+        new_starts.append(start + shifts[-1])
+        new_ends.append(new_starts[-1] + len(replacement))
+        shifts.append(shifts[-1] + len(replacement) - (end - start))
+      self._table = (edits, starts, ends, new_starts, new_ends, shifts)
+    return self._table
+
+  def map_start(self, offset):
+    """
+    Return: where a span starting at offset of the old text starts in the new text,
+    after any text inserted at offset
+    """
+    _, starts, ends, new_starts, _, shifts = self._get_table()
+    k = bisect_right(ends, offset)
+    if k < len(starts) and starts[k] < offset:
+      return new_starts[k]
+    return offset + shifts[k]
+
+  def map_end(self, offset):
+    """
+    Return: where a span ending at offset of the old text ends in the new text,
+    before any text inserted at offset
+    """
+    _, starts, ends, _, new_ends, shifts = self._get_table()
+    k = bisect_left(ends, offset)
+    while k < len(starts) and ends[k] == offset and starts[k] < offset:
+      k += 1
+    if k < len(starts) and starts[k] < offset:
+      return new_ends[k]
+    return offset + shifts[k]
+
+  def map_span(self, span):
+    start = self.map_start(span[0])
+    return (start, start if span[1] == span[0] else max(start, self.map_end(span[1])))
+
+  def map_spans(self, spans):
+    return [self.map_span(span) for span in spans]
+
+  def intersects(self, span):
+    """
+    Return: whether span overlaps a replaced span, or has text inserted inside it
+    """
+    _, starts, ends, _, _, _ = self._get_table()
+    start, end = span
+    k = bisect_right(ends, start)
+    while k < len(starts) and starts[k] < end:
+      if starts[k] < ends[k] or starts[k] > start:
+        return True
+      k += 1
+    return False
+
+  def apply_text(self, text):
+    """
+    Return: text with the edits made
+    """
+    edits = self._get_table()[0]
+    if edits and edits[-1][1] > len(text):
+      raise ValueError("edit at (%d, %d) is past the end of the text" % edits[-1][:2])
+    pieces = []
+    previous = 0
+    for start, end, replacement, _ in edits:
+      pieces.append(text[previous:start])
+      pieces.append(replacement)
+      previous = end
+    pieces.append(text[previous:])
+    return "".join(pieces)
+
+  def apply(self, raw, documents=(), doc_id=None):
+    """
+    Makes the edits to the text of the raw_text.Document raw in place, and moves the spans of the entities
+    of the annotation Documents in documents to match, with Document.remap_spans.
+    A MappedDocument cannot be changed in place: write out apply_text(raw.text) and map that instead.
+
+    doc_id: only move the entities of this document, for annotation files spanning several,
+            whose spans are offsets into different raw texts
+
+    Return: a list of (Entity, old span) for the spans that intersect the edits
+    """
+    if isinstance(raw, raw_text.MappedDocument):
+      raise TypeError("a MappedDocument cannot be edited in place")
+    text = self.apply_text(raw.text)
+    flagged = []
+
+    def remap(ent):
+      for span in ent.spans:
+        if self.intersects(span):
+          flagged.append((ent, span))
+      return self.map_spans(ent.spans)
+
+    for doc in documents:
+      doc.remap_spans(remap, doc_id)
+    raw.text = text
+    raw.tokens = []
+    raw._reset_tokens()
+    return flagged
@@ -0,0 +1,277 @@
+"""
+Chance-corrected agreement statistics: Cohen's kappa from confusion matrices between
+two annotators, and Fleiss' kappa and Krippendorff's alpha between any number of them.
+
+Labels are interned as integer codes, and counts are kept in NumPy arrays indexed by those codes,
+so that counting is vectorized, and results for documents can be added together into corpus totals.
+"""
+
+import copy
+import numpy as np
+from collections import defaultdict as dd
+
+from anafora4python import annotation, merge
+
+# The label of an annotator who did not annotate an entity, or did not give it a property
+NO_ANNOTATION = "<no annotation>"
+
+class LabelCodes(object):
+  """
+  Interns labels as consecutive integer codes
+  """
+  def __init__(self):
+    self.codes = {}
+    self.labels = []
+
+  def __len__(self):
+    return len(self.labels)
+
+  def code(self, label):
+    if label not in self.codes:
+      self.codes[label] = len(self.labels)
+      self.labels.append(label)
+    return self.codes[label]
+
+  def encode(self, labels):
+    """
+    Return: a NumPy array of the codes for labels, with -1 for None
+    """
+    return np.array([-1 if label is None else self.code(label) for label in labels], dtype=np.int64)
+
+
+class LabelCounts(object):
+  """
+  Base class for counts in arrays with one axis per label, over the labels in self.labels
+  """
+  # Names of the attributes holding arrays with label axes, and how many label axes each has
+  arrays = {}
+
+  def __init__(self):
+    self.labels = LabelCodes()
+    for name, n_axes in self.arrays.items():
+      setattr(self, name, np.zeros((0,) * n_axes, dtype=np.float64))
+
+  def _grow(self):
+    """
+    Pads the arrays out to the number of labels interned so far
+    """
+    size = len(self.labels)
+    for name, n_axes in self.arrays.items():
+      counts = getattr(self, name)
+      if counts.shape[0] < size:
+        setattr(self, name, np.pad(counts, [(0, size - counts.shape[0])] * n_axes))
+
+  def __iadd__(self, other):
+    """
+    Adds the counts of other, whose labels may have different codes
+    """
+    remap = self.labels.encode(other.labels.labels)
+    self._grow()
+    for name, n_axes in self.arrays.items():
+      getattr(self, name)[np.ix_(*[remap] * n_axes)] += getattr(other, name)
+    self._add_totals(other)
+    return self
+
+  def __add__(self, other):
+    total = copy.deepcopy(self)
+    total += other
+    return total
+
+  def _add_totals(self, other):
+    """
+    Adds any counts of other that are not kept in label arrays
+    """
+    pass
+
+
+class ConfusionMatrix(LabelCounts):
+  """
+  Counts of (label from annotator 1, label from annotator 2) pairs:
+  counts[i, j] is how often annotator 1 chose labels.labels[i] where annotator 2 chose labels.labels[j]
+  """
+  arrays = {"counts": 2}
+
+  def add(self, labels1, labels2):
+    """
+    Counts each pair of labels from the two equally long lists
+    """
+    codes1 = self.labels.encode(labels1)
+    codes2 = self.labels.encode(labels2)
+    self._grow()
+    size = len(self.labels)
+    self.counts += np.bincount(codes1 * size + codes2, minlength=size * size).reshape(size, size)
+
+  def total(self):
+    return self.counts.sum()
+
+  def observed_agreement(self):
+    total = self.total()
+    return float(np.trace(self.counts) / total) if total else float("nan")
+
+  def cohen_kappa(self):
+    total = self.total()
+    if not total:
+      return float("nan")
+    observed = np.trace(self.counts) / total
+    expected = np.dot(self.counts.sum(axis=1), self.counts.sum(axis=0)) / total ** 2
+    if expected == 1:
+      return 1.0
+    return float((observed - expected) / (1 - expected))
+
+  def to_dict(self):
+    """
+    Return: a dict of {label from annotator 1: {label from annotator 2: count}}, without zero counts
+    """
+    labels = self.labels.labels
+    rows, cols = np.nonzero(self.counts)
+    matrix = dd(dict)
+    for i, j in zip(rows, cols):
+      matrix[labels[i]][labels[j]] = int(self.counts[i, j])
+    return dict(matrix)
+
+
+class MultiRaterCounts(LabelCounts):
+  """
+  Sufficient statistics for agreement between a fixed number of annotators over many units,
+  each unit being labelled by some or all of them.
+
+  Krippendorff's alpha is computed from the coincidence matrix, which takes every unit labelled
+  by two annotators or more. Fleiss' kappa only takes units labelled by all of them, and is computed
+  from the number of such units, the sum of the squares of their per-label counts, and the per-label totals.
+  All of these add up across documents.
+  """
+  arrays = {"coincidences": 2, "label_totals": 1}
+
+  def __init__(self, n_raters):
+    super(MultiRaterCounts, self).__init__()
+    self.n_raters = n_raters
+    self.complete_units = 0
+    self.sum_of_squares = 0.0
+
+  def _add_totals(self, other):
+    self.complete_units += other.complete_units
+    self.sum_of_squares += other.sum_of_squares
+
+  def add_units(self, units):
+    """
+    units: a list of lists of n_raters labels each, with None where an annotator gave no label
+    """
+    if not units:
+      return
+    codes = self.labels.encode([label for unit in units for label in unit]).reshape(len(units), self.n_raters)
+    self._grow()
+    counts = np.zeros((len(units), len(self.labels)))
+    rows = np.repeat(np.arange(len(units)), self.n_raters)
+    labelled = codes.ravel() >= 0
+    np.add.at(counts, (rows[labelled], codes.ravel()[labelled]), 1)
+    per_unit = counts.sum(axis=1)
+
+    pairable = counts[per_unit >= 2]
+    weights = 1.0 / (per_unit[per_unit >= 2] - 1)
+    self.coincidences += np.dot((pairable * weights[:, None]).T, pairable) - np.diag(np.dot(weights, pairable))
+
+    complete = counts[per_unit == self.n_raters]
+    self.complete_units += len(complete)
+    self.sum_of_squares += (complete ** 2).sum()
+    self.label_totals += complete.sum(axis=0)
+
+  def krippendorff_alpha(self):
+    """
+    Nominal Krippendorff's alpha
+    """
+    label_sums = self.coincidences.sum(axis=1)
+    total = label_sums.sum()
+    expected = total ** 2 - (label_sums ** 2).sum()
+    if not expected:
+      return 1.0 if total else float("nan")
+    return float(1 - (total - 1) * (total - np.trace(self.coincidences)) / expected)
+
+  def fleiss_kappa(self):
+    n = self.n_raters
+    units = self.complete_units
+    if not units or n < 2:
+      return float("nan")
+    observed = (self.sum_of_squares - units * n) / (units * n * (n - 1))
+    expected = ((self.label_totals / (units * n)) ** 2).sum()
+    if expected == 1:
+      return 1.0
+    return float((observed - expected) / (1 - expected))
+
+
+def get_entity_confusion(doc1, doc2, mode="exact", threshold=0.5):
+  """
+  Entities are aligned as by merge.align_entities, by their spans as mode (one of alignment.MODES) and threshold say
+
+  Return: a ConfusionMatrix of entity types between the two documents,
+  with NO_ANNOTATION for entities only one of them has
+  """
+  labels1, labels2 = _entity_type_units([doc1, doc2], mode, threshold)
+  confusion = ConfusionMatrix()
+  confusion.add(labels1, labels2)
+  return confusion
+
+def get_property_confusions(doc1, doc2, by_type=False, mode="exact", threshold=0.5):
+  """
+  Return: a dict of {property name: ConfusionMatrix of its values}, over the entities both documents have,
+  with NO_ANNOTATION where only one of them gave the property.
+  With by_type, the dict is keyed by (entity type, property name) instead, using doc1's entity types.
+  """
+  confusions = dd(ConfusionMatrix)
+  for key, (labels1, labels2) in _property_units([doc1, doc2], by_type, mode, threshold).items():
+    confusions[key].add(labels1, labels2)
+  return dict(confusions)
+
+def get_entity_reliability(documents, mode="exact", threshold=0.5):
+  """
+  Return: MultiRaterCounts of entity types between all the documents,
+  with NO_ANNOTATION for the documents that do not have an entity
+  """
+  reliability = MultiRaterCounts(len(documents))
+  reliability.add_units(list(zip(*_entity_type_units(documents, mode, threshold))))
+  return reliability
+
+def get_property_reliability(documents, by_type=False, mode="exact", threshold=0.5):
+  """
+  Return: a dict of {property name: MultiRaterCounts of its values} between all the documents.
+  A document without the entity gives no label, one with the entity but not the property gives NO_ANNOTATION.
+  See get_property_confusions for by_type.
+  """
+  reliabilities = {}
+  for key, labels in _property_units(documents, by_type, mode, threshold).items():
+    reliabilities[key] = MultiRaterCounts(len(documents))
+    reliabilities[key].add_units(list(zip(*labels)))
+  return reliabilities
+
+
+def _entity_type_units(documents, mode="exact", threshold=0.5):
+  """
+  Return: one list of labels per document, with the entity type it has
+  for each aligned entity, or NO_ANNOTATION
+  """
+  labels = [[] for _ in documents]
+  for _, slot in merge.align_entities(documents, mode, threshold):
+    for i in range(len(documents)):
+      labels[i].append(slot[i].type if i in slot else NO_ANNOTATION)
+  return labels
+
+def _property_units(documents, by_type=False, mode="exact", threshold=0.5):
+  """
+  Return: a dict of {property name, or (type, name): one list of labels per document}.
+  For the pairwise case only entities every document has are used, otherwise documents
+  without the entity get None
+  """
+  units = dd(lambda: [[] for _ in documents])
+  for _, slot in merge.align_entities(documents, mode, threshold):
+    if len(documents) == 2 and len(slot) < 2:
+      continue
+    values = dict((i, _property_values(ent)) for i, ent in slot.items())
+    first = slot[min(slot)]
+    for name in set(name for props in values.values() for name in props):
+      key = (first.type, name) if by_type else name
+      for i in range(len(documents)):
+        units[key][i].append(values[i].get(name, NO_ANNOTATION) if i in values else None)
+  return dict(units)
+
+def _property_values(entity):
+  return dict((name, value) for name, value in entity.property_items()\
+              if name.lower() not in annotation.ENTITY_ID_PROPERTIES)
@@ -0,0 +1,68 @@
+"""
+Scoring system annotations against gold ones: precision, recall and F1 of the entities,
+aligned exactly or leniently by their spans (see alignment.MODES).
+"""
+
+from collections import defaultdict as dd
+
+class Scores(object):
+  """
+  Counts of true positives, false positives and false negatives, which add up across documents
+  """
+  def __init__(self, tp=0, fp=0, fn=0):
+    self.tp = tp
+    self.fp = fp
+    self.fn = fn
+
+  def __iadd__(self, other):
+    self.tp += other.tp
+    self.fp += other.fp
+    self.fn += other.fn
+    return self
+
+  def __add__(self, other):
+    return Scores(self.tp + other.tp, self.fp + other.fp, self.fn + other.fn)
+
+  def __repr__(self):
+    return "Scores(tp=%d, fp=%d, fn=%d)" % (self.tp, self.fp, self.fn)
+
+  def precision(self):
+    return self.tp / float(self.tp + self.fp) if self.tp + self.fp else float("nan")
+
+  def recall(self):
+    return self.tp / float(self.tp + self.fn) if self.tp + self.fn else float("nan")
+
+  def f1(self):
+    if not self.tp:
+      return 0.0 if self.fp or self.fn else float("nan")
+    return 2 * self.tp / float(2 * self.tp + self.fp + self.fn)
+
+  def to_dict(self):
+    return {"tp": self.tp, "fp": self.fp, "fn": self.fn,
+            "precision": self.precision(), "recall": self.recall(), "f1": self.f1()}
+
+
+def score_entities(gold, system, mode="exact", threshold=0.5, by_type=False):
+  """
+  Aligns the entities of the system Document with those of the gold Document with Document.align_entities_with.
+  An aligned system entity of the gold entity's type is a true positive, any other system entity
+  a false positive, and any other gold entity a false negative.
+
+  Return: Scores, or with by_type a dict of {entity type: Scores}
+  """
+  scores = dd(Scores)
+  for gold_ent, system_ent in gold.align_entities_with(system, mode, threshold):
+    if gold_ent is not None and system_ent is not None and gold_ent.type == system_ent.type:
+      scores[gold_ent.type].tp += 1
+      continue
+    if gold_ent is not None:
+      scores[gold_ent.type].fn += 1
+    if system_ent is not None:
+      scores[system_ent.type].fp += 1
+
+  if by_type:
+    return dict(scores)
+  total = Scores()
+  for type_scores in scores.values():
+    total += type_scores
+  return total
@@ -0,0 +1,280 @@
+"""
+Merges several annotators' copies of the same note into a single
+annotation Document, to be used as the starting point for adjudication
+"""
+
+import copy
+from collections import Counter
+from collections import defaultdict as dd
+
+from anafora4python import alignment, annotation
+
+def majority_vote(votes, n_annotators):
+  """
+  votes: a Counter of {value: number of annotators that chose it}
+  Return: the value chosen by more than half of the annotators, or None
+  """
+  if votes:
+    value, count = votes.most_common(1)[0]
+    if count * 2 > n_annotators:
+      return value
+
+def unanimous_vote(votes, n_annotators):
+  """
+  Return: the value chosen by every annotator, or None
+  """
+  if len(votes) == 1:
+    value, count = votes.most_common(1)[0]
+    if count == n_annotators:
+      return value
+
+def plurality_vote(votes, n_annotators):
+  """
+  Return: the value chosen most often, or None if there is a tie for first
+  """
+  top = votes.most_common(2)
+  if top and (len(top) == 1 or top[0][1] > top[1][1]):
+    return top[0][0]
+
+
+def merge_documents(documents, filename=None, annotator="adjudication",\
+                    presence_vote=majority_vote, type_vote=majority_vote, property_vote=majority_vote):
+  """
+  Merges N annotation Documents of the same note.
+
+  Entities from every document are aligned in a single hashing pass on their (doc ID, span),
+  and relations on their type and the aligned entities they point to, so the cost is linear
+  in the total number of annotations however many annotators there are.
+
+  Each decision is made by one of the vote functions, called as vote(Counter of {value: count}, number of voters).
+  presence_vote decides whether an entity or relation is kept, from a Counter of {True: n, False: N - n}
+  without a count of 0;
+  type_vote decides an entity's type, and property_vote the value of each property,
+  where only the annotators who have the entity or relation vote.
+  When a vote returns None, the decision is unresolved: the annotation is kept with the most common
+  value, and a conflict is recorded.
+
+  Relations pointing at an entity that was voted out, or that is not in their document, cannot be merged;
+  each is reported as a conflict with the "dropped" field, an ID of None, and the relations it stands for.
+
+  Return: a tuple of (merged Document, list of conflicts), where each conflict is a dict of
+    {"kind": "entity" or "relation", "id": ID in the merged Document,
+     "field": "presence", "type" or a property name, "votes": {value: count}},
+    and for dropped relations also "reason": "entity voted out" or "entity not found",
+    and "sources": [(index in documents, relation ID)]
+  """
+  documents = list(documents)
+  n = len(documents)
+  slots = align_entities(documents)
+  merged_soup = copy.copy(documents[0].soup)
+  merged_soup.annotations.clear()
+  filename = filename or documents[0].filename
+  conflicts = []
+
+  # Each kept slot gets its new ID, used to rewrite the relations that point at it
+  slot_ids = {}
+  for slot_num, (doc_id, slot) in enumerate(slots):
+    entities = list(slot.values())
+    presence = _vote(presence_vote, _presence_votes(len(entities), n), n, default=True)
+    if presence[0] is False:
+      continue
+    ent_id = "%s@e@%s@%s" % (len(slot_ids) + 1, doc_id, annotator)
+    slot_ids[slot_num] = ent_id
+    ent_type = _vote(type_vote, Counter(e.type for e in entities), len(entities))
+    properties = _vote_properties(property_vote, entities)
+    for field, (value, votes) in [("presence", presence), ("type", ent_type)] + properties:
+      if votes is not None:
+        conflicts.append({"kind": "entity", "id": ent_id, "field": field, "votes": votes})
+
+    merged_soup.annotations.append(_new_tag(merged_soup, "entity", [
+      ("id", ent_id), ("span", entities[0].span_string), ("type", ent_type[0]),
+      ("parentsType", entities[0].parentsType)], [(name, value) for name, (value, _) in properties]))
+
+  aligned_relations, dangling = _align_relations(documents, slots)
+  for i, rel in dangling:
+    conflicts.append(_dropped_relation([(i, rel)], "entity not found", n))
+  n_relations = 0
+  for key, relations in aligned_relations:
+    rel_type, args = key
+    if any(slot_num not in slot_ids for _, slot_num in args):
+      conflicts.append(_dropped_relation(relations, "entity voted out", n))
+      continue
+    relations = [rel for _, rel in relations]
+    presence = _vote(presence_vote, _presence_votes(len(relations), n), n, default=True)
+    if presence[0] is False:
+      continue
+    arg_ids = [(role, slot_ids[slot_num]) for role, slot_num in args]
+    rel_docs = set(slots[slot_num][0] for _, slot_num in args)
+    docname = rel_docs.pop() if len(rel_docs) == 1 else filename.split(".")[0]
+    n_relations += 1
+    rel_id = "%s@r@%s@%s" % (n_relations, docname, annotator)
+    properties = _vote_properties(property_vote, relations)
+    for field, (value, votes) in [("presence", presence)] + properties:
+      if votes is not None:
+        conflicts.append({"kind": "relation", "id": rel_id, "field": field, "votes": votes})
+
+    merged_soup.annotations.append(_new_tag(merged_soup, "relation", [
+      ("id", rel_id), ("type", rel_type), ("parentsType", relations[0].parentsType)],
+      _relation_properties(relations[0], arg_ids, properties)))
+
+  return annotation.Document(merged_soup, filename), conflicts
+
+
+def align_entities(documents, mode="exact", threshold=0.5):
+  """
+  Groups the entities of all documents into slots, one per annotated span
+  (or several, if an annotator has more than one entity on the span).
+  With another mode of alignment.MODES, spans only have to match leniently: the entities of each
+  document are aligned one-to-one with the first entity of the slots so far, and the others start new slots.
+
+  Return: a list of (doc ID, slot) tuples sorted by span, where a slot is a dict of
+  {document index: entity}
+  """
+  if mode != "exact":
+    return _align_entities_leniently(documents, mode, threshold)
+  buckets = dd(list)
+  for i, doc in enumerate(documents):
+    for ent in doc.get_entities():
+      buckets[(ent.get_doc_id(), ent.span_string)].append((i, ent))
+
+  slots = []
+  for (doc_id, span_string), bucket in buckets.items():
+    bucket_slots = []
+    for i, ent in bucket:
+      # Prefer a slot that already has an entity of the same type
+      free = [slot for slot in bucket_slots if i not in slot]
+      same_type = [slot for slot in free if any(e.type == ent.type for e in slot.values())]
+      if same_type or free:
+        (same_type or free)[0][i] = ent
+      else:
+        bucket_slots.append({i: ent})
+    slots += [(doc_id, slot) for slot in bucket_slots]
+
+  slots.sort(key=lambda doc_slot: (doc_slot[0], list(doc_slot[1].values())[0].spans))
+  return slots
+
+
+def _align_entities_leniently(documents, mode, threshold):
+  slots = []
+  for i, doc in enumerate(documents):
+    firsts = [list(slot.values())[0] for _, slot in slots]
+    entities = doc.get_entities()
+    for slot_num, j in alignment.align_indexes(firsts, entities, mode, threshold):
+      if j is None:
+        continue
+      if slot_num is None:
+        slots.append((entities[j].get_doc_id(), {i: entities[j]}))
+      else:
+        slots[slot_num][1][i] = entities[j]
+
+  slots.sort(key=lambda doc_slot: (doc_slot[0], list(doc_slot[1].values())[0].spans))
+  return slots
+
+def _align_relations(documents, slots):
+  """
+  Return: a tuple of a list of ((type, sorted tuple of (role, slot number)), list of (document index, relation))
+  tuples, with at most one relation per document for each key, and a list of (document index, relation)
+  for the relations pointing at an entity not in their document
+  """
+  entity_slots = {}
+  for slot_num, (_, slot) in enumerate(slots):
+    for i, ent in slot.items():
+      entity_slots[(i, ent.id)] = slot_num
+
+  aligned = dd(dict)
+  dangling = []
+  for i, doc in enumerate(documents):
+    for rel in doc.get_all_relations():
+      args = []
+      for prop in rel.properties:
+        if prop.name.lower() in annotation.ENTITY_ID_PROPERTIES:
+          args.append((prop.name.lower(), entity_slots.get((i, prop.value), prop.value)))
+      if all(isinstance(slot_num, int) for _, slot_num in args):
+        aligned[(rel.type, tuple(sorted(args)))].setdefault(i, rel)
+      else:
+        dangling.append((i, rel))
+
+  return [(key, list(by_doc.items())) for key, by_doc in aligned.items()], dangling
+
+def _dropped_relation(relations, reason, n):
+  """
+  Return: the conflict reporting relations, a list of (document index, relation), as dropped
+  """
+  return {"kind": "relation", "id": None, "field": "dropped", "reason": reason,
+          "votes": dict(_presence_votes(len(relations), n)),
+          "sources": [(i, rel.id) for i, rel in relations]}
+
+
+def _vote(vote, votes, n, default=None):
+  """
+  Return: a tuple of (chosen value, None), or if the vote is unresolved,
+  (default or the most common value, dict of the votes)
+  """
+  value = vote(votes, n)
+  if value is not None:
+    return (value, None)
+  return (default if default is not None else votes.most_common(1)[0][0], dict(votes))
+
+
+def _presence_votes(present, n_annotators):
+  """
+  Return: a Counter of {True: present, False: n_annotators - present}, without a count of 0,
+  so that a vote agreed on by every annotator has a single value
+  """
+  return +Counter({True: present, False: n_annotators - present})
+
+def _vote_properties(vote, annotations):
+  """
+  Return: a list of (property name, (value, votes or None)) tuples,
+  in the order the properties first appear among the annotations
+  """
+  names = []
+  votes = dd(Counter)
+  for ann in annotations:
+    for prop in ann.properties:
+      if prop.name.lower() not in annotation.ENTITY_ID_PROPERTIES:
+        if prop.name not in votes:
+          names.append(prop.name)
+        votes[prop.name][prop.value] += 1
+
+  return [(name, _vote(vote, votes[name], len(annotations))) for name in names]
+
+
+def _relation_properties(relation, arg_ids, properties):
+  """
+  Return: a list of (property name, value) tuples for a merged relation,
+  laid out the way they are in relation, with its entity IDs replaced by those in arg_ids
+  """
+  args = dd(list)
+  for role, ent_id in arg_ids:
+    args[role].append(ent_id)
+  voted = dict((name, value) for name, (value, _) in properties)
+
+  merged = []
+  for prop in relation.properties:
+    if args.get(prop.name.lower()):
+      merged.append((prop.name, args[prop.name.lower()].pop(0)))
+    elif prop.name in voted:
+      merged.append((prop.name, voted.pop(prop.name)))
+
+  return merged + [(name, value) for name, (value, _) in properties if name in voted]
+
+
+def _new_tag(soup, name, fields, properties):
+  """
+  Builds an <entity> or <relation> tag from lists of (tag name, text) tuples
+  """
+  tag = soup.new_tag(name)
+  for field, text in fields:
+    child = soup.new_tag(field)
+    child.string = text
+    tag.append(child)
+
+  props = soup.new_tag("properties")
+  for prop_name, value in properties:
+    prop = soup.new_tag(prop_name)
+    prop.string = value
+    props.append(prop)
+  tag.append(props)
+
+  return tag
@@ -1,10 +1,32 @@
 import re
+import mmap
+from array import array
+from bisect import bisect_right
+
+# Runs of word characters, and single other non-space characters
+TOKEN_REGEX = re.compile(r"\w+|[^\w\s]")
+
+def regex_tokenizer(regex=TOKEN_REGEX):
+  """
+  Return: a tokenizer taking each match of regex as a token
+  """
+  if isinstance(regex, str):
+    regex = re.compile(regex)
+  return lambda text: (m.span() for m in regex.finditer(text))
 
 class Document(object):
+  """
+  tokenizer: a function from a text to an iterable of (start, end) character offsets of its tokens,
+  in increasing order and not overlapping, used by tokenize(). Defaults to splitting off
+  runs of word characters and single punctuation characters.
+  """
+  tokenizer = staticmethod(regex_tokenizer())
+
   def __init__(self, text, name=""):
     self.text = text
     self.tokens = []
     self.name = name
+    self._reset_tokens()
 
   def find_string_by_span(self, span):
     """
@@ -21,28 +43,291 @@ class Document(object):
     if type(span[1]) == str:
       span[1] = int(span[1])
 
-    return self.text[span[0]:span[1]]
+    return self._slice(span[0], span[1])
 
   def find_spans_by_string(self, string):
     """
     Expects a string, and finds the corresponding span
     """
-    matches = [x for x in re.finditer(string, self.text)]
+    matches = [x for x in self._finditer(string)]
     #for m in matches:
     #  x = len([c for c in self.text[m.start(), m.end()] if not c.isalpha()])
-    return [(m.start(), m.end()) for m in matches]
+    return [(start, end) for start, end, _ in matches]
 
   def find_spans_in_between(self, start_string, end_string):
     """
     Expects a string, and finds the corresponding span
     """
-    matches = [x for x in re.finditer(r'(%s)(.|\n)*?(%s)' % (start_string, end_string), self.text)]
-    return [(m.start(), m.end()) for m in matches]
+    matches = [x for x in self._finditer(r'(%s)(.|\n)*?(%s)' % (start_string, end_string))]
+    return [(start, end) for start, end, _ in matches]
 
   def find_spans_by_regex(self, regex):
-    matches = [x for x in re.finditer(regex, self.text)]
-    return [(m.start(), m.end()) for m in matches]
+    matches = [x for x in self._finditer(regex)]
+    return [(start, end) for start, end, _ in matches]
 
   def find_spans_and_strings_by_regex(self, regex):
-    matches = [x for x in re.finditer(regex, self.text)]
-    return [(m.start(), m.end(), m.group(0)) for m in matches]
+    matches = [x for x in self._finditer(regex)]
+    return [(start, end, string) for start, end, string in matches]
+
+  def tokenize(self, tokenizer=None):
+    """
+    Splits the text into tokens with tokenizer, or self.tokenizer, filling self.tokens with their strings,
+    token_starts and token_ends with their offsets, and two tables with an entry per character offset,
+    so that char_to_token and span_to_tokens do not search. The tables take 8 bytes per character.
+
+    Return: the number of tokens
+    """
+    tokenizer = tokenizer or self.tokenizer
+    text = self.text
+    starts = array("i")
+    ends = array("i")
+    for start, end in tokenizer(text):
+      starts.append(start)
+      ends.append(end)
+
+    size = len(text) + 1
+    # _first_token[c]: the first token ending after c, the one c falls in or else the next one
+    # _stop_token[c]: the number of tokens starting before c, one past the last token before c
+    first_token = array("i", [len(starts)]) * size
+    stop_token = array("i", [len(starts)]) * size
+    previous_end = 0
+    previous_start = -1
+    for i, (start, end) in enumerate(zip(starts, ends)):
+      first_token[previous_end:end] = array("i", [i]) * (end - previous_end)
+      stop_token[previous_start + 1:start + 1] = array("i", [i]) * (start - previous_start)
+      previous_end = end
+      previous_start = start
+
+    self.tokens = [text[start:end] for start, end in zip(starts, ends)]
+    self.token_starts = starts
+    self.token_ends = ends
+    self._first_token = first_token
+    self._stop_token = stop_token
+    return len(starts)
+
+  def _reset_tokens(self):
+    self.token_starts = array("i")
+    self.token_ends = array("i")
+    self._first_token = None
+    self._stop_token = None
+
+  def _token_tables(self):
+    if self._first_token is None:
+      self.tokenize()
+    return self._first_token, self._stop_token
+
+  def char_to_token(self, offset):
+    """
+    Return: the index of the token the character at offset is in, or None if it is not in one
+    """
+    first_token, _ = self._token_tables()
+    if not 0 <= offset < len(first_token) - 1:
+      return None
+    i = first_token[offset]
+    if i < len(self.token_starts) and self.token_starts[i] <= offset:
+      return i
+    return None
+
+  def span_to_tokens(self, span):
+    """
+    Expects a tuple of (start_span, end_span), tokenizing the text first if it is not yet
+
+    Return: a tuple of (first, stop) token indexes of the tokens overlapping the span,
+    such that self.tokens[first:stop] are those tokens, or None if there are none
+    """
+    first_token, stop_token = self._token_tables()
+    last = len(first_token) - 1
+    start = max(0, min(int(span[0]), last))
+    end = max(0, min(int(span[1]), last))
+    first = first_token[start]
+    stop = stop_token[end]
+    if first >= stop:
+      return None
+    return (first, stop)
+
+  def spans_to_tokens(self, spans):
+    """
+    Expects a list of spans, such as the spans of an Entity
+
+    Return: a list of (first, stop) token indexes, one for each span that overlaps tokens
+    """
+    return [tokens for tokens in (self.span_to_tokens(span) for span in spans) if tokens is not None]
+
+  def _slice(self, start, end):
+    return self.text[start:end]
+
+  def _finditer(self, regex):
+    """
+    Yields (start, end, matched string) for every match of regex in the text
+    """
+    for m in re.finditer(regex, self.text):
+      yield (m.start(), m.end(), m.group(0))
+
+
+class MappedDocument(Document):
+  """
+  A raw text Document backed by a memory-mapped UTF-8 file.
+
+  The text is never read into memory as a whole: spans are decoded lazily
+  from the map. Anafora spans are character offsets, so a sparse index of
+  (byte offset, char offset) checkpoints, one every `checkpoint` bytes, is built
+  in a single streaming pass when the file is opened. Converting an offset then
+  only decodes the bytes since the nearest checkpoint.
+
+  translate_newlines: read \\r\\n and \\r as \\n, as open() does in text mode, so that the text
+  and its character offsets are those of a Document of open(path).read()
+
+  Regexes are matched on the decoded text a window at a time (see _finditer), so they find
+  what they find in the Document's text, unless a match is longer than the window's lookahead.
+
+  tokenize() decodes the whole text once, and its tables take 8 bytes per character.
+  """
+  # Characters decoded before and after each window of _finditer
+  CONTEXT = 256
+  LOOKAHEAD = 4096
+
+  def __init__(self, path, name="", checkpoint=65536, translate_newlines=True):
+    self.path = path
+    self.tokens = []
+    self.name = name
+    self.checkpoint = checkpoint
+    self.translate_newlines = translate_newlines
+    self._reset_tokens()
+    self._file = open(path, "rb")
+    try:
+      self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+      # Empty files cannot be mapped
+      self._map = b""
+    self._byte_marks = array("q", [0])
+    self._char_marks = array("q", [0])
+    self._build_offset_index()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  def __len__(self):
+    return self._char_marks[-1]
+
+  def close(self):
+    if isinstance(self._map, mmap.mmap):
+      self._map.close()
+    self._file.close()
+
+  @property
+  def text(self):
+    """
+    The entire decoded text. This defeats the purpose of the mapping,
+    and is only here so that code expecting a Document.text keeps working.
+    """
+    return self._decode(0, len(self._map))
+
+  def _decode(self, start, end):
+    text = self._map[start:end].decode("utf-8", "replace")
+    if self.translate_newlines and "\r" in text:
+      text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+  def _char_boundary(self, byte_offset):
+    """
+    Moves byte_offset back to the start of the UTF-8 character it falls in, or of the \\r\\n it splits
+    """
+    while 0 < byte_offset < len(self._map) and 0x80 <= self._map[byte_offset] < 0xC0:
+      byte_offset -= 1
+    if self.translate_newlines and 0 < byte_offset < len(self._map) and self._map[byte_offset - 1:byte_offset + 1] == b"\r\n":
+      byte_offset -= 1
+    return byte_offset
+
+  def _build_offset_index(self):
+    size = len(self._map)
+    byte_offset = 0
+    char_offset = 0
+    while byte_offset < size:
+      next_offset = min(size, self._char_boundary(byte_offset + self.checkpoint))
+      if next_offset <= byte_offset:
+        # A character longer than checkpoint: on to the end of it
+        next_offset = byte_offset + 1
+        while next_offset < size and self._char_boundary(next_offset) <= byte_offset:
+          next_offset += 1
+      char_offset += len(self._decode(byte_offset, next_offset))
+      byte_offset = next_offset
+      self._byte_marks.append(byte_offset)
+      self._char_marks.append(char_offset)
+
+  def byte_to_char(self, byte_offset):
+    """
+    Converts a byte offset into the file to a character offset into the text
+    """
+    i = bisect_right(self._byte_marks, byte_offset) - 1
+    base = self._byte_marks[i]
+    return self._char_marks[i] + len(self._decode(base, byte_offset))
+
+  def char_to_byte(self, char_offset):
+    """
+    Converts a character offset into the text to a byte offset into the file
+    """
+    char_offset = max(0, min(char_offset, self._char_marks[-1]))
+    i = bisect_right(self._char_marks, char_offset) - 1
+    remaining = char_offset - self._char_marks[i]
+    base = self._byte_marks[i]
+    if remaining == 0:
+      return base
+    chunk = self._map[base:self._byte_marks[i + 1]].decode("utf-8", "replace")
+    return base + len(chunk[:_untranslated_length(chunk, remaining) if self.translate_newlines else remaining].encode("utf-8"))
+
+  def _slice(self, start, end):
+    return self._decode(self.char_to_byte(start), self.char_to_byte(end))
+
+  def _finditer(self, regex):
+    """
+    Decodes the text a window of about checkpoint characters at a time, with CONTEXT characters before it
+    for lookbehinds and \\b, and matches regex from where the last match ended, as re.finditer does.
+    Matches reaching into the last LOOKAHEAD characters of a window, which more text could change,
+    are looked for again in a window starting at them, made larger if they fill it.
+    bytes patterns are decoded from UTF-8.
+    """
+    if isinstance(regex, bytes):
+      regex = regex.decode("utf-8")
+    if isinstance(regex, str):
+      regex = re.compile(regex)
+    elif isinstance(regex.pattern, bytes):
+      regex = re.compile(regex.pattern.decode("utf-8"), regex.flags & ~re.ASCII)
+
+    total = len(self)
+    size = max(self.checkpoint, 1)
+    search = 0
+    while True:
+      start = max(0, search - self.CONTEXT)
+      end = min(total, search + size + self.LOOKAHEAD)
+      text = self._slice(start, end)
+      safe = len(text) if end == total else len(text) - self.LOOKAHEAD
+      resume = None
+      for m in regex.finditer(text, search - start):
+        if m.end() > safe or (m.start() == safe and end < total):
+          resume = start + m.start()
+          break
+        yield (start + m.start(), start + m.end(), m.group(0))
+      if resume is None:
+        if end == total:
+          return
+        resume = start + safe
+      # A match longer than the window starts where the search did: grow the window
+      size = size * 2 if resume == search else max(self.checkpoint, 1)
+      search = resume
+
+
+def _untranslated_length(text, n):
+  """
+  Return: the length of the prefix of text whose first n characters, once \\r\\n is read as \\n, it is
+  """
+  i = 0
+  found = 0
+  while True:
+    j = text.find("\r\n", i)
+    if j == -1 or found + j - i >= n:
+      return i + n - found
+    found += j - i + 1
+    i = j + 2
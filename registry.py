@@ -0,0 +1,163 @@
+"""
+Resolving entity IDs across the annotation files of a corpus.
+
+The relations of cross-doc files point at entities of other notes, which are not in their Document.
+An EntityRegistry reads the entity IDs of every file up front, with lxml and without making Documents,
+and loads the Document owning an entity only when it is first looked up, keeping the most recently used
+ones in memory. Documents loaded by the registry, or attached to it, look up through it the entities
+their relations point at that they do not have, so chains can be walked from file to file:
+
+  entities = registry.EntityRegistry("anaforaProjectFile/THYMEColonFinal/Dev", jobs=8)
+  doc = entities.document(path)
+  for chain in doc.get_identical_chains():
+    chain.get_coref_strings()
+"""
+
+from collections import OrderedDict
+
+from lxml import etree
+
+from anafora4python import corpus
+
+class EntityHandle(object):
+  """
+  An entity of the registry, known by its ID and file, loaded by resolve()
+  """
+  __slots__ = ("registry", "id", "path")
+
+  def __init__(self, registry, entity_id, path):
+    self.registry = registry
+    self.id = entity_id
+    self.path = path
+
+  def __repr__(self):
+    return "EntityHandle(%r, %r)" % (self.id, self.path)
+
+  def resolve(self):
+    """
+    Return: the Entity, loading its Document if it is not in memory, or None if the file no longer has it
+    """
+    return self.registry.get(self.id)
+
+
+class EntityRegistry(object):
+  """
+  paths: the directories (or files) of the corpus, to add_files at once
+  max_documents: how many loaded Documents are kept in memory, dropping the least recently used first
+  read_only: load Documents with their soup released, see annotation.Document.release_soup
+  ids: an annotation.IDTable for all the loaded Documents. By default each Document has its own,
+       so that IDs go away with the Documents
+  """
+  def __init__(self, paths=None, pattern="*.xml", max_documents=16, jobs=1, read_only=True, ids=None):
+    self.max_documents = max_documents
+    self.read_only = read_only
+    self.ids = ids
+    # {entity ID: path of the file it is resolved in}
+    self._paths = {}
+    # {path: Document}, least recently used first
+    self._documents = OrderedDict()
+    # {path: error message} of the files whose IDs could not be read
+    self.errors = {}
+    # The number of Documents loaded so far
+    self.loads = 0
+    if paths is not None:
+      self.add_files(corpus.find_annotation_files(paths, pattern), jobs)
+
+  def __len__(self):
+    return len(self._paths)
+
+  def __contains__(self, entity_id):
+    return entity_id in self._paths
+
+  def add_files(self, paths, jobs=1):
+    """
+    Reads the entity IDs of the annotation files in paths, in a pool of jobs processes if jobs > 1.
+    An ID found in several files, such as a preannotated entity, is resolved in the first one
+    added, in the order of paths
+
+    Return: the number of new IDs
+    """
+    found = dict(corpus.map_files(_read_entity_ids, paths, jobs))
+    added = 0
+    for path in paths:
+      ent_ids = found[path]
+      if isinstance(ent_ids, str):
+        self.errors[path] = ent_ids
+        continue
+      self.errors.pop(path, None)
+      for ent_id in ent_ids:
+        if ent_id not in self._paths:
+          self._paths[ent_id] = path
+          added += 1
+    return added
+
+  def handle(self, entity_id):
+    """
+    Return: an EntityHandle for the entity with the given ID, or None if no file has it
+    """
+    path = self._paths.get(entity_id)
+    if path is None:
+      return None
+    return EntityHandle(self, entity_id, path)
+
+  def get(self, entity_id):
+    """
+    Return: the Entity with the given ID, loading its Document if it is not in memory, or None
+    """
+    path = self._paths.get(entity_id)
+    if path is None:
+      return None
+    return self.document(path).entities_dict.get(entity_id)
+
+  def document(self, path):
+    """
+    Return: the Document of the file at path, attached to the registry,
+    loaded unless it is one of the max_documents most recently used
+    """
+    doc = self._documents.get(path)
+    if doc is not None:
+      self._documents.move_to_end(path)
+      return doc
+    doc = self.attach(corpus.load_annotation(path, read_only=self.read_only, ids=self.ids))
+    self.loads += 1
+    self._documents[path] = doc
+    while len(self._documents) > self.max_documents:
+      self._documents.popitem(last=False)
+    return doc
+
+  def attach(self, doc):
+    """
+    Makes the relations of doc, loaded elsewhere, look up the entities it does not have in the registry
+
+    Return: doc
+    """
+    doc.registry = self
+    return doc
+
+  def resident(self):
+    """
+    Return: the paths of the Documents in memory, least recently used first
+    """
+    return list(self._documents)
+
+  def clear(self):
+    """
+    Drops the Documents in memory, keeping the IDs
+    """
+    self._documents.clear()
+
+
+def _read_entity_ids(path):
+  """
+  Return: a list of the IDs of the entities in the file at path, or an error message
+  """
+  try:
+    ent_ids = []
+    for _, node in etree.iterparse(path, events=("end",), tag="entity", recover=True, huge_tree=True):
+      id_node = node.find("id")
+      if id_node is not None and id_node.text:
+        ent_ids.append(id_node.text)
+      node.clear()
+    return ent_ids
+  except Exception as e:
+    return "%s: %s" % (type(e).__name__, e)
@@ -0,0 +1,227 @@
+"""
+Anafora schema files, compiled into lookup tables, and validation of annotation Documents against them.
+
+A schema file defines entity and relation types in nested groups, whose type is the parentsType
+of the annotations, and the properties of each type:
+
+  <schema>
+    <defaultattribute><required>True</required></defaultattribute>
+    <definition>
+      <entities type="TemporalEntities">
+        <entity type="EVENT">
+          <properties>
+            <property type="DocTimeRel" input="choice">BEFORE,OVERLAP,AFTER</property>
+          </properties>
+        </entity>
+      </entities>
+      <relations type="TemporalRelations">
+        <relation type="TLINK">
+          <properties>
+            <property type="Source" input="list" instanceOf="EVENT,TIMEX3" maxlink="1"/>
+          </properties>
+        </relation>
+      </relations>
+    </definition>
+  </schema>
+"""
+
+from functools import lru_cache
+
+from bs4 import BeautifulSoup as soup
+
+from anafora4python import corpus
+
+class PropertySpec(object):
+  """
+  A property of an annotation type.
+
+  input: "choice" for one of choices, "list" for links to entities, or anything else for free text
+  choices: the set of allowed values for a choice, or None
+  instance_of: the set of entity types a list may link to, or None for any
+  maxlink: the largest number of entities a list may link to, or None
+  """
+  def __init__(self, name, input, required, choices=None, instance_of=None, maxlink=None):
+    self.name = name
+    self.input = input
+    self.required = required
+    self.choices = choices
+    self.instance_of = instance_of
+    self.maxlink = maxlink
+
+  def is_link(self):
+    return self.input == "list"
+
+
+class TypeSpec(object):
+  """
+  An entity or relation type: its parentsType and {property name: PropertySpec}
+  """
+  def __init__(self, name, parentsType, properties):
+    self.name = name
+    self.parentsType = parentsType
+    self.properties = properties
+    self.required = [prop for prop in properties.values() if prop.required]
+
+
+class CompiledSchema(object):
+  """
+  entity_types and relation_types: {type: TypeSpec}
+  """
+  def __init__(self, entity_types, relation_types):
+    self.entity_types = entity_types
+    self.relation_types = relation_types
+
+  @classmethod
+  def from_soup(cls, schema_soup):
+    required = schema_soup.find("defaultattribute")
+    required = required is not None and required.required is not None and _is_true(required.required.get_text())
+    definition = schema_soup.find("definition") or schema_soup
+    return cls(_compile_types(definition, "entities", "entity", required),
+               _compile_types(definition, "relations", "relation", required))
+
+
+class Violation(object):
+  """
+  One way in which an annotation breaks its schema.
+
+  code: what kind of violation, one of VIOLATIONS
+  annotation_id: the ID of the entity or relation, or None for the document
+  prop: the name of the property at fault, or None
+  """
+  def __init__(self, code, annotation_id, message, prop=None):
+    self.code = code
+    self.annotation_id = annotation_id
+    self.message = message
+    self.prop = prop
+
+  def __repr__(self):
+    return "Violation(%r, %r, %r)" % (self.code, self.annotation_id, self.message)
+
+  def __str__(self):
+    return "%s %s" % (self.annotation_id, self.message) if self.annotation_id else self.message
+
+  def to_dict(self):
+    return {"code": self.code, "id": self.annotation_id, "property": self.prop, "message": self.message}
+
+
+VIOLATIONS = ["unknown_type", "wrong_parents_type", "unknown_property", "missing_property",
+              "invalid_value", "missing_entity", "wrong_entity_type", "too_many_links"]
+
+
+def load_schema(path):
+  """
+  Return: the CompiledSchema of the schema file at path
+  """
+  with open(path) as f:
+    return CompiledSchema.from_soup(soup(f, "xml"))
+
+@lru_cache(maxsize=None)
+def cached_schema(path):
+  """
+  Return: the CompiledSchema of the schema file at path, compiled once per process
+  """
+  return load_schema(path)
+
+def validate_document(doc, schema):
+  """
+  Checks the types, parentsTypes and properties of every entity and relation of an annotation Document
+  against a CompiledSchema, along with the IDs and types of the entities each relation links to.
+
+  Return: a list of Violations, in document order, entities first
+  """
+  violations = []
+  for ent in doc.get_entities():
+    _validate_annotation(ent, schema.entity_types, doc, violations)
+  for rel in doc.get_all_relations():
+    _validate_annotation(rel, schema.relation_types, doc, violations)
+  return violations
+
+def validate_files(paths, schema_path, jobs=1):
+  """
+  Validates the annotation files in paths against the schema file at schema_path, in a pool of jobs processes
+
+  Return: an iterator of (path, list of Violations), or (path, error message) for files that could not be loaded
+  """
+  for path, result in corpus.map_files(_ValidateFile(schema_path), paths, jobs):
+    yield path, result
+
+
+class _ValidateFile(object):
+  def __init__(self, schema_path):
+    self.schema_path = schema_path
+
+  def __call__(self, path):
+    try:
+      doc = corpus.load_annotation(path)
+    except Exception as e:
+      return "%s: %s" % (type(e).__name__, e)
+    return validate_document(doc, cached_schema(self.schema_path))
+
+
+def _compile_types(definition, group_tag, type_tag, required):
+  types = {}
+  for tag in definition.find_all(type_tag):
+    group = tag.find_parent(group_tag)
+    parentsType = group.get("type", "") if group is not None else ""
+    properties = {}
+    for prop in tag.find_all("property"):
+      spec = _compile_property(prop, required)
+      properties[spec.name] = spec
+    types[tag.get("type", "")] = TypeSpec(tag.get("type", ""), parentsType, properties)
+  return types
+
+def _compile_property(tag, required):
+  input = tag.get("input", "text")
+  choices = None
+  if input == "choice":
+    choices = frozenset(value.strip() for value in tag.get_text().split(","))
+  instance_of = tag.get("instanceOf")
+  if instance_of is not None:
+    instance_of = frozenset(t.strip() for t in instance_of.split(",") if t.strip())
+  maxlink = tag.get("maxlink")
+  return PropertySpec(tag.get("type", ""), input,
+                      _is_true(tag["required"]) if tag.has_attr("required") else required,
+                      choices, instance_of, int(maxlink) if maxlink else None)
+
+def _is_true(value):
+  return value.strip().lower() == "true"
+
+def _validate_annotation(ann, types, doc, violations):
+  spec = types.get(ann.type)
+  if spec is None:
+    violations.append(Violation("unknown_type", ann.id, "has unknown type %s" % ann.type))
+    return
+  if ann.parentsType != spec.parentsType:
+    violations.append(Violation("wrong_parents_type", ann.id, "has parentsType %s, not %s" % (ann.parentsType, spec.parentsType)))
+
+  values = {}
+  for name, value in ann.property_items():
+    values.setdefault(name, []).append(value)
+
+  for name, prop_values in values.items():
+    prop = spec.properties.get(name)
+    if prop is None:
+      violations.append(Violation("unknown_property", ann.id, "has unknown property %s" % name, name))
+    elif prop.is_link():
+      _validate_links(ann, prop, prop_values, doc, violations)
+    elif prop.choices is not None:
+      for value in prop_values:
+        if value not in prop.choices:
+          violations.append(Violation("invalid_value", ann.id, "has %s %s, not one of %s" %\
+                                      (name, value, ", ".join(sorted(c for c in prop.choices if c))), name))
+
+  for prop in spec.required:
+    if prop.name not in values:
+      violations.append(Violation("missing_property", ann.id, "is missing required property %s" % prop.name, prop.name))
+
+def _validate_links(ann, prop, ids, doc, violations):
+  if prop.maxlink is not None and len(ids) > prop.maxlink:
+    violations.append(Violation("too_many_links", ann.id, "links %d entities as %s, at most %d allowed" %\
+                                (len(ids), prop.name, prop.maxlink), prop.name))
+  for ent_id in ids:
+    ent = doc.entities_dict.get(ent_id)
+    if ent is None:
+      violations.append(Violation("missing_entity", ann.id, "links missing entity %s as %s" % (ent_id, prop.name), prop.name))
+    elif prop.instance_of is not None and ent.type not in prop.instance_of:
+      violations.append(Violation("wrong_entity_type", ann.id, "links %s entity %s as %s, not one of %s" %\
+                                  (ent.type, ent_id, prop.name, ", ".join(sorted(prop.instance_of))), prop.name))
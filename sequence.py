@@ -0,0 +1,139 @@
+"""
+Token-level sequence labels (BIO or BIOES) for the entities of an annotation_text.Document,
+for training sequence taggers.
+
+The raw text is tokenized once, with the char-to-token tables of raw_text.Document, and the entity spans
+are sorted once and swept through section by section, so a note is labelled in one pass,
+and each section, or sentence, is yielded as soon as it is done.
+"""
+
+SCHEMES = ("BIO", "BIOES")
+
+# Tokens after which a sentence ends
+SENTENCE_ENDS = set([".", "!", "?"])
+
+OUTSIDE = "O"
+
+def iter_sequences(text_doc, scheme="BIO", label=None, types=None, doc_id=None, sentences=False):
+  """
+  Labels the tokens of each section of text_doc, or of the whole text if it has no sections.
+
+  scheme: "BIO" or "BIOES"
+  label: what entities are labelled with. None for their type, the name of a property for its value,
+         leaving out the entities without it, or a function from an Entity to its label, or None to leave it out
+  types: if given, only entities of these types are labelled
+  doc_id: if given, only entities of that document are labelled, for annotation files spanning several
+  sentences: yield each sentence of a section separately, splitting after SENTENCE_ENDS and at blank lines
+
+  Each span of a disjoint entity is labelled as a chunk of its own. Where entities overlap,
+  the one starting first, or the longest of those starting together, is labelled and the others left out.
+
+  Yields: tuples of (section id, or None, a list of (token, (start, end), tag))
+  """
+  if scheme not in SCHEMES:
+    raise ValueError("scheme must be one of %s, not %r" % (", ".join(SCHEMES), scheme))
+  raw = text_doc.raw
+  fragments = _entity_fragments(text_doc.annotation, _labeler(label), types, doc_id)
+
+  if text_doc.sections:
+    regions = [(section.id, section.content_start, section.content_end) for section in text_doc.sections]
+  else:
+    regions = [(None, 0, len(raw.text))]
+
+  i = 0
+  for section_id, start, end in sorted(regions, key=lambda region: region[1]):
+    tokens = raw.span_to_tokens((start, end))
+    if tokens is None:
+      continue
+    first, stop = tokens
+    tags = [OUTSIDE] * (stop - first)
+
+    # Fragments starting before this section are outside of all sections
+    while i < len(fragments) and fragments[i][0] < start:
+      i += 1
+    while i < len(fragments) and fragments[i][0] < end:
+      frag_start, neg_end, _, frag_label = fragments[i]
+      i += 1
+      frag_tokens = raw.span_to_tokens((frag_start, min(-neg_end, end)))
+      if frag_tokens is None:
+        continue
+      frag_first, frag_stop = frag_tokens[0] - first, frag_tokens[1] - first
+      if any(tag != OUTSIDE for tag in tags[frag_first:frag_stop]):
+        continue
+      _tag_chunk(tags, frag_first, frag_stop, frag_label, scheme)
+
+    labelled = [(raw.tokens[t], (raw.token_starts[t], raw.token_ends[t]), tags[t - first]) for t in range(first, stop)]
+    if sentences:
+      for sentence in _split_sentences(raw, labelled):
+        yield section_id, sentence
+    else:
+      yield section_id, labelled
+
+def write_conll(sequences, out):
+  """
+  Writes sequences from iter_sequences to the file out, one "token<TAB>tag" line
+  per token, and a blank line after each sequence
+
+  Return: the number of sequences written
+  """
+  n = 0
+  for _, labelled in sequences:
+    out.write("".join("%s\t%s\n" % (token, tag) for token, _, tag in labelled))
+    out.write("\n")
+    n += 1
+  return n
+
+
+def _labeler(label):
+  if label is None:
+    return lambda ent: ent.type
+  if callable(label):
+    return label
+
+  def property_value(ent):
+    for name, value in ent.property_items():
+      if name == label:
+        return value
+    return None
+  return property_value
+
+def _entity_fragments(ann_doc, labeler, types, doc_id):
+  """
+  Return: a list of (start, -end, order, label) for each span of each labelled entity,
+  sorted so that spans starting first, then longest, then of entities coming first in the file, come first
+  """
+  fragments = []
+  for order, ent in enumerate(ann_doc.get_entities()):
+    if types is not None and ent.type not in types:
+      continue
+    if doc_id is not None and ent.get_doc_id() != doc_id:
+      continue
+    ent_label = labeler(ent)
+    if ent_label is None:
+      continue
+    fragments += [(start, -end, order, ent_label) for start, end in ent.spans if end > start]
+  fragments.sort()
+  return fragments
+
+def _tag_chunk(tags, first, stop, label, scheme):
+  if scheme == "BIOES" and stop - first == 1:
+    tags[first] = "S-" + label
+    return
+  tags[first] = "B-" + label
+  for t in range(first + 1, stop):
+    tags[t] = "I-" + label
+  if scheme == "BIOES":
+    tags[stop - 1] = "E-" + label
+
+def _split_sentences(raw, labelled):
+  sentence = []
+  for item in labelled:
+    if sentence and "\n\n" in raw.find_string_by_span((sentence[-1][1][1], item[1][0])):
+      yield sentence
+      sentence = []
+    sentence.append(item)
+    if item[0] in SENTENCE_ENDS:
+      yield sentence
+      sentence = []
+  if sentence:
+    yield sentence
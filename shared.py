@@ -0,0 +1,388 @@
+"""
+A corpus of annotation Documents flattened into arrays in one block of shared memory,
+so that many worker processes can read it without each holding their own copy.
+
+bs4 trees cannot be shared between processes: even after a fork, reading them updates
+the reference counts of every object, so each worker ends up copying all of the pages.
+A SharedCorpus holds no Python objects per annotation; workers attach to the block by name,
+the arrays are NumPy views of it, and Entity and Relation views are only made as they are read.
+
+  shared_corpus = shared.SharedCorpus.from_files(paths, jobs=8)
+  pool.map(work, [(shared_corpus, i) for i in range(len(shared_corpus))])
+  shared_corpus.unlink()
+
+Pickling a SharedCorpus only sends the name and layout of the block,
+and unpickling it attaches to the block.
+"""
+
+from bisect import bisect_left
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from anafora4python import annotation, corpus
+
+PropertyView = namedtuple("PropertyView", ["name", "value"])
+
+# name: dtype, and the number of columns for 2-d arrays
+ARRAYS = {
+  # Every string, sorted, as UTF-8 bytes; string i is strings[string_offsets[i]:string_offsets[i + 1]]
+  "strings": (np.uint8, None), "string_offsets": (np.int64, None),
+  # Per document: its filename, and where its entities and relations start (with one more at the end)
+  "doc_filenames": (np.int32, None), "doc_entity_starts": (np.int64, None), "doc_relation_starts": (np.int64, None),
+  # Per entity: string codes of its ID, type and parentsType, and where its spans and properties start
+  "entity_ids": (np.int32, None), "entity_types": (np.int32, None), "entity_parents_types": (np.int32, None),
+  "entity_span_starts": (np.int64, None), "entity_property_starts": (np.int64, None),
+  # Entities ordered by ID, and their ID codes in that order, to find them by binary search
+  "entities_by_id": (np.int64, None), "sorted_entity_ids": (np.int32, None),
+  "spans": (np.int64, 2), "entity_properties": (np.int32, 2),
+  # Per relation: as for entities, and where its arguments start
+  "relation_ids": (np.int32, None), "relation_types": (np.int32, None), "relation_parents_types": (np.int32, None),
+  "relation_argument_starts": (np.int64, None), "relation_property_starts": (np.int64, None),
+  # Arguments: role name code, entity ID code, and entity index, or -1 if it is not in the document
+  "relation_arguments": (np.int64, 3), "relation_properties": (np.int32, 2),
+}
+
+
+class SharedCorpus(object):
+  """
+  errors: a dict of {path: error message} for the files from_files could not load, which are left out
+  """
+  def __init__(self, shm, layout):
+    self.shm = shm
+    self.layout = layout
+    self.errors = {}
+    for name, (offset, shape) in layout.items():
+      dtype = ARRAYS[name][0]
+      setattr(self, name, np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset))
+
+  @classmethod
+  def from_documents(cls, documents):
+    """
+    Return: a SharedCorpus holding the annotation Documents
+    """
+    return cls._build([_extract(doc) for doc in documents])
+
+  @classmethod
+  def from_files(cls, paths, jobs=1):
+    """
+    Return: a SharedCorpus holding the annotation files at paths that could be loaded,
+    in a pool of jobs processes, in the order of paths
+    """
+    found = dict(corpus.map_files(_extract_file, paths, jobs))
+    shared_corpus = cls._build([found[path][0] for path in paths if found[path][0] is not None])
+    shared_corpus.errors = dict((path, found[path][1]) for path in paths if found[path][0] is None)
+    return shared_corpus
+
+  @classmethod
+  def attach(cls, name, layout):
+    """
+    Return: a SharedCorpus over a block created in another process
+    """
+    try:
+      shm = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+      # Before Python 3.13 attaching registers the block with the resource tracker again,
+      # which is harmless in processes started by multiprocessing, as they share the tracker of their parent
+      shm = shared_memory.SharedMemory(name=name)
+    return cls(shm, layout)
+
+  def __getstate__(self):
+    return {"name": self.shm.name, "layout": self.layout}
+
+  def __setstate__(self, state):
+    attached = SharedCorpus.attach(state["name"], state["layout"])
+    self.__dict__.update(attached.__dict__)
+
+  def __len__(self):
+    return len(self.doc_filenames)
+
+  def close(self):
+    """
+    Detaches this process from the block. Views must not be used afterwards
+    """
+    for name in self.layout:
+      setattr(self, name, None)
+    self.shm.close()
+
+  def unlink(self):
+    """
+    Detaches and destroys the block, once every worker is done with it
+    """
+    self.close()
+    self.shm.unlink()
+
+  def string(self, code):
+    return self.strings[self.string_offsets[code]:self.string_offsets[code + 1]].tobytes().decode("utf-8")
+
+  def string_code(self, string):
+    """
+    Return: the code of string, or -1 if it is not in the corpus
+    """
+    n = len(self.string_offsets) - 1
+    code = bisect_left(_StringList(self, n), string.encode("utf-8"))
+    if code < n and self.string(code) == string:
+      return code
+    return -1
+
+  def document(self, index):
+    return DocumentView(self, index)
+
+  def documents(self):
+    return [DocumentView(self, i) for i in range(len(self))]
+
+  def find_entities(self, entity_id):
+    """
+    Return: a list of EntityViews of the entities with the ID, one per document it is in
+    """
+    code = self.string_code(entity_id)
+    start = np.searchsorted(self.sorted_entity_ids, code, "left")
+    end = np.searchsorted(self.sorted_entity_ids, code, "right")
+    return [EntityView(self, int(i)) for i in self.entities_by_id[start:end]] if code >= 0 else []
+
+  @classmethod
+  def _build(cls, records):
+    strings = set()
+    for filename, entities, relations in records:
+      strings.add(filename)
+      for ent_id, ent_type, parents_type, spans, properties in entities:
+        strings.update((ent_id, ent_type, parents_type))
+        strings.update(s for prop in properties for s in prop)
+      for rel_id, rel_type, parents_type, arguments, properties in relations:
+        strings.update((rel_id, rel_type, parents_type))
+        strings.update(s for arg in arguments for s in arg)
+        strings.update(s for prop in properties for s in prop)
+    strings = sorted(s.encode("utf-8") for s in strings)
+    codes = dict((s.decode("utf-8"), i) for i, s in enumerate(strings))
+
+    arrays = dict((name, []) for name in ARRAYS)
+    arrays["strings"] = np.frombuffer(b"".join(strings), dtype=np.uint8)
+    arrays["string_offsets"] = np.cumsum([0] + [len(s) for s in strings])
+    for name in ("doc_entity_starts", "doc_relation_starts", "entity_span_starts", "entity_property_starts",
+                 "relation_argument_starts", "relation_property_starts"):
+      arrays[name].append(0)
+
+    n_entities = 0
+    for filename, entities, relations in records:
+      arrays["doc_filenames"].append(codes[filename])
+      doc_entities = {}
+      for ent_id, ent_type, parents_type, spans, properties in entities:
+        doc_entities.setdefault(ent_id, n_entities)
+        n_entities += 1
+        arrays["entity_ids"].append(codes[ent_id])
+        arrays["entity_types"].append(codes[ent_type])
+        arrays["entity_parents_types"].append(codes[parents_type])
+        arrays["spans"] += spans
+        arrays["entity_span_starts"].append(len(arrays["spans"]))
+        arrays["entity_properties"] += [(codes[name], codes[value]) for name, value in properties]
+        arrays["entity_property_starts"].append(len(arrays["entity_properties"]))
+      for rel_id, rel_type, parents_type, arguments, properties in relations:
+        arrays["relation_ids"].append(codes[rel_id])
+        arrays["relation_types"].append(codes[rel_type])
+        arrays["relation_parents_types"].append(codes[parents_type])
+        arrays["relation_arguments"] += [(codes[role], codes[ent_id], doc_entities.get(ent_id, -1))\
+                                         for role, ent_id in arguments]
+        arrays["relation_argument_starts"].append(len(arrays["relation_arguments"]))
+        arrays["relation_properties"] += [(codes[name], codes[value]) for name, value in properties]
+        arrays["relation_property_starts"].append(len(arrays["relation_properties"]))
+      arrays["doc_entity_starts"].append(n_entities)
+      arrays["doc_relation_starts"].append(len(arrays["relation_ids"]))
+
+    entity_ids = np.array(arrays["entity_ids"], dtype=np.int32)
+    arrays["entities_by_id"] = np.argsort(entity_ids, kind="stable")
+    arrays["sorted_entity_ids"] = entity_ids[arrays["entities_by_id"]]
+
+    layout = {}
+    size = 0
+    for name, (dtype, columns) in ARRAYS.items():
+      shape = (len(arrays[name]), columns) if columns else (len(arrays[name]),)
+      arrays[name] = np.array(arrays[name], dtype=dtype).reshape(shape)
+      layout[name] = (size, shape)
+      # Keep every array 8-byte aligned
+      size += (arrays[name].nbytes + 7) // 8 * 8
+
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    shared_corpus = cls(shm, layout)
+    for name in ARRAYS:
+      getattr(shared_corpus, name)[...] = arrays[name]
+
+    return shared_corpus
+
+
+class DocumentView(object):
+  """
+  Read-only view of one document of a SharedCorpus, with the reading methods of annotation.Document
+  """
+  __slots__ = ("corpus", "index")
+
+  def __init__(self, shared_corpus, index):
+    self.corpus = shared_corpus
+    self.index = index
+
+  @property
+  def filename(self):
+    return self.corpus.string(self.corpus.doc_filenames[self.index])
+
+  def get_entities(self):
+    starts = self.corpus.doc_entity_starts
+    return [EntityView(self.corpus, i) for i in range(starts[self.index], starts[self.index + 1])]
+
+  def get_all_relations(self):
+    starts = self.corpus.doc_relation_starts
+    return [RelationView(self.corpus, i) for i in range(starts[self.index], starts[self.index + 1])]
+
+
+class EntityView(object):
+  """
+  Read-only view of one entity of a SharedCorpus, with the reading methods of annotation.Entity
+  """
+  __slots__ = ("corpus", "index")
+
+  def __init__(self, shared_corpus, index):
+    self.corpus = shared_corpus
+    self.index = index
+
+  def __eq__(self, other):
+    return isinstance(other, EntityView) and self.corpus is other.corpus and self.index == other.index
+
+  def __hash__(self):
+    return hash(self.index)
+
+  @property
+  def id(self):
+    return self.corpus.string(self.corpus.entity_ids[self.index])
+
+  @property
+  def type(self):
+    return self.corpus.string(self.corpus.entity_types[self.index])
+
+  @property
+  def parentsType(self):
+    return self.corpus.string(self.corpus.entity_parents_types[self.index])
+
+  @property
+  def spans(self):
+    starts = self.corpus.entity_span_starts
+    return [(int(start), int(end)) for start, end in self.corpus.spans[starts[self.index]:starts[self.index + 1]]]
+
+  @property
+  def span_string(self):
+    return ";".join("%s,%s" % span for span in self.spans)
+
+  @property
+  def properties(self):
+    starts = self.corpus.entity_property_starts
+    return [PropertyView(self.corpus.string(name), self.corpus.string(value))\
+            for name, value in self.corpus.entity_properties[starts[self.index]:starts[self.index + 1]]]
+
+  def get_doc_id(self):
+    return self.id.split("@")[2]
+
+  def preannotated(self):
+    return self.id.endswith("@gold")
+
+  def is_disjointed(self):
+    return len(self.spans) > 1
+
+
+class RelationView(object):
+  """
+  Read-only view of one relation of a SharedCorpus, with the reading methods of annotation.Relation
+  """
+  __slots__ = ("corpus", "index")
+
+  def __init__(self, shared_corpus, index):
+    self.corpus = shared_corpus
+    self.index = index
+
+  @property
+  def id(self):
+    return self.corpus.string(self.corpus.relation_ids[self.index])
+
+  @property
+  def type(self):
+    return self.corpus.string(self.corpus.relation_types[self.index])
+
+  @property
+  def parentsType(self):
+    return self.corpus.string(self.corpus.relation_parents_types[self.index])
+
+  @property
+  def properties(self):
+    """
+    The entity arguments first, then the other properties
+    """
+    args = self._arguments()
+    starts = self.corpus.relation_property_starts
+    props = self.corpus.relation_properties[starts[self.index]:starts[self.index + 1]]
+    return [PropertyView(self.corpus.string(role), self.corpus.string(ent_id)) for role, ent_id, _ in args] +\
+           [PropertyView(self.corpus.string(name), self.corpus.string(value)) for name, value in props]
+
+  @property
+  def subtype(self):
+    subtypes = [prop.value for prop in self.properties if prop.name.lower() == "type"]
+    return subtypes[0] if subtypes else None
+
+  def _arguments(self):
+    starts = self.corpus.relation_argument_starts
+    return self.corpus.relation_arguments[starts[self.index]:starts[self.index + 1]]
+
+  def entity_ids(self):
+    return [self.corpus.string(ent_id) for _, ent_id, _ in self._arguments()]
+
+  def get_entities(self):
+    """
+    Return: EntityViews of the arguments, with None for those not in the relation's document
+    """
+    return [EntityView(self.corpus, int(i)) if i >= 0 else None for _, _, i in self._arguments()]
+
+  def entity_documents(self):
+    return list(set([ent_id.split("@")[2] for ent_id in self.entity_ids()]))
+
+  def is_cross_doc(self):
+    return len(self.entity_documents()) > 1
+
+
+class _StringList(object):
+  """
+  The encoded strings of a SharedCorpus as a sequence, for bisect
+  """
+  def __init__(self, shared_corpus, n):
+    self.corpus = shared_corpus
+    self.n = n
+
+  def __len__(self):
+    return self.n
+
+  def __getitem__(self, code):
+    offsets = self.corpus.string_offsets
+    return self.corpus.strings[offsets[code]:offsets[code + 1]].tobytes()
+
+
+def _extract(doc):
+  """
+  Return: the contents of an annotation Document as plain tuples and lists:
+  (filename, [(ID, type, parentsType, spans, [(property name, value)])],
+   [(ID, type, parentsType, [(role, entity ID)], [(property name, value)])])
+  """
+  entities = [(ent.id, ent.type, ent.parentsType, list(ent.spans), ent.property_items())\
+              for ent in doc.get_entities()]
+  relations = []
+  for rel in doc.get_all_relations():
+    items = rel.property_items()
+    arguments = [(name, value) for name, value in items if name.lower() in annotation.ENTITY_ID_PROPERTIES]
+    properties = [(name, value) for name, value in items if name.lower() not in annotation.ENTITY_ID_PROPERTIES]
+    relations.append((rel.id, rel.type, rel.parentsType, arguments, properties))
+
+  return (doc.filename, entities, relations)
+
+def _extract_file(path):
+  """
+  Return: a tuple of (the contents of the annotation file at path, None),
+  or (None, error message) if it could not be loaded
+  """
+  try:
+    return _extract(corpus.load_annotation(path)), None
+  except Exception as e:
+    return None, "%s: %s" % (type(e).__name__, e)
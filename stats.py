@@ -0,0 +1,211 @@
+"""
+Corpus statistics as a map-reduce: each annotation file is parsed once into a DocumentSummary
+of all the counts we report, summaries are computed in a pool of processes, and added up.
+CorpusStats keeps the summary of every file, so that only files that changed need to be parsed again.
+"""
+
+import copy
+import os
+import pickle
+from collections import Counter
+
+from anafora4python import corpus
+
+class DocumentSummary(object):
+  """
+  Counts for one document, or the sum of those of many.
+
+  entity_types: {entity type: count}
+  property_values: {(property name, value): count}, over entities
+  relation_types: {relation type: count}
+  relation_subtypes: {(relation type, subtype): count}
+  cross_doc: {relation type: count} of relations between entities of different documents
+  within_doc: {relation type: count} of the others
+  span_lengths: {length in characters: count of entities}, over all of an entity's spans
+  statuses: {Document.status: count of files}
+
+  The summary of a single document also has its status and savetime, which sums do not.
+  """
+  counters = ["entity_types", "property_values", "relation_types", "relation_subtypes",\
+              "cross_doc", "within_doc", "span_lengths", "statuses"]
+  status = None
+  savetime = None
+
+  def __init__(self):
+    self.files = 0
+    for name in self.counters:
+      setattr(self, name, Counter())
+
+  @classmethod
+  def from_document(cls, doc):
+    """
+    Return: the DocumentSummary of an annotation Document, in one pass over its entities and relations
+    """
+    summary = cls()
+    summary.files = 1
+    summary.status = doc.status
+    summary.savetime = doc.savetime
+    summary.statuses[doc.status] += 1
+    for ent in doc.get_entities():
+      summary.entity_types[ent.type] += 1
+      summary.span_lengths[sum(end - start for start, end in ent.spans)] += 1
+      for name, value in ent.property_items():
+        summary.property_values[(name, value)] += 1
+
+    for rel in doc.get_all_relations():
+      summary.relation_types[rel.type] += 1
+      if rel.subtype is not None:
+        summary.relation_subtypes[(rel.type, rel.subtype)] += 1
+      if rel.is_cross_doc():
+        summary.cross_doc[rel.type] += 1
+      else:
+        summary.within_doc[rel.type] += 1
+
+    return summary
+
+  def annotations(self):
+    return sum(self.entity_types.values()) + sum(self.relation_types.values())
+
+  def __iadd__(self, other):
+    self.files += other.files
+    for name in self.counters:
+      getattr(self, name).update(getattr(other, name))
+    return self
+
+  def __isub__(self, other):
+    self.files -= other.files
+    for name in self.counters:
+      counts = getattr(self, name)
+      counts.subtract(getattr(other, name))
+      for key in [key for key, count in counts.items() if count <= 0]:
+        del counts[key]
+    return self
+
+  def __add__(self, other):
+    total = copy.deepcopy(self)
+    total.status = total.savetime = None
+    total += other
+    return total
+
+  def to_dict(self):
+    """
+    Return: the counts as a JSON-friendly dict, with pairs nested as {first: {second: count}}
+    """
+    def nested(counts):
+      result = {}
+      for (first, second), count in counts.items():
+        result.setdefault(first, {})[second] = count
+      return result
+
+    relations = {}
+    for rel_type, count in self.relation_types.items():
+      relations[rel_type] = {"count": count, "cross_doc": self.cross_doc[rel_type],
+                             "within_doc": self.within_doc[rel_type],
+                             "cross_doc_ratio": float(self.cross_doc[rel_type]) / count}
+
+    return {"files": self.files,
+            "statuses": dict(self.statuses),
+            "entity_types": dict(self.entity_types),
+            "property_values": nested(self.property_values),
+            "relation_types": relations,
+            "relation_subtypes": nested(self.relation_subtypes),
+            "span_lengths": dict((str(length), count) for length, count in sorted(self.span_lengths.items()))}
+
+
+def summarize_file(path):
+  """
+  Return: a tuple of (DocumentSummary, None) for the annotation file at path,
+  or (None, error message) if it could not be loaded
+  """
+  try:
+    return DocumentSummary.from_document(corpus.load_annotation(path)), None
+  except Exception as e:
+    return None, "%s: %s" % (type(e).__name__, e)
+
+
+class CorpusStats(object):
+  """
+  The summaries of every file of a corpus, and their total.
+
+  update() only summarizes the files that are new, or whose modification time or size changed,
+  and takes the old summaries of changed and deleted files out of the total,
+  so keeping the statistics of a corpus current costs one parse per changed file.
+  """
+  def __init__(self):
+    # {path: ((mtime, size), DocumentSummary)}
+    self.summaries = {}
+    # {path: error message} for the files that could not be loaded
+    self.errors = {}
+    self.total = DocumentSummary()
+
+  @classmethod
+  def load(cls, filename):
+    with open(filename, "rb") as f:
+      return pickle.load(f)
+
+  def save(self, filename):
+    with open(filename, "wb") as f:
+      pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+
+  def stale_files(self, paths):
+    """
+    Return: the paths that are not summarized, or have changed since they were
+    """
+    return [path for path in paths if path not in self.summaries or self.summaries[path][0] != _file_key(path)]
+
+  def update(self, paths, jobs=1):
+    """
+    Brings the statistics up to date with the files in paths: files that are no longer there are dropped,
+    and new or changed files are summarized in a pool of jobs processes.
+
+    Return: a list of the paths that were summarized
+    """
+    paths = set(paths)
+    removed = [path for path in list(self.summaries) + list(self.errors) if path not in paths]
+    return self.update_paths(self.stale_files(sorted(paths)), removed, jobs)
+
+  def update_paths(self, changed, removed=(), jobs=1):
+    """
+    Like update(), but told which files changed and which were removed, for callers that already know,
+    such as watch.Watcher, so that nothing else is looked at
+
+    Return: a list of the paths that were summarized
+    """
+    for path in removed:
+      self.remove(path)
+      self.errors.pop(path, None)
+
+    keys = {}
+    for path in changed:
+      try:
+        keys[path] = _file_key(path)
+      except OSError:
+        # Removed since
+        self.remove(path)
+        self.errors.pop(path, None)
+    changed = [path for path in changed if path in keys]
+    for path, (summary, error) in corpus.map_files(summarize_file, changed, jobs):
+      self.remove(path)
+      if summary is None:
+        self.errors[path] = error
+      else:
+        self.add(path, keys[path], summary)
+
+    return changed
+
+  def add(self, path, key, summary):
+    self.errors.pop(path, None)
+    self.summaries[path] = (key, summary)
+    self.total += summary
+
+  def remove(self, path):
+    if path in self.summaries:
+      self.total -= self.summaries.pop(path)[1]
+
+
+def _file_key(path):
+  """
+  What has to change for a file to be summarized again
+  """
+  stat = os.stat(path)
+  return (stat.st_mtime_ns, stat.st_size)
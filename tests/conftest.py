@@ -0,0 +1,78 @@
+import pytest
+from bs4 import BeautifulSoup as soup
+
+from anafora4python import annotation
+
+NOTE = "ID001_clinic_001"
+
+# (ID, span, type, [(property name, value)])
+ENTITIES = [
+  ("1@e@ID001_clinic_001@gold", "0,7", "EVENT", [("DocTimeRel", "BEFORE"), ("ContextualModality", "ACTUAL")]),
+  ("2@e@ID001_clinic_001@gold", "10,20", "TIMEX3", [("Class", "DATE")]),
+  ("3@e@ID001_clinic_001@ann1", "25,30", "EVENT", [("DocTimeRel", "AFTER"), ("ContextualModality", "HYPOTHETICAL")]),
+  ("4@e@ID001_clinic_001@ann1", "32,35;40,44", "EVENT", [("DocTimeRel", "BEFORE")]),
+]
+# (ID, type, [(property name, value)])
+RELATIONS = [
+  ("1@r@ID001_clinic_001@gold", "TLINK",
+   [("Source", "1@e@ID001_clinic_001@gold"), ("Type", "CONTAINS"), ("Target", "2@e@ID001_clinic_001@gold")]),
+  ("2@r@ID001_clinic_001@gold", "TLINK",
+   [("Source", "3@e@ID001_clinic_001@ann1"), ("Type", "CONTAINS-SUBEVENT"), ("Target", "1@e@ID001_clinic_001@gold")]),
+  ("3@r@ID001_clinic_001@gold", "Identical",
+   [("FirstInstance", "1@e@ID001_clinic_001@gold"), ("Coreferring_String", "3@e@ID001_clinic_001@ann1")]),
+]
+PARENTS_TYPES = {"EVENT": "TemporalEntities", "TIMEX3": "TemporalEntities",
+                 "TLINK": "TemporalRelations", "Identical": "CoreferenceRelations"}
+
+
+def annotation_xml(entities=ENTITIES, relations=RELATIONS, status="completed"):
+  """
+  Return: the XML of an Anafora annotation file with the given entities and relations
+  """
+  def properties(props):
+    return "".join("<%s>%s</%s>" % (name, value, name) for name, value in props)
+
+  annotations = ["<entity><id>%s</id><span>%s</span><type>%s</type><parentsType>%s</parentsType>"
+                 "<properties>%s</properties></entity>" % (ent_id, span, ent_type, PARENTS_TYPES.get(ent_type, ""),
+                                                          properties(props))
+                 for ent_id, span, ent_type, props in entities]
+  annotations += ["<relation><id>%s</id><type>%s</type><parentsType>%s</parentsType>"
+                  "<properties>%s</properties></relation>" % (rel_id, rel_type, PARENTS_TYPES.get(rel_type, ""),
+                                                             properties(props))
+                  for rel_id, rel_type, props in relations]
+  return ('<?xml version="1.0" encoding="UTF-8"?>\n<data><info><savetime>10:10:10 01-01-2020</savetime>'
+          '<progress>%s</progress></info><schema path="./" protocol="file">temporal.schema.xml</schema>'
+          '<annotations>%s</annotations></data>\n' % (status, "".join(annotations)))
+
+
+@pytest.fixture
+def make_document():
+  def make(entities=ENTITIES, relations=RELATIONS, filename=NOTE + ".Temporal-Relation.gold.completed.xml",
+           read_only=False, **kwargs):
+    return annotation.Document(soup(annotation_xml(entities, relations), "xml"), filename,
+                               read_only=read_only, **kwargs)
+  return make
+
+@pytest.fixture
+def document(make_document):
+  return make_document()
+
+@pytest.fixture
+def write_note(tmp_path):
+  """
+  Writes annotation files into a note directory under tmp_path, and the raw text if given
+
+  Return: the paths of the annotation files
+  """
+  def write(files, note=NOTE, text=None, directory=None):
+    note_dir = (directory or tmp_path) / note
+    note_dir.mkdir(parents=True, exist_ok=True)
+    if text is not None:
+      (note_dir / note).write_text(text)
+    paths = []
+    for name, xml in files:
+      path = note_dir / ("%s.%s" % (note, name))
+      path.write_text(xml)
+      paths.append(str(path))
+    return paths
+  return write
@@ -0,0 +1,121 @@
+import math
+
+import pytest
+
+from conftest import ENTITIES
+from anafora4python.iaa import agreement
+
+NA = agreement.NO_ANNOTATION
+
+def _confusion(pairs):
+  """
+  pairs: a list of ((label 1, label 2), count)
+  """
+  confusion = agreement.ConfusionMatrix()
+  confusion.add([label1 for (label1, _), count in pairs for _ in range(count)],
+                [label2 for (_, label2), count in pairs for _ in range(count)])
+  return confusion
+
+
+def test_cohen_kappa():
+  # Observed agreement 0.7, expected 0.5
+  confusion = _confusion([(("Yes", "Yes"), 20), (("Yes", "No"), 5), (("No", "Yes"), 10), (("No", "No"), 15)])
+  assert confusion.total() == 50
+  assert confusion.observed_agreement() == pytest.approx(0.7)
+  assert confusion.cohen_kappa() == pytest.approx(0.4)
+  assert confusion.to_dict() == {"Yes": {"Yes": 20, "No": 5}, "No": {"Yes": 10, "No": 15}}
+
+def test_cohen_kappa_degenerate():
+  assert _confusion([(("A", "A"), 3)]).cohen_kappa() == 1.0
+  assert math.isnan(agreement.ConfusionMatrix().cohen_kappa())
+  # Systematic disagreement
+  assert _confusion([(("A", "B"), 2), (("B", "A"), 2)]).cohen_kappa() == pytest.approx(-1.0)
+
+def test_confusion_matrices_add_up():
+  pairs1 = [(("Yes", "Yes"), 20), (("Yes", "No"), 5)]
+  pairs2 = [(("No", "No"), 15), (("No", "Yes"), 10)]
+  # The second matrix interns its labels in the other order
+  total = _confusion(pairs1) + _confusion(pairs2)
+  assert total.to_dict() == _confusion(pairs1 + pairs2).to_dict()
+  assert total.cohen_kappa() == pytest.approx(0.4)
+
+def _fleiss_units(table, categories):
+  return [[category for category, count in zip(categories, row) for _ in range(count)] for row in table]
+
+FLEISS_TABLE = [[0, 0, 0, 0, 14], [0, 2, 6, 4, 2], [0, 0, 3, 5, 6], [0, 3, 9, 2, 0], [2, 2, 8, 1, 1],
+                [7, 7, 0, 0, 0], [3, 2, 6, 3, 0], [2, 5, 3, 2, 2], [6, 5, 2, 1, 0], [0, 2, 2, 3, 7]]
+
+def test_fleiss_kappa():
+  # Fleiss (1971), 14 raters: kappa = 0.210
+  counts = agreement.MultiRaterCounts(14)
+  counts.add_units(_fleiss_units(FLEISS_TABLE, "abcde"))
+  assert counts.complete_units == 10
+  assert counts.fleiss_kappa() == pytest.approx(0.20993, abs=1e-5)
+
+def test_fleiss_kappa_adds_up():
+  total = agreement.MultiRaterCounts(14)
+  for i in range(0, len(FLEISS_TABLE), 3):
+    counts = agreement.MultiRaterCounts(14)
+    # Each part interns the categories in a different order
+    counts.add_units(_fleiss_units(FLEISS_TABLE[i:i + 3], "abcde")[::-1])
+    total += counts
+  assert total.fleiss_kappa() == pytest.approx(0.20993, abs=1e-5)
+
+KRIPPENDORFF_CODERS = [
+  [1, 2, 3, 3, 2, 1, 4, 1, 2, None, None, None],
+  [1, 2, 3, 3, 2, 2, 4, 1, 2, 5, None, 3],
+  [None, 3, 3, 3, 2, 3, 4, 2, 2, 5, 1, None],
+  [1, 2, 3, 3, 2, 4, 4, 1, 2, 5, 1, None],
+]
+
+def test_krippendorff_alpha():
+  # Krippendorff (2011), four coders with missing values: nominal alpha = 0.743
+  counts = agreement.MultiRaterCounts(4)
+  counts.add_units(list(zip(*KRIPPENDORFF_CODERS)))
+  assert counts.krippendorff_alpha() == pytest.approx(0.743, abs=5e-4)
+  # Only the units all four coders labelled count for Fleiss' kappa
+  assert counts.complete_units == 8
+
+def test_krippendorff_alpha_adds_up():
+  units = list(zip(*KRIPPENDORFF_CODERS))
+  first, second = agreement.MultiRaterCounts(4), agreement.MultiRaterCounts(4)
+  first.add_units(units[:5])
+  second.add_units(units[5:])
+  alpha = first.krippendorff_alpha()
+  assert (first + second).krippendorff_alpha() == pytest.approx(0.743, abs=5e-4)
+  # Adding makes a copy
+  assert first.krippendorff_alpha() == alpha
+
+def test_perfect_and_empty_reliability():
+  counts = agreement.MultiRaterCounts(3)
+  counts.add_units([["A", "A", "A"], ["B", "B", None]])
+  assert counts.krippendorff_alpha() == 1.0
+  assert counts.fleiss_kappa() == 1.0
+  empty = agreement.MultiRaterCounts(3)
+  empty.add_units([])
+  assert math.isnan(empty.krippendorff_alpha())
+
+
+def test_document_confusions(make_document):
+  entities = [("1@e@ID001_clinic_001@gold", "0,7", "TIMEX3", [("DocTimeRel", "BEFORE")]),
+              ENTITIES[1],
+              ("3@e@ID001_clinic_001@ann1", "25,30", "EVENT", [("DocTimeRel", "BEFORE")])]
+  doc1, doc2 = make_document(), make_document(entities, [])
+  assert agreement.get_entity_confusion(doc1, doc2).to_dict() == {
+    "EVENT": {"TIMEX3": 1, "EVENT": 1, NA: 1}, "TIMEX3": {"TIMEX3": 1}}
+  confusions = agreement.get_property_confusions(doc1, doc2)
+  assert sorted(confusions) == ["Class", "ContextualModality", "DocTimeRel"]
+  assert confusions["DocTimeRel"].to_dict() == {"BEFORE": {"BEFORE": 1}, "AFTER": {"BEFORE": 1}}
+  assert confusions["ContextualModality"].to_dict() == {"ACTUAL": {NA: 1}, "HYPOTHETICAL": {NA: 1}}
+  by_type = agreement.get_property_confusions(doc1, doc2, by_type=True)
+  assert sorted(by_type) == [("EVENT", "ContextualModality"), ("EVENT", "DocTimeRel"), ("TIMEX3", "Class")]
+
+def test_document_reliability(make_document):
+  docs = [make_document(), make_document(), make_document(ENTITIES[:2], [])]
+  reliability = agreement.get_entity_reliability(docs)
+  assert reliability.complete_units == 4
+  assert reliability.krippendorff_alpha() < 1
+  properties = agreement.get_property_reliability(docs)
+  assert properties["Class"].krippendorff_alpha() == 1.0
+  # The third document gives no label for the entities it lacks, so they are not complete units
+  assert properties["DocTimeRel"].complete_units == 1
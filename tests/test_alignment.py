@@ -0,0 +1,126 @@
+import math
+import random
+
+import pytest
+
+from anafora4python import alignment, merge
+from anafora4python.iaa import scoring
+
+GOLD = [
+  ("1@e@ID001_clinic_001@gold", "0,10", "EVENT", []),
+  ("2@e@ID001_clinic_001@gold", "20,30", "TIMEX3", []),
+  ("3@e@ID001_clinic_001@gold", "40,45;50,55", "EVENT", []),
+]
+SYSTEM = [
+  # The same span
+  ("1@e@ID001_clinic_001@sys", "0,10", "EVENT", []),
+  # Inside the second gold entity, Jaccard 0.6
+  ("2@e@ID001_clinic_001@sys", "22,28", "TIMEX3", []),
+  # Shares 3 characters with the disjoint gold entity, Jaccard 0.2
+  ("3@e@ID001_clinic_001@sys", "44,52", "EVENT", []),
+  ("4@e@ID001_clinic_001@sys", "60,65", "EVENT", []),
+]
+
+class Span(object):
+  """
+  The little of an Entity that alignment reads
+  """
+  def __init__(self, spans, ent_type="EVENT", doc_id="ID001"):
+    self.spans = spans
+    self.type = ent_type
+    self.doc_id = doc_id
+
+  def get_doc_id(self):
+    return self.doc_id
+
+def _pairs(gold, system, mode, threshold=0.5):
+  return [(g and g.id.num, s and s.id.num) for g, s in gold.align_entities_with(system, mode, threshold)]
+
+
+@pytest.mark.parametrize("mode, threshold, expected", [
+  ("exact", 0.5, [("1", "1"), ("2", None), ("3", None), (None, "2"), (None, "3"), (None, "4")]),
+  ("overlap", 0.5, [("1", "1"), ("2", "2"), ("3", "3"), (None, "4")]),
+  ("contains", 0.5, [("1", "1"), ("2", "2"), ("3", None), (None, "3"), (None, "4")]),
+  ("jaccard", 0.5, [("1", "1"), ("2", "2"), ("3", None), (None, "3"), (None, "4")]),
+  ("jaccard", 0.7, [("1", "1"), ("2", None), ("3", None), (None, "2"), (None, "3"), (None, "4")]),
+  ("jaccard", 0.2, [("1", "1"), ("2", "2"), ("3", "3"), (None, "4")]),
+])
+def test_modes(make_document, mode, threshold, expected):
+  assert _pairs(make_document(GOLD, []), make_document(SYSTEM, []), mode, threshold) == expected
+
+def test_most_similar_first():
+  gold = [Span([(0, 10)]), Span([(5, 12)])]
+  system = [Span([(0, 8)]), Span([(0, 10)])]
+  # The first gold entity takes the system entity with the same span, and the second the one left
+  assert alignment.align_indexes(gold, system, "overlap") == [(0, 1), (1, 0)]
+
+def test_same_type_first():
+  gold = [Span([(0, 10)], "TIMEX3")]
+  system = [Span([(0, 10)], "EVENT"), Span([(0, 10)], "TIMEX3")]
+  assert alignment.align_indexes(gold, system) == [(0, 1), (None, 0)]
+  assert alignment.align_indexes(gold, system, "overlap") == [(0, 1), (None, 0)]
+
+def test_documents_are_not_mixed():
+  gold = [Span([(0, 10)], doc_id="ID001")]
+  system = [Span([(0, 10)], doc_id="ID002")]
+  for mode in alignment.MODES:
+    assert alignment.align_indexes(gold, system, mode) == [(0, None), (None, 0)]
+
+def test_bad_mode():
+  with pytest.raises(ValueError):
+    alignment.align_indexes([], [], "partial")
+
+def test_span_length():
+  assert alignment.span_length([(0, 5), (10, 12), (20, 20)]) == 7
+
+def test_sweep_line_matches_all_pairs():
+  rng = random.Random(7)
+
+  def entity():
+    spans = []
+    for _ in range(rng.choice([1, 1, 2])):
+      start = rng.randrange(200)
+      spans.append((start, start + rng.randrange(1, 15)))
+    return Span(sorted(spans), doc_id=rng.choice(["ID001", "ID002"]))
+
+  entities = [entity() for _ in range(60)]
+  others = [entity() for _ in range(60)]
+  expected = {}
+  for i, ent in enumerate(entities):
+    for j, other in enumerate(others):
+      if ent.doc_id == other.doc_id:
+        shared = sum(max(0, min(end, other_end) - max(start, other_start))
+                     for start, end in ent.spans for other_start, other_end in other.spans)
+        if shared:
+          expected[(i, j)] = shared
+  assert alignment._shared_characters(entities, others) == expected
+
+
+def test_merge_aligns_leniently(make_document):
+  slots = merge.align_entities([make_document(GOLD, []), make_document(SYSTEM, [])], mode="overlap")
+  assert [sorted((i, ent.id.num) for i, ent in slot.items()) for _, slot in slots] == [
+    [(0, "1"), (1, "1")], [(0, "2"), (1, "2")], [(0, "3"), (1, "3")], [(1, "4")]]
+
+
+def test_scores():
+  scores = scoring.Scores(3, 1, 2)
+  assert (scores.precision(), scores.recall(), scores.f1()) == (0.75, 0.6, 6 / 9.0)
+  assert repr(scores + scoring.Scores(1, 0, 0)) == "Scores(tp=4, fp=1, fn=2)"
+  assert math.isnan(scoring.Scores().precision())
+  assert math.isnan(scoring.Scores().f1())
+  assert scoring.Scores(0, 1, 0).f1() == 0.0
+
+def test_score_entities(make_document):
+  gold, system = make_document(GOLD, []), make_document(SYSTEM, [])
+  exact = scoring.score_entities(gold, system)
+  assert (exact.tp, exact.fp, exact.fn) == (1, 3, 2)
+  overlap = scoring.score_entities(gold, system, "overlap")
+  assert (overlap.tp, overlap.fp, overlap.fn) == (3, 1, 0)
+  by_type = scoring.score_entities(gold, system, "overlap", by_type=True)
+  assert dict((ent_type, (s.tp, s.fp, s.fn)) for ent_type, s in by_type.items()) == {"EVENT": (2, 1, 0), "TIMEX3": (1, 0, 0)}
+
+def test_aligned_entity_of_another_type(make_document):
+  gold = make_document(GOLD[:1], [])
+  system = make_document([("1@e@ID001_clinic_001@sys", "0,10", "TIMEX3", [])], [])
+  by_type = scoring.score_entities(gold, system, by_type=True)
+  assert dict((ent_type, (s.tp, s.fp, s.fn)) for ent_type, s in by_type.items()) == {"EVENT": (0, 0, 1), "TIMEX3": (0, 1, 0)}
@@ -0,0 +1,61 @@
+import pickle
+
+from conftest import ENTITIES, annotation_xml
+from anafora4python import annotation, corpus
+
+
+def test_parse():
+  ann_id = annotation.AnnotationID("12@e@ID028_clinic_082@gold")
+  assert (ann_id.num, ann_id.number, ann_id.kind, ann_id.doc_id, ann_id.annotator) == (
+    "12", 12, "e", "ID028_clinic_082", "gold")
+  odd = annotation.AnnotationID("x@r")
+  assert (odd.num, odd.number, odd.kind, odd.doc_id, odd.annotator) == ("x", None, "r", "", "")
+
+def test_is_the_string():
+  ann_id = annotation.AnnotationID("12@e@ID028_clinic_082@gold")
+  assert ann_id == "12@e@ID028_clinic_082@gold"
+  assert not ann_id != "12@e@ID028_clinic_082@gold"
+  assert {"12@e@ID028_clinic_082@gold": 1}[ann_id] == 1
+  assert ann_id.split("@")[2] == "ID028_clinic_082"
+  assert isinstance(ann_id, str)
+
+def test_sorts_numerically():
+  ids = [annotation.AnnotationID(s) for s in ["10@e@ID001@gold", "9@e@ID001@gold", "x@e@ID001@gold",
+                                              "9@r@ID001@gold", "9@e@ID001@ann1", "100@e@ID000@gold"]]
+  assert [str(ann_id) for ann_id in sorted(ids)] == [
+    "9@e@ID001@ann1", "9@e@ID001@gold", "9@r@ID001@gold", "10@e@ID001@gold", "100@e@ID000@gold", "x@e@ID001@gold"]
+  assert ids[1] < ids[0] and ids[1] <= ids[0] and ids[0] > ids[1] and ids[0] >= ids[1]
+  # Plain strings still compare as strings
+  assert not ids[1] < "10@e@ID001@gold"
+
+def test_pickle():
+  ann_id = annotation.AnnotationID("12@e@ID028_clinic_082@gold")
+  loaded = pickle.loads(pickle.dumps(ann_id))
+  assert type(loaded) is annotation.AnnotationID
+  assert (loaded, loaded.number, loaded.doc_id) == (ann_id, 12, "ID028_clinic_082")
+
+def test_id_table_interns():
+  ids = annotation.IDTable()
+  first = ids("1@e@ID001_clinic_001@gold")
+  assert ids("1@e@ID001_clinic_001@gold") is first
+  assert len(ids) == 1
+
+def test_documents_use_annotation_ids(make_document):
+  entities = ENTITIES + [("10@e@ID001_clinic_001@gold", "50,55", "EVENT", [])]
+  doc = make_document(entities)
+  assert all(type(ent.id) is annotation.AnnotationID for ent in doc.get_entities())
+  assert doc.get_sorted_entity_ids() == ["1@e@ID001_clinic_001@gold", "2@e@ID001_clinic_001@gold",
+                                         "3@e@ID001_clinic_001@ann1", "4@e@ID001_clinic_001@ann1",
+                                         "10@e@ID001_clinic_001@gold"]
+  assert doc.relations_dict["1@r@ID001_clinic_001@gold"].get_doc_id() == "ID001_clinic_001"
+
+def test_documents_share_an_id_table(make_document, write_note):
+  ids = annotation.IDTable()
+  first, second = make_document(ids=ids), make_document(ids=ids)
+  ent_id = "1@e@ID001_clinic_001@gold"
+  assert first.entities_dict[ent_id].id is second.entities_dict[ent_id].id
+  assert len(ids) == 7
+
+  path, = write_note([("Temporal-Relation.gold.completed.xml", annotation_xml())])
+  assert corpus.load_annotation(path, ids=ids).entities_dict[ent_id].id is first.entities_dict[ent_id].id
+  assert len(ids) == 7
@@ -0,0 +1,107 @@
+import json
+
+import pytest
+
+from conftest import ENTITIES, NOTE, RELATIONS, annotation_xml
+from anafora4python import cli, corpus
+
+TEXT = "Patient - 2020-01-01 had fever, ran and left."
+GOLD = "Temporal-Relation.gold.completed.xml"
+ANN2 = "Temporal-Relation.ann2.completed.xml"
+
+@pytest.fixture
+def project(tmp_path, write_note):
+  """
+  A project with one note annotated twice, and another annotated once
+  """
+  entities = [("1@e@ID001_clinic_001@ann2", "0,7", "EVENT", [("DocTimeRel", "BEFORE")])] + ENTITIES[1:3]
+  write_note([(GOLD, annotation_xml()), (ANN2, annotation_xml(entities, []))], text=TEXT)
+  write_note([(GOLD, annotation_xml(ENTITIES[:2], RELATIONS[:1]).replace(NOTE, "ID002_clinic_002"))],
+             note="ID002_clinic_002", text=TEXT)
+  return tmp_path
+
+def _run(capsys, *argv):
+  status = cli.main([str(arg) for arg in argv])
+  out, err = capsys.readouterr()
+  return status, out, err
+
+
+def test_find_annotation_files(project):
+  paths = corpus.find_annotation_files(str(project))
+  assert [corpus.note_name(path) for path in paths] == [NOTE, NOTE, "ID002_clinic_002"]
+  assert corpus.find_annotation_files(str(project), "*.ann2.*") == [paths[0]]
+  assert corpus.raw_text_path(paths[0]) == str(project / NOTE / NOTE)
+  assert corpus.load_raw_text(paths[0]).text == TEXT
+
+def test_export(capsys, project):
+  status, out, err = _run(capsys, "export", project)
+  assert status == 0
+  assert "3 files, 13 annotations" in err
+  files = [json.loads(line) for line in out.splitlines()]
+  assert len(files) == 3
+  gold = [f for f in files if f["file"].endswith(NOTE + "." + GOLD)][0]
+  assert [ent["text"] for ent in gold["entities"]] == [["Patient"], ["2020-01-01"], ["fever"], ["ran", "left"]]
+  assert gold["entities"][0]["properties"] == {"DocTimeRel": "BEFORE", "ContextualModality": "ACTUAL"}
+  assert gold["relations"][0]["properties"] == [["Source", "1@e@ID001_clinic_001@gold"], ["Type", "CONTAINS"],
+                                                ["Target", "2@e@ID001_clinic_001@gold"]]
+
+def test_jobs_give_the_same_results(capsys, project):
+  _, out1, _ = _run(capsys, "export", project)
+  _, out2, _ = _run(capsys, "export", "--jobs", 2, project)
+  assert sorted(out1.splitlines()) == sorted(out2.splitlines())
+
+def test_errors_do_not_abort(capsys, project, write_note):
+  write_note([(GOLD, "<data><annotations><entity>")], note="ID003_clinic_003")
+  status, out, err = _run(capsys, "export", project)
+  assert status == 1
+  assert len(out.splitlines()) == 3
+  assert "ID003_clinic_003" in err
+
+def test_validate(capsys, project, write_note):
+  status, out, _ = _run(capsys, "validate", project)
+  assert (status, out) == (0, "")
+  relations = RELATIONS[:1] + [("2@r@ID004_clinic_004@gold", "TLINK", [("Source", "9@e@ID004_clinic_004@gold")])]
+  entities = ENTITIES[:1] + [("2@e@ID004_clinic_004@gold", "10,99", "TIMEX3", [])]
+  path, = write_note([(GOLD, annotation_xml(entities, relations))], note="ID004_clinic_004", text=TEXT)
+  status, out, _ = _run(capsys, "validate", path)
+  assert status == 1
+  assert out.splitlines() == [
+    "%s: relation 1@r@ID001_clinic_001@gold points at missing entity 2@e@ID001_clinic_001@gold" % path,
+    "%s: relation 2@r@ID004_clinic_004@gold points at missing entity 9@e@ID004_clinic_004@gold" % path,
+    "%s: entity 2@e@ID004_clinic_004@gold has span 10,99 outside the text" % path]
+
+def test_iaa(capsys, project):
+  status, out, err = _run(capsys, "iaa", project)
+  assert status == 0
+  assert "skipping ID002_clinic_002: 1 annotation files, not 2" in err
+  report = json.loads(out)
+  assert (report["notes"], report["raters"]) == (1, 2)
+  # The ann2 file comes first, and lacks the gold file's fourth entity
+  assert report["entity_types"]["confusion"] == {"EVENT": {"EVENT": 2}, "<no annotation>": {"EVENT": 1},
+                                                 "TIMEX3": {"TIMEX3": 1}}
+  assert report["properties"]["Class"]["krippendorff_alpha"] == 1.0
+
+def test_score(capsys, project, tmp_path, write_note):
+  gold_dir = tmp_path / "gold"
+  gold_dir.mkdir()
+  write_note([(ANN2, annotation_xml())], directory=gold_dir)
+  system = corpus.find_annotation_files(str(project / NOTE), "*.ann2.*")
+  status, out, _ = _run(capsys, "score", "--gold", gold_dir, *system)
+  assert status == 0
+  report = json.loads(out)
+  assert report["entities"]["precision"] == 1.0
+  assert report["entities"]["recall"] == 0.75
+  assert sorted(report["entity_types"]) == ["EVENT", "TIMEX3"]
+
+def test_reserialize(capsys, project, tmp_path):
+  out_dir = tmp_path / "out"
+  status, _, err = _run(capsys, "reserialize", "--output", out_dir, project / NOTE)
+  assert status == 0
+  assert "2 written, 0 unchanged" in err
+  written = corpus.find_annotation_files(str(out_dir))
+  assert len(written) == 2
+  status, _, err = _run(capsys, "reserialize", *written)
+  assert "0 written, 2 unchanged" in err
+
+def test_no_command(capsys):
+  assert cli.main([]) == 2
@@ -0,0 +1,87 @@
+import pytest
+
+from conftest import ENTITIES, RELATIONS
+
+# A second note with an entity on the same span as the first note's, and relations within and across the notes
+OTHER_ENTITIES = [
+  ("5@e@ID002_clinic_002@gold", "0,7", "EVENT", [("DocTimeRel", "AFTER")]),
+  ("6@e@ID002_clinic_002@gold", "10,20", "TIMEX3", [("Class", "DATE")]),
+]
+OTHER_RELATIONS = [
+  ("4@r@ID002_clinic_002@gold", "TLINK",
+   [("Source", "5@e@ID002_clinic_002@gold"), ("Type", "CONTAINS"), ("Target", "6@e@ID002_clinic_002@gold")]),
+  ("5@r@ID001_clinic_001@gold", "Identical",
+   [("FirstInstance", "1@e@ID001_clinic_001@gold"), ("Coreferring_String", "5@e@ID002_clinic_002@gold")]),
+  ("6@r@ID001_clinic_001@gold", "TLINK",
+   [("Source", "5@e@ID002_clinic_002@gold"), ("Type", "CONTAINS-SUBEVENT"), ("Target", "3@e@ID001_clinic_001@ann1")]),
+]
+
+@pytest.fixture
+def cross_doc(make_document):
+  return make_document(ENTITIES + OTHER_ENTITIES, RELATIONS + OTHER_RELATIONS, filename="cross.Temporal-Relation.gold.completed.xml")
+
+def _ids(annotations):
+  return sorted(ann.id for ann in annotations)
+
+
+def test_doc_ids(cross_doc):
+  assert sorted(cross_doc.doc_ids()) == ["ID001_clinic_001", "ID002_clinic_002"]
+  assert cross_doc.entities_dict["5@e@ID002_clinic_002@gold"].doc_id == "ID002_clinic_002"
+
+def test_relation_documents(cross_doc):
+  within, across = cross_doc.relations_dict["4@r@ID002_clinic_002@gold"], cross_doc.relations_dict["5@r@ID001_clinic_001@gold"]
+  assert (within.entity_documents(), within.single_doc(), within.is_cross_doc()) == (["ID002_clinic_002"], True, False)
+  assert sorted(across.entity_documents()) == ["ID001_clinic_001", "ID002_clinic_002"]
+  assert (across.single_doc(), across.is_cross_doc()) == (False, True)
+  assert _ids(cross_doc.get_cross_doc_identical_chains()) == ["5@r@ID001_clinic_001@gold"]
+  assert _ids(cross_doc.get_within_doc_identical_chains()) == ["3@r@ID001_clinic_001@gold"]
+  assert _ids(cross_doc.get_cross_doc_contains_subevent_tlinks()) == ["6@r@ID001_clinic_001@gold"]
+
+def test_span_queries_by_document(cross_doc):
+  assert _ids(cross_doc.query(span_within=(0, 7))) == ["1@e@ID001_clinic_001@gold", "5@e@ID002_clinic_002@gold"]
+  assert _ids(cross_doc.get_annotations_by_span((0, 20), "ID002_clinic_002")) == ["5@e@ID002_clinic_002@gold",
+                                                                                  "6@e@ID002_clinic_002@gold"]
+  assert _ids(cross_doc.query(span_within=(0, 7), doc_id="ID001_clinic_001")) == ["1@e@ID001_clinic_001@gold"]
+
+def test_view(cross_doc):
+  view = cross_doc.view("ID002_clinic_002")
+  assert view.doc_ids() == ["ID002_clinic_002"]
+  assert _ids(view.get_entities()) == ["5@e@ID002_clinic_002@gold", "6@e@ID002_clinic_002@gold"]
+  assert sorted(view.entities_dict) == _ids(view.get_entities())
+  assert _ids(view.get_all_relations()) == ["4@r@ID002_clinic_002@gold"]
+  assert sorted(view.relations_dict) == ["4@r@ID002_clinic_002@gold"]
+  assert _ids(view.get_cross_doc_relations()) == ["5@r@ID001_clinic_001@gold", "6@r@ID001_clinic_001@gold"]
+  assert _ids(view.get_tlinks()) == ["4@r@ID002_clinic_002@gold"]
+  assert view.get_identical_chains() == []
+  assert _ids(view.get_relations_with_entity("5@e@ID002_clinic_002@gold")) == ["4@r@ID002_clinic_002@gold"]
+  assert _ids(view.query(type="TIMEX3")) == ["6@e@ID002_clinic_002@gold"]
+  assert view.query(doc_id="ID001_clinic_001") == []
+  assert view.entity_types() == ["EVENT", "TIMEX3"]
+  assert view.filename == cross_doc.filename
+
+  first = cross_doc.view("ID001_clinic_001")
+  assert _ids(first.get_all_relations()) == ["1@r@ID001_clinic_001@gold", "2@r@ID001_clinic_001@gold",
+                                             "3@r@ID001_clinic_001@gold"]
+  assert cross_doc.view("ID999").get_entities() == []
+  assert cross_doc.view("ID999").doc_ids() == []
+
+def test_views_follow_changes(cross_doc):
+  view = cross_doc.view("ID002_clinic_002")
+  # Pointing a within-doc relation at the other note makes it cross-doc
+  rel = cross_doc.relations_dict["4@r@ID002_clinic_002@gold"]
+  [prop for prop in rel.properties if prop.name == "Target"][0].value = "2@e@ID001_clinic_001@gold"
+  assert rel.is_cross_doc()
+  assert view.get_all_relations() == []
+  assert "4@r@ID002_clinic_002@gold" in [r.id for r in view.get_cross_doc_relations()]
+  assert "4@r@ID002_clinic_002@gold" in [r.id for r in cross_doc.view("ID001_clinic_001").get_cross_doc_relations()]
+
+  # Pruning the other note's entity out of a cross-doc relation makes it within-doc
+  cross_doc.remove_annotations([cross_doc.entities_dict["5@e@ID002_clinic_002@gold"]], cascade="prune")
+  ident = cross_doc.relations_dict["5@r@ID001_clinic_001@gold"]
+  assert (ident.entity_documents(), ident.is_cross_doc()) == (["ID001_clinic_001"], False)
+  # As are the others that pointed at it, which are now only about the first note
+  assert _ids(cross_doc.view("ID001_clinic_001").get_all_relations()) == [
+    "1@r@ID001_clinic_001@gold", "2@r@ID001_clinic_001@gold", "3@r@ID001_clinic_001@gold",
+    "4@r@ID002_clinic_002@gold", "5@r@ID001_clinic_001@gold", "6@r@ID001_clinic_001@gold"]
+  assert _ids(view.get_entities()) == ["6@e@ID002_clinic_002@gold"]
+  assert view.get_cross_doc_relations() == []
@@ -0,0 +1,139 @@
+import os
+import random
+
+import pytest
+
+from conftest import ENTITIES, annotation_xml
+from anafora4python import dedup, raw_text
+
+SECTIONS = '[start section id="A"]\nOne two three\n[end section id="A"]\n[start section id="B"]\nfour five\n[end section id="B"]\n'
+
+def _note(rng, words=200):
+  return " ".join("w%d" % rng.randrange(5000) for _ in range(words))
+
+def _copy(rng, text, changes=3):
+  words = text.split()
+  for _ in range(changes):
+    words[rng.randrange(len(words))] = "changed%d" % rng.randrange(5000)
+  return " ".join(words)
+
+def _write(tmp_path, texts):
+  """
+  Return: the paths of the raw texts, each in a note directory of its own
+  """
+  paths = []
+  for name, text in sorted(texts.items()):
+    (tmp_path / name).mkdir()
+    path = tmp_path / name / name
+    path.write_text(text)
+    paths.append(str(path))
+  return paths
+
+@pytest.fixture
+def notes(tmp_path):
+  """
+  Thirty unrelated notes, and near copies of the first ten, with two copies of the first
+  """
+  rng = random.Random(5)
+  texts = dict(("note%02d" % i, _note(rng)) for i in range(30))
+  for i in range(10):
+    texts["copy%02d" % i] = _copy(rng, texts["note%02d" % i])
+  texts["copy00b"] = _copy(rng, texts["note00"])
+  return _write(tmp_path, texts)
+
+
+def test_shingles():
+  assert dedup.MinHasher(shingle=2).shingles(raw_text.Document(SECTIONS)) == {"one two", "two three", "four five"}
+  assert dedup.MinHasher(shingle=2, sections=["B"]).shingles(raw_text.Document(SECTIONS)) == {"four five"}
+  # Without sections, the whole text, and shorter texts make one shingle
+  assert dedup.MinHasher(shingle=5).shingles(raw_text.Document("A b, c")) == {"a b , c"}
+
+def test_signatures_estimate_jaccard():
+  hasher = dedup.MinHasher(num_perm=256)
+  shingles = set("s%d" % i for i in range(300))
+  other_shingles = set("s%d" % i for i in range(100, 400))
+  signature = hasher.signature(shingles)
+  assert (signature.shape, signature.dtype.name) == ((256,), "uint32")
+  assert dedup.similarity(signature, hasher.signature(set(shingles))) == 1.0
+  assert abs(dedup.similarity(signature, hasher.signature(other_shingles)) - 0.5) < 0.1
+  assert dedup.similarity(signature, hasher.signature(set("t%d" % i for i in range(300)))) < 0.1
+  # The same seed makes the same hash functions
+  assert (dedup.MinHasher(num_perm=256).signature(shingles) == signature).all()
+  assert (hasher.signature(set()) == 2 ** 32 - 1).all()
+
+def test_recall(notes, tmp_path):
+  index = dedup.NoteIndex(bands=32, threshold=0.7)
+  assert index.update(dedup.find_raw_texts(str(tmp_path))) == notes
+  assert len(index) == 41
+  pairs = [(os.path.basename(path), os.path.basename(other)) for path, other, _ in index.pairs()]
+  expected = [("copy%02d" % i, "note%02d" % i) for i in range(10)] + [("copy00", "copy00b"), ("copy00b", "note00")]
+  assert sorted(pairs) == sorted(expected)
+  assert all(0.7 <= s < 1 for _, _, s in index.pairs())
+  clusters = [[os.path.basename(path) for path in cluster] for cluster in index.clusters()]
+  assert clusters[0] == ["copy00", "copy00b", "note00"]
+  assert len(clusters) == 10
+
+def test_query_and_check(notes, tmp_path):
+  index = dedup.NoteIndex(bands=32, threshold=0.7)
+  index.update(notes)
+  path = notes[0]
+  found = index.query(index.signatures[path][1])
+  assert found[0] == (path, 1.0)
+  assert [p for p, _ in index.query(index.signatures[path][1], exclude=path)] == [p for p, _ in index.check(path)]
+  new, = _write(tmp_path, {"new": open(path).read()})
+  assert index.check(new)[0][0] == path
+  assert len(index) == 41
+
+def test_update_only_reads_what_changed(notes, tmp_path):
+  index = dedup.NoteIndex()
+  index.update(notes)
+  assert index.update(notes) == []
+  with open(notes[0], "a") as f:
+    f.write(" more")
+  assert index.update(notes[:-1]) == [notes[0]]
+  assert notes[-1] not in index.signatures
+  assert all(notes[-1] not in bucket for buckets in index._buckets for bucket in buckets.values())
+
+  bad, = _write(tmp_path, {"bad": ""})
+  with open(bad, "wb") as f:
+    f.write(b"\xff\xfe\xff")
+  assert index.update(notes + [bad], jobs=2) == [bad, notes[-1]]
+  assert list(index.errors) == [bad]
+  with pytest.raises(IOError):
+    index.check(bad)
+  index.update(notes)
+  assert index.errors == {}
+
+def test_save_and_load(notes, tmp_path):
+  index = dedup.NoteIndex(bands=32, threshold=0.7)
+  index.update(notes)
+  index.save(str(tmp_path / "index"))
+  loaded = dedup.NoteIndex.load(str(tmp_path / "index"))
+  assert loaded.pairs() == index.pairs()
+  assert loaded.update(notes) == []
+
+def test_bands_divide_the_signature():
+  with pytest.raises(ValueError):
+    dedup.NoteIndex(bands=10)
+
+def test_find_raw_texts(tmp_path, write_note):
+  write_note([("Temporal-Relation.gold.completed.xml", annotation_xml())], text="text")
+  (tmp_path / "other").mkdir()
+  (tmp_path / "other" / "notes.txt").write_text("text")
+  text_path = str(tmp_path / "ID001_clinic_001" / "ID001_clinic_001")
+  assert dedup.find_raw_texts(str(tmp_path)) == [text_path]
+  assert dedup.find_raw_texts([str(tmp_path / "other" / "notes.txt"), str(tmp_path)]) == [
+    text_path, str(tmp_path / "other" / "notes.txt")]
+
+def test_annotation_overlap(write_note):
+  text = "Patient - 2020-01-01 had fever, ran and left."
+  first, _ = write_note([("Temporal-Relation.gold.completed.xml", annotation_xml()),
+                         ("Temporal-Relation.ann1.completed.xml", annotation_xml(ENTITIES[:1], []))], text=text)
+  second, = write_note([("Temporal-Relation.ann1.completed.xml", annotation_xml(ENTITIES[:2], []))],
+                       note="ID002_clinic_002", text=text)
+  write_note([], note="ID003_clinic_003", text=text)
+  first_text, second_text = [os.path.join(os.path.dirname(p), os.path.basename(os.path.dirname(p))) for p in (first, second)]
+  # The gold file of the first note is used
+  assert dedup.annotation_overlap(first_text, second_text) == {"entities": [4, 2], "shared": 2}
+  third_text = first_text.replace("ID001_clinic_001", "ID003_clinic_003")
+  assert dedup.annotation_overlap(first_text, third_text) is None
@@ -0,0 +1,63 @@
+from conftest import ENTITIES, RELATIONS
+
+def _renamed(annotations, old, new):
+  """
+  Return: annotations with every occurrence of the ID old replaced by new
+  """
+  def rename(value):
+    return new if value == old else value
+  return [tuple(rename(field) if isinstance(field, str) else [(name, rename(value)) for name, value in field]\
+                for field in ann) for ann in annotations]
+
+
+def test_identical_documents(make_document):
+  assert make_document().diff(make_document()) == []
+
+def test_changed_entity(make_document):
+  entities = list(ENTITIES)
+  entities[1] = ("2@e@ID001_clinic_001@gold", "10,20", "EVENT", [("Class", "TIME")])
+  edits = make_document().diff(make_document(entities))
+  assert edits == [{"op": "changed", "kind": "entity", "id": "2@e@ID001_clinic_001@gold",
+                    "other_id": "2@e@ID001_clinic_001@gold",
+                    "changes": {"type": ["TIMEX3", "EVENT"], "properties": {"Class": ["DATE", "TIME"]}}}]
+  doc = make_document()
+  assert doc.entities_dict["2@e@ID001_clinic_001@gold"].number_of_diffs(make_document(entities).entities_dict[
+    "2@e@ID001_clinic_001@gold"]) == 2
+
+def test_entities_matched_by_span_and_relations_by_entities(make_document):
+  # Another annotator's copy, with its own IDs for the same annotations
+  new_id = "7@e@ID001_clinic_001@ann2"
+  entities = _renamed(ENTITIES, "1@e@ID001_clinic_001@gold", new_id)
+  relations = _renamed(RELATIONS, "1@e@ID001_clinic_001@gold", new_id)
+  doc, other = make_document(), make_document(entities, relations)
+  assert doc.diff(other) == []
+  assert doc.diff(other, match_ids=False) == []
+
+def test_removed_and_added(make_document):
+  entities = ENTITIES[:3] + [("5@e@ID001_clinic_001@ann1", "50,55", "TIMEX3", [])]
+  relations = RELATIONS[:1] + [("4@r@ID001_clinic_001@ann1", "TLINK",
+                                [("Source", "3@e@ID001_clinic_001@ann1"), ("Type", "BEFORE"),
+                                 ("Target", "5@e@ID001_clinic_001@ann1")])]
+  edits = make_document().diff(make_document(entities, relations))
+  summary = sorted((edit["op"], edit["kind"], edit["id"], edit["other_id"]) for edit in edits)
+  assert summary == [
+    ("added", "entity", None, "5@e@ID001_clinic_001@ann1"),
+    ("added", "relation", None, "4@r@ID001_clinic_001@ann1"),
+    ("removed", "entity", "4@e@ID001_clinic_001@ann1", None),
+    ("removed", "relation", "2@r@ID001_clinic_001@gold", None),
+    ("removed", "relation", "3@r@ID001_clinic_001@gold", None),
+  ]
+
+def test_relation_pointing_elsewhere(make_document):
+  relations = [("1@r@ID001_clinic_001@gold", "TLINK",
+                [("Source", "1@e@ID001_clinic_001@gold"), ("Type", "CONTAINS"), ("Target", "4@e@ID001_clinic_001@ann1")])]
+  edits = make_document(relations=RELATIONS[:1]).diff(make_document(relations=relations))
+  assert sorted((edit["op"], edit["kind"]) for edit in edits) == [("added", "relation"), ("removed", "relation")]
+
+def test_changed_relation_property(make_document):
+  relations = list(RELATIONS)
+  relations[0] = ("1@r@ID001_clinic_001@gold", "TLINK",
+                  [("Source", "1@e@ID001_clinic_001@gold"), ("Type", "BEFORE"), ("Target", "2@e@ID001_clinic_001@gold")])
+  edits = make_document().diff(make_document(relations=relations))
+  assert edits == [{"op": "changed", "kind": "relation", "id": "1@r@ID001_clinic_001@gold",
+                    "other_id": "1@r@ID001_clinic_001@gold", "changes": {"properties": {"Type": ["CONTAINS", "BEFORE"]}}}]
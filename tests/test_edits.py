@@ -0,0 +1,135 @@
+import random
+
+import pytest
+
+from anafora4python import annotation_text, edits, raw_text
+
+# Lines up with the spans of the ENTITIES
+TEXT = "Patient - 2020-01-01 had fever, ran and left."
+
+def _spans(doc):
+  return [(ent.id.num, ent.spans) for ent in doc.get_entities()]
+
+
+def test_shifts():
+  log = edits.EditLog()
+  log.replace(10, 20, "[DATE]")
+  log.insert(25, "high ")
+  log.delete(30, 32)
+  assert len(log) == 3
+  assert log.apply_text(TEXT) == "Patient - [DATE] had high feverran and left."
+  # Before, after and between the edits
+  assert [log.map_span(span) for span in [(0, 7), (21, 24), (25, 30), (32, 35), (40, 44)]] == [
+    (0, 7), (17, 20), (26, 31), (31, 34), (39, 43)]
+
+def test_spans_inside_edits_are_stretched():
+  log = edits.EditLog()
+  log.replace(10, 20, "[DATE]")
+  assert log.map_span((10, 20)) == (10, 16)
+  assert log.map_span((5, 15)) == (5, 16)
+  assert log.map_span((15, 25)) == (10, 21)
+  assert log.map_span((12, 15)) == (10, 16)
+  assert log.map_spans([(0, 10), (20, 25)]) == [(0, 10), (16, 21)]
+
+def test_deleted_spans_are_empty():
+  log = edits.EditLog()
+  log.delete(10, 20)
+  assert log.map_span((10, 20)) == (10, 10)
+  assert log.map_span((12, 15)) == (10, 10)
+
+def test_insertions():
+  log = edits.EditLog()
+  log.insert(7, "A")
+  log.insert(7, "B")
+  log.replace(7, 10, "--")
+  assert log.apply_text(TEXT).startswith("PatientAB--2020")
+  # A span ending at the offset ends before what is inserted there, and one starting there starts after it
+  assert (log.map_span((0, 7)), log.map_span((7, 10))) == ((0, 7), (9, 11))
+  assert log.map_span((10, 20)) == (11, 21)
+
+def test_intersects():
+  log = edits.EditLog()
+  log.replace(10, 20, "[DATE]")
+  log.insert(42, "!")
+  assert [log.intersects(span) for span in [(0, 10), (0, 11), (19, 25), (20, 25), (40, 42), (40, 44), (42, 44)]] == [
+    False, True, True, False, False, True, False]
+
+def test_errors():
+  log = edits.EditLog()
+  with pytest.raises(ValueError):
+    log.replace(5, 3, "")
+  log.replace(0, 5, "")
+  log.replace(3, 8, "")
+  with pytest.raises(ValueError):
+    log.apply_text(TEXT)
+  log = edits.EditLog()
+  log.replace(40, 50, "")
+  with pytest.raises(ValueError):
+    log.apply_text(TEXT)
+
+def test_unedited_text_keeps_its_spans():
+  rng = random.Random(3)
+  text = "".join(rng.choice("abcdefgh ") for _ in range(500))
+  log = edits.EditLog()
+  offset = 0
+  edited = []
+  while offset < 480:
+    start = offset + rng.randrange(0, 10)
+    end = start + rng.choice([0, 0, 1, 3, 7])
+    log.replace(start, end, "X" * rng.randrange(0, 5))
+    edited.append((start, end))
+    offset = end + 1
+  new_text = log.apply_text(text)
+  for _ in range(300):
+    start = rng.randrange(500)
+    span = (start, min(500, start + rng.randrange(1, 20)))
+    if not log.intersects(span):
+      new_start, new_end = log.map_span(span)
+      assert new_text[new_start:new_end] == text[span[0]:span[1]]
+    else:
+      assert any(edit_start < span[1] and (edit_end > span[0] or edit_start > span[0]) for edit_start, edit_end in edited)
+
+def test_replace_matches():
+  raw = raw_text.Document(TEXT)
+  log = edits.EditLog()
+  assert log.replace_matches(raw, r"\d{4}-\d\d-\d\d", "[DATE]") == 1
+  assert log.replace_matches(raw, r"fever|left", lambda matched: matched.upper()) == 2
+  assert log.apply_text(TEXT) == "Patient - [DATE] had FEVER, ran and LEFT."
+
+def test_apply(make_document):
+  doc = make_document()
+  raw = raw_text.Document(TEXT)
+  log = edits.EditLog()
+  log.replace(10, 20, "[DATE]")
+  log.insert(42, "f")
+  flagged = log.apply(raw, [doc])
+  assert raw.text == "Patient - [DATE] had fever, ran and lefft."
+  assert _spans(doc) == [("1", [(0, 7)]), ("2", [(10, 16)]), ("3", [(21, 26)]), ("4", [(28, 31), (36, 41)])]
+  assert [(ent.id.num, span) for ent, span in flagged] == [("2", (10, 20)), ("4", (40, 44))]
+  # The index and the soup follow
+  assert [ent.id.num for ent in doc.get_annotations_by_span((20, 30))] == ["3"]
+  assert doc.entities_dict["4@e@ID001_clinic_001@ann1"].soup.span.string == "28,31;36,41"
+  assert doc.snapshot().get_entity("2@e@ID001_clinic_001@gold").spans == ((10, 16),)
+
+def test_apply_to_one_document(make_document):
+  doc = make_document()
+  log = edits.EditLog()
+  log.insert(0, "  ")
+  log.apply(raw_text.Document(TEXT), [doc], doc_id="ID002_clinic_002")
+  assert _spans(doc)[0] == ("1", [(0, 7)])
+  log.apply(raw_text.Document(TEXT), [doc], doc_id="ID001_clinic_001")
+  assert _spans(doc)[0] == ("1", [(2, 9)])
+
+def test_apply_edits(make_document):
+  ann_text = annotation_text.Document(make_document(), raw_text.Document(TEXT))
+  log = edits.EditLog()
+  log.replace(0, 7, "[NAME]")
+  assert [ent.id.num for ent, _ in ann_text.apply_edits(log)] == ["1"]
+  assert ann_text.get_entity_text(ann_text.annotation.entities_dict["3@e@ID001_clinic_001@ann1"]) == "fever"
+
+def test_mapped_documents_are_not_edited(tmp_path):
+  path = tmp_path / "text"
+  path.write_text(TEXT)
+  with raw_text.MappedDocument(str(path)) as mapped:
+    with pytest.raises(TypeError):
+      edits.EditLog().apply(mapped)
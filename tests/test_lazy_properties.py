@@ -0,0 +1,72 @@
+from anafora4python import annotation
+
+E1 = "1@e@ID001_clinic_001@gold"
+R1, R2, R3 = "1@r@ID001_clinic_001@gold", "2@r@ID001_clinic_001@gold", "3@r@ID001_clinic_001@gold"
+
+
+def test_properties_are_made_on_first_access(document):
+  annotations = document.get_entities() + document.get_all_relations()
+  document.query(prop=("DocTimeRel", "BEFORE"))
+  [rel.entity_ids() for rel in document.get_all_relations()]
+  assert not any("properties" in ann.__dict__ for ann in annotations)
+
+  ent = document.entities_dict[E1]
+  assert ent.property_items() == [("DocTimeRel", "BEFORE"), ("ContextualModality", "ACTUAL")]
+  assert "properties" not in ent.__dict__
+  assert [(prop.name, prop.value) for prop in ent.properties] == ent.property_items()
+  assert ent.properties is ent.properties
+
+def test_property_items_follow_property_objects(document):
+  ent = document.entities_dict[E1]
+  ent.properties[1].value = "HYPOTHETICAL"
+  assert ent.property_items() == [("DocTimeRel", "BEFORE"), ("ContextualModality", "HYPOTHETICAL")]
+  assert ent.get_property("ContextualModality") == "HYPOTHETICAL"
+
+def test_empty_properties_are_left_out(make_document):
+  doc = make_document([(E1, "0,7", "EVENT", [("DocTimeRel", ""), ("Polarity", "POS")])], [])
+  ent = doc.entities_dict[E1]
+  assert ent.property_items() == [("Polarity", "POS")]
+  assert [prop.name for prop in ent.properties] == ["Polarity"]
+
+def test_relation_classes(document):
+  assert [type(rel) for rel in document.get_all_relations()] == [annotation.Tlink, annotation.ContainsSubevent,
+                                                                 annotation.IdenticalChain]
+  assert [rel.id for rel in document.get_tlinks()] == [R1, R2]
+  assert [rel.id for rel in document.get_contains_subevent_tlinks()] == [R2]
+  assert [rel.subtype for rel in document.get_all_relations()] == ["CONTAINS", "CONTAINS-SUBEVENT", None]
+  assert document.relations_dict[R1].entity_ids() == [E1, "2@e@ID001_clinic_001@gold"]
+  assert document.relations_dict[R3].entity_ids() == [E1, "3@e@ID001_clinic_001@ann1"]
+
+def test_update_subtype(document):
+  tlink = document.relations_dict[R1]
+  assert tlink.subtype == "CONTAINS"
+  tlink.update_subtype("CONTAINS-SUBEVENT")
+  assert type(tlink) is annotation.ContainsSubevent
+  assert tlink.subtype == "CONTAINS-SUBEVENT"
+  assert [rel.id for rel in document.get_contains_subevent_tlinks()] == [R1, R2]
+
+  subevent = document.relations_dict[R2]
+  subevent.update_subtype("BEFORE")
+  assert type(subevent) is annotation.Tlink
+  assert subevent.subtype == "BEFORE"
+  assert [rel.id for rel in document.get_contains_subevent_tlinks()] == [R1]
+  assert [rel.id for rel in document.get_tlinks()] == [R1, R2]
+
+  document.update_soup()
+  xml = document.pp()
+  assert "<Type>CONTAINS</Type>" not in xml
+  assert "<Type>BEFORE</Type>" in xml
+
+def test_setting_the_type_property_updates_the_class(document):
+  tlink = document.relations_dict[R2]
+  [prop for prop in tlink.properties if prop.name == "Type"][0].value = "OVERLAP"
+  assert type(tlink) is annotation.Tlink
+  assert tlink.subtype == "OVERLAP"
+
+def test_read_only_documents(make_document):
+  doc = make_document(read_only=True)
+  tlink = doc.relations_dict[R1]
+  assert tlink.subtype == "CONTAINS"
+  tlink.update_subtype("CONTAINS-SUBEVENT")
+  assert [rel.id for rel in doc.get_contains_subevent_tlinks()] == [R1, R2]
+  assert doc.entities_dict[E1].property_items() == [("DocTimeRel", "BEFORE"), ("ContextualModality", "ACTUAL")]
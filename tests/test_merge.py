@@ -0,0 +1,105 @@
+from collections import Counter
+
+import pytest
+
+from conftest import ENTITIES, RELATIONS
+from anafora4python import merge
+
+E3_BEFORE = ("3@e@ID001_clinic_001@ann1", "25,30", "EVENT", [("DocTimeRel", "BEFORE"), ("ContextualModality", "HYPOTHETICAL")])
+E3_OVERLAP = ("3@e@ID001_clinic_001@ann1", "25,30", "EVENT", [("DocTimeRel", "OVERLAP"), ("ContextualModality", "HYPOTHETICAL")])
+R4 = ("4@r@ID001_clinic_001@ann1", "TLINK",
+      [("Source", "4@e@ID001_clinic_001@ann1"), ("Type", "BEFORE"), ("Target", "2@e@ID001_clinic_001@gold")])
+# Points at an entity its document does not have
+DANGLING = ("5@r@ID001_clinic_001@ann3", "TLINK",
+            [("Source", "9@e@ID001_clinic_001@ann3"), ("Type", "BEFORE"), ("Target", "2@e@ID001_clinic_001@gold")])
+
+@pytest.fixture
+def documents(make_document):
+  """
+  Three annotators: only the first has E4 and the relation R4 on it, the second lacks the Identical relation,
+  and each gives E3 a different DocTimeRel
+  """
+  return [make_document(ENTITIES, RELATIONS + [R4], "ID001_clinic_001.Temporal-Relation.ann1.completed.xml"),
+          make_document(ENTITIES[:2] + [E3_BEFORE], RELATIONS[:2], "ID001_clinic_001.Temporal-Relation.ann2.completed.xml"),
+          make_document(ENTITIES[:2] + [E3_OVERLAP], RELATIONS + [DANGLING],
+                        "ID001_clinic_001.Temporal-Relation.ann3.completed.xml")]
+
+def _entities(doc):
+  return [(ent.id, ent.span_string, ent.type, ent.property_items()) for ent in doc.get_entities()]
+
+def _relations(doc):
+  return [(rel.id, rel.type, rel.property_items()) for rel in doc.get_all_relations()]
+
+def _adjudication(n, kind="e"):
+  return "%d@%s@ID001_clinic_001@adjudication" % (n, kind)
+
+
+def test_votes():
+  assert merge.majority_vote(Counter({"A": 2, "B": 1}), 3) == "A"
+  assert merge.majority_vote(Counter({"A": 2, "B": 2}), 4) is None
+  assert merge.majority_vote(Counter(), 3) is None
+  assert merge.unanimous_vote(Counter({"A": 3}), 3) == "A"
+  assert merge.unanimous_vote(Counter({"A": 2}), 3) is None
+  assert merge.unanimous_vote(Counter({"A": 2, "B": 1}), 3) is None
+  assert merge.plurality_vote(Counter({"A": 2, "B": 1, "C": 1}), 5) == "A"
+  assert merge.plurality_vote(Counter({"A": 1, "B": 1}), 2) is None
+  assert merge.plurality_vote(Counter({"A": 1}), 4) == "A"
+
+def test_majority_merge(documents):
+  merged, conflicts = merge.merge_documents(documents)
+  assert merged.filename == documents[0].filename
+  assert _entities(merged) == [
+    (_adjudication(1), "0,7", "EVENT", [("DocTimeRel", "BEFORE"), ("ContextualModality", "ACTUAL")]),
+    (_adjudication(2), "10,20", "TIMEX3", [("Class", "DATE")]),
+    # A three-way tie keeps the first annotator's value
+    (_adjudication(3), "25,30", "EVENT", [("DocTimeRel", "AFTER"), ("ContextualModality", "HYPOTHETICAL")]),
+  ]
+  assert _relations(merged) == [
+    (_adjudication(1, "r"), "TLINK", [("Source", _adjudication(1)), ("Type", "CONTAINS"), ("Target", _adjudication(2))]),
+    (_adjudication(2, "r"), "TLINK", [("Source", _adjudication(3)), ("Type", "CONTAINS-SUBEVENT"),
+                                      ("Target", _adjudication(1))]),
+    (_adjudication(3, "r"), "Identical", [("FirstInstance", _adjudication(1)),
+                                          ("Coreferring_String", _adjudication(3))]),
+  ]
+  assert conflicts == [
+    {"kind": "entity", "id": _adjudication(3), "field": "DocTimeRel", "votes": {"AFTER": 1, "BEFORE": 1, "OVERLAP": 1}},
+    {"kind": "relation", "id": None, "field": "dropped", "reason": "entity not found", "votes": {True: 1, False: 2},
+     "sources": [(2, "5@r@ID001_clinic_001@ann3")]},
+    {"kind": "relation", "id": None, "field": "dropped", "reason": "entity voted out", "votes": {True: 1, False: 2},
+     "sources": [(0, "4@r@ID001_clinic_001@ann1")]},
+  ]
+
+def test_unanimous_merge_keeps_unresolved(documents):
+  merged, conflicts = merge.merge_documents(documents, presence_vote=merge.unanimous_vote)
+  assert [ent.span_string for ent in merged.get_entities()] == ["0,7", "10,20", "25,30", "32,35;40,44"]
+  assert len(merged.get_all_relations()) == 4
+  presence = [(conflict["kind"], conflict["id"], conflict["votes"]) for conflict in conflicts
+              if conflict["field"] == "presence"]
+  assert presence == [("entity", _adjudication(4), {True: 1, False: 2}),
+                      ("relation", _adjudication(3, "r"), {True: 2, False: 1}),
+                      ("relation", _adjudication(4, "r"), {True: 1, False: 2})]
+
+def test_type_vote(make_document):
+  event = [("2@e@ID001_clinic_001@gold", "10,20", "EVENT", [])]
+  documents = [make_document(ENTITIES[1:2], []), make_document(event, []), make_document(event, [])]
+  merged, conflicts = merge.merge_documents(documents, annotator="adj")
+  assert [(ent.id, ent.type) for ent in merged.get_entities()] == [("1@e@ID001_clinic_001@adj", "EVENT")]
+  # Only one of the three annotators gave the property, so it is not a majority
+  assert conflicts == [{"kind": "entity", "id": "1@e@ID001_clinic_001@adj", "field": "Class", "votes": {"DATE": 1}}]
+  merged, conflicts = merge.merge_documents(documents[:2], type_vote=merge.plurality_vote)
+  assert conflicts == [{"kind": "entity", "id": _adjudication(1), "field": "type", "votes": {"TIMEX3": 1, "EVENT": 1}},
+                       {"kind": "entity", "id": _adjudication(1), "field": "Class", "votes": {"DATE": 1}}]
+
+def test_align_entities(documents):
+  slots = merge.align_entities(documents)
+  assert [(doc_id, sorted(slot)) for doc_id, slot in slots] == [
+    ("ID001_clinic_001", [0, 1, 2]), ("ID001_clinic_001", [0, 1, 2]), ("ID001_clinic_001", [0, 1, 2]),
+    ("ID001_clinic_001", [0])]
+
+def test_align_entities_same_span(make_document):
+  # Two entities on one span are aligned by type
+  entities = [("1@e@ID001_clinic_001@gold", "0,7", "TIMEX3", []), ("2@e@ID001_clinic_001@gold", "0,7", "EVENT", [])]
+  documents = [make_document(entities, []), make_document(entities[1:], [])]
+  slots = merge.align_entities(documents)
+  assert sorted(sorted((i, ent.type) for i, ent in slot.items()) for _, slot in slots) == [
+    [(0, "EVENT"), (1, "EVENT")], [(0, "TIMEX3")]]
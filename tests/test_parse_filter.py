@@ -0,0 +1,54 @@
+import pytest
+
+from conftest import annotation_xml
+from anafora4python import corpus
+
+@pytest.fixture
+def path(write_note):
+  path, = write_note([("Temporal-Relation.gold.completed.xml", annotation_xml())])
+  return path
+
+def _load(path, **kwargs):
+  return corpus.load_annotation(path, parse_filter=corpus.ParseFilter(**kwargs))
+
+
+def test_keeps_all():
+  assert corpus.ParseFilter().keeps_all()
+  assert not corpus.ParseFilter(relation_types=()).keeps_all()
+  assert not corpus.ParseFilter(spans_only=True).keeps_all()
+
+def test_unfiltered_load_has_no_filter(path):
+  doc = corpus.load_annotation(path, parse_filter=corpus.ParseFilter())
+  assert doc.parse_filter is None
+  assert len(doc.get_entities()) == 4
+
+def test_types(path):
+  doc = _load(path, entity_types=["TIMEX3"], relation_types=["TLINK"])
+  assert [ent.id for ent in doc.get_entities()] == ["2@e@ID001_clinic_001@gold"]
+  assert sorted(doc.relations_dict) == ["1@r@ID001_clinic_001@gold", "2@r@ID001_clinic_001@gold"]
+  # Relations keep their arguments, pointing at entities that were left out
+  assert doc.dangling_entity_ids() == {"1@e@ID001_clinic_001@gold": {"1@r@ID001_clinic_001@gold", "2@r@ID001_clinic_001@gold"},
+                                       "3@e@ID001_clinic_001@ann1": {"2@r@ID001_clinic_001@gold"}}
+
+def test_properties(path):
+  doc = _load(path, relation_types=(), properties=["DocTimeRel"])
+  assert doc.relations_dict == {}
+  assert [ent.property_items() for ent in doc.get_entities()] == [
+    [("DocTimeRel", "BEFORE")], [], [("DocTimeRel", "AFTER")], [("DocTimeRel", "BEFORE")]]
+  doc = _load(path, properties=())
+  # Entity IDs are always kept
+  assert doc.relations_dict["1@r@ID001_clinic_001@gold"].property_items() == [
+    ("Source", "1@e@ID001_clinic_001@gold"), ("Target", "2@e@ID001_clinic_001@gold")]
+
+def test_spans_only(path):
+  doc = _load(path, spans_only=True)
+  assert doc.relations_dict == {}
+  assert [(ent.id, ent.spans, ent.type, ent.property_items()) for ent in doc.get_entities()][3] == (
+    "4@e@ID001_clinic_001@ann1", [(32, 35), (40, 44)], "", [])
+  assert doc.status == "completed"
+
+def test_filtered_documents_are_not_written(path, tmp_path):
+  doc = _load(path, relation_types=())
+  assert "relation_types=frozenset()" in repr(doc.parse_filter)
+  with pytest.raises(ValueError):
+    corpus.write_document(doc, str(tmp_path / "out.xml"))
@@ -0,0 +1,131 @@
+from bs4 import BeautifulSoup as soup
+
+from anafora4python import annotation
+
+def _ids(entities):
+  return [ent.id for ent in entities]
+
+def _check_indexes(doc):
+  """
+  Every index agrees with a scan of the entities
+  """
+  for ent in doc.get_entities():
+    assert ent in doc.query(type=ent.type)
+    assert ent in doc.query(parentsType=ent.parentsType)
+    for name, value in ent.property_items():
+      assert ent in doc.query(prop=(name, value))
+    for span in ent.spans:
+      assert ent in doc.query(span_within=span)
+  assert sorted(doc.entity_types()) == sorted(set(ent.type for ent in doc.get_entities()))
+  for span_index in doc._span_index.values():
+    assert span_index == sorted(span_index)
+
+
+def test_query_filters(document):
+  assert _ids(document.query(type="EVENT")) == ["1@e@ID001_clinic_001@gold", "3@e@ID001_clinic_001@ann1",
+                                                "4@e@ID001_clinic_001@ann1"]
+  assert _ids(document.query(type=["TIMEX3", "EVENT"], annotator="gold")) == ["1@e@ID001_clinic_001@gold",
+                                                                             "2@e@ID001_clinic_001@gold"]
+  assert _ids(document.query(prop=("DocTimeRel", "BEFORE"))) == ["1@e@ID001_clinic_001@gold", "4@e@ID001_clinic_001@ann1"]
+  assert _ids(document.query(prop=["DocTimeRel", ("ContextualModality", "HYPOTHETICAL")])) == ["3@e@ID001_clinic_001@ann1"]
+  assert _ids(document.query(preannotated=False)) == ["3@e@ID001_clinic_001@ann1", "4@e@ID001_clinic_001@ann1"]
+  assert _ids(document.query(doc_id="ID001_clinic_001", type="TIMEX3")) == ["2@e@ID001_clinic_001@gold"]
+  assert document.query(type="EVENT", prop="Class") == []
+  assert document.query(doc_id="ID999") == []
+  assert document.query() == document.get_entities()
+
+def test_query_span_within(document):
+  assert _ids(document.query(span_within=(0, 20))) == ["1@e@ID001_clinic_001@gold", "2@e@ID001_clinic_001@gold"]
+  assert _ids(document.query(span_within=(5, 20))) == ["2@e@ID001_clinic_001@gold"]
+  # A disjoint entity matches with any of its spans
+  assert _ids(document.query(span_within=(38, 50))) == ["4@e@ID001_clinic_001@ann1"]
+  assert _ids(document.get_annotations_by_span((24, 31), "ID001_clinic_001")) == ["3@e@ID001_clinic_001@ann1"]
+  assert document.query(span_within=(21, 24)) == []
+
+def test_index_helpers(document):
+  assert sorted(document.entity_types()) == ["EVENT", "TIMEX3"]
+  assert sorted(document.property_names()) == ["Class", "ContextualModality", "DocTimeRel"]
+  assert _ids(document.get_preannotated_entities()) == ["1@e@ID001_clinic_001@gold", "2@e@ID001_clinic_001@gold"]
+  assert document.doc_ids() == ["ID001_clinic_001"]
+  _check_indexes(document)
+
+def test_span_index_sorted_at_load(make_document):
+  entities = [("%d@e@ID001_clinic_001@gold" % (i + 1), "%d,%d" % (100 - i, 101 - i), "EVENT", []) for i in range(50)]
+  doc = make_document(entities, [])
+  span_index = doc._span_index["ID001_clinic_001"]
+  assert span_index == sorted(span_index)
+  assert len(span_index) == 50
+  assert _ids(doc.query(span_within=(60, 70))) == ["%d@e@ID001_clinic_001@gold" % i for i in range(32, 42)]
+
+def test_setting_entity_fields_reindexes(document):
+  ent = document.entities_dict["1@e@ID001_clinic_001@gold"]
+  ent.type = "ZZZ"
+  assert document.query(type="ZZZ") == [ent]
+  assert ent not in document.query(type="EVENT")
+  assert sorted(document.entity_types()) == ["EVENT", "TIMEX3", "ZZZ"]
+
+  ent.parentsType = "Other"
+  assert document.query(parentsType="Other") == [ent]
+
+  ent.spans = [(50, 55)]
+  assert ent.span_string == "50,55"
+  assert document.query(span_within=(49, 56)) == [ent]
+  assert ent not in document.query(span_within=(0, 7))
+
+  ent.properties[0].value = "OVERLAP"
+  assert document.query(prop=("DocTimeRel", "OVERLAP")) == [ent]
+  assert ent not in document.query(prop=("DocTimeRel", "BEFORE"))
+  _check_indexes(document)
+
+def test_edits_reach_the_soup(document):
+  ent = document.entities_dict["2@e@ID001_clinic_001@gold"]
+  ent.type = "SECTIONTIME"
+  ent.properties[0].value = "TIME"
+  document.update_soup()
+  xml = document.pp()
+  assert "<type>SECTIONTIME</type>" in xml
+  assert "<Class>TIME</Class>" in xml
+
+def test_setting_relation_property_reindexes(document):
+  rel = document.relations_dict["1@r@ID001_clinic_001@gold"]
+  target = [prop for prop in rel.properties if prop.name == "Target"][0]
+  target.value = "4@e@ID001_clinic_001@ann1"
+  assert rel in document.get_relations_with_entity("4@e@ID001_clinic_001@ann1")
+  assert rel not in document.get_relations_with_entity("2@e@ID001_clinic_001@gold")
+  assert rel.get_target() is document.entities_dict["4@e@ID001_clinic_001@ann1"]
+
+def test_add_and_remove_keep_indexes(document):
+  document.add_entity("ann2", (60, 65), "TIMEX3", "TemporalEntities")
+  added = document.query(annotator="ann2")
+  assert len(added) == 1
+  assert added[0] in document.query(type="TIMEX3", span_within=(60, 65))
+  _check_indexes(document)
+
+  document.remove_entity(document.entities_dict["2@e@ID001_clinic_001@gold"])
+  assert _ids(document.query(type="TIMEX3")) == _ids(added)
+  assert document.query(prop="Class") == []
+  assert document.query(span_within=(10, 20)) == []
+  _check_indexes(document)
+
+def test_query_read_only(make_document):
+  doc = make_document(read_only=True)
+  assert _ids(doc.query(type="EVENT", annotator="ann1")) == ["3@e@ID001_clinic_001@ann1", "4@e@ID001_clinic_001@ann1"]
+  doc.entities_dict["3@e@ID001_clinic_001@ann1"].type = "TIMEX3"
+  assert len(doc.query(type="TIMEX3")) == 2
+  _check_indexes(doc)
+
+def test_entity_without_document_has_no_index():
+  ent = annotation.Entity(soup("<entity><id>1@e@X@gold</id><span>1,2</span><type>EVENT</type></entity>", "xml").entity)
+  ent.type = "TIMEX3"
+  ent.spans = [(3, 4)]
+  assert (ent.type, ent.span_string) == ("TIMEX3", "3,4")
+
+def test_property_reads_follow_edits(make_document):
+  for read_only in (False, True):
+    doc = make_document(read_only=read_only)
+    rel = doc.relations_dict["1@r@ID001_clinic_001@gold"]
+    [prop for prop in rel.properties if prop.name == "Target"][0].value = "3@e@ID001_clinic_001@ann1"
+    assert rel.get_property("Target") == "3@e@ID001_clinic_001@ann1"
+    assert rel.get_target() is doc.entities_dict["3@e@ID001_clinic_001@ann1"]
+    doc.update_soup()
+    assert "<Target>3@e@ID001_clinic_001@ann1</Target>" in doc.pp()
@@ -0,0 +1,138 @@
+import re
+
+import pytest
+
+from anafora4python import raw_text
+
+TEXT = "Pt. Müller, 64 y/o.\r\nDx: café-au-lait spots 日本\rno fever\r\n\r\nPlan: f/u"
+
+@pytest.fixture
+def text_path(tmp_path):
+  path = tmp_path / "ID001_clinic_001"
+  path.write_bytes(TEXT.encode("utf-8"))
+  return str(path)
+
+def _read(path):
+  with open(path, encoding="utf-8") as f:
+    return raw_text.Document(f.read())
+
+
+@pytest.mark.parametrize("checkpoint", [1, 3, 16, 65536])
+def test_mapped_document_matches_document(text_path, checkpoint):
+  doc = _read(text_path)
+  with raw_text.MappedDocument(text_path, checkpoint=checkpoint) as mapped:
+    assert len(mapped) == len(doc.text)
+    assert mapped.text == doc.text
+    for start in range(len(doc.text) + 1):
+      for end in range(start, len(doc.text) + 1, 3):
+        assert mapped.find_string_by_span((start, end)) == doc.text[start:end]
+
+def test_mapped_offsets_round_trip(text_path):
+  with raw_text.MappedDocument(text_path, checkpoint=4, translate_newlines=False) as mapped:
+    for char_offset in range(len(mapped) + 1):
+      assert mapped.byte_to_char(mapped.char_to_byte(char_offset)) == char_offset
+    assert mapped.char_to_byte(len(mapped)) == len(TEXT.encode("utf-8"))
+
+def test_mapped_newlines(text_path):
+  with raw_text.MappedDocument(text_path) as mapped:
+    assert "\r" not in mapped.text
+    assert mapped.find_spans_by_string("Plan") == _read(text_path).find_spans_by_string("Plan")
+  with raw_text.MappedDocument(text_path, translate_newlines=False) as mapped:
+    assert mapped.text == TEXT
+    assert mapped.find_spans_by_string("Plan") == [(TEXT.index("Plan"), TEXT.index("Plan") + 4)]
+
+@pytest.mark.parametrize("pattern", [r"\w+", r"\b\w", r"[^\W\d]+", r"(?m)^\w+", r"(?<=é)-\w+", r"\s+", "日本", r"ü.*?r"])
+def test_mapped_regexes_match_document(text_path, pattern):
+  doc = _read(text_path)
+  expected = [(m.start(), m.end(), m.group(0)) for m in re.finditer(pattern, doc.text)]
+
+  class SmallWindows(raw_text.MappedDocument):
+    CONTEXT = 2
+    LOOKAHEAD = 5
+
+  for cls in (raw_text.MappedDocument, SmallWindows):
+    with cls(text_path, checkpoint=3) as mapped:
+      assert list(mapped._finditer(pattern)) == expected
+      assert list(mapped._finditer(re.compile(pattern))) == expected
+
+def test_mapped_match_longer_than_window(tmp_path):
+  path = tmp_path / "long"
+  path.write_text("a " + "x" * 5000 + " b")
+
+  class SmallWindows(raw_text.MappedDocument):
+    LOOKAHEAD = 10
+
+  with SmallWindows(str(path), checkpoint=8) as mapped:
+    assert mapped.find_spans_by_string(r"x+") == [(2, 5002)]
+
+def test_empty_mapped_document(tmp_path):
+  path = tmp_path / "empty"
+  path.write_text("")
+  with raw_text.MappedDocument(str(path)) as mapped:
+    assert len(mapped) == 0
+    assert mapped.text == ""
+    assert mapped.find_spans_by_string("a") == []
+
+
+def _overlapping_tokens(doc, span):
+  """
+  The tokens overlapping span, by a scan of them all
+  """
+  indexes = [i for i, (start, end) in enumerate(zip(doc.token_starts, doc.token_ends))
+             if start < span[1] and end > span[0]]
+  return (indexes[0], indexes[-1] + 1) if indexes else None
+
+def test_tokenize():
+  doc = raw_text.Document(TEXT)
+  assert doc.tokenize() == len(doc.tokens)
+  assert doc.tokens[:8] == ["Pt", ".", "Müller", ",", "64", "y", "/", "o"]
+  assert doc.tokens[-5:] == ["Plan", ":", "f", "/", "u"]
+  assert all(TEXT[start:end] == token for start, end, token in zip(doc.token_starts, doc.token_ends, doc.tokens))
+
+def test_char_to_token():
+  doc = raw_text.Document(TEXT)
+  doc.tokenize()
+  for offset in range(len(TEXT)):
+    expected = [i for i, (start, end) in enumerate(zip(doc.token_starts, doc.token_ends)) if start <= offset < end]
+    assert doc.char_to_token(offset) == (expected[0] if expected else None)
+  assert doc.char_to_token(-1) is None
+  assert doc.char_to_token(len(TEXT)) is None
+
+def test_span_to_tokens():
+  # Tokenizes on first use
+  doc = raw_text.Document(TEXT)
+  assert doc.span_to_tokens((0, 2)) == (0, 1)
+  for start in range(len(TEXT)):
+    for end in range(start + 1, len(TEXT) + 1):
+      assert doc.span_to_tokens((start, end)) == _overlapping_tokens(doc, (start, end))
+  assert doc.span_to_tokens(("0", "6")) == (0, 3)
+  # Offsets past the text are clipped
+  assert doc.span_to_tokens((len(TEXT) - 1, len(TEXT) + 10)) == (len(doc.tokens) - 1, len(doc.tokens))
+  # The second span is the space after "Pt."
+  assert doc.spans_to_tokens([(0, 2), (3, 4), (4, 10)]) == [(0, 1), (2, 3)]
+
+def test_custom_tokenizer():
+  doc = raw_text.Document("a  bc d")
+  assert doc.tokenize(raw_text.regex_tokenizer(r"\S+")) == 3
+  assert doc.tokens == ["a", "bc", "d"]
+  assert doc.span_to_tokens((1, 3)) is None
+  assert doc.span_to_tokens((1, 4)) == (1, 2)
+
+  class WhitespaceDocument(raw_text.Document):
+    tokenizer = staticmethod(raw_text.regex_tokenizer(r"\S+"))
+
+  assert WhitespaceDocument(TEXT).span_to_tokens((0, 11)) == (0, 2)
+
+def test_tokenize_empty():
+  doc = raw_text.Document("")
+  assert doc.tokenize() == 0
+  assert doc.char_to_token(0) is None
+  assert doc.span_to_tokens((0, 0)) is None
+
+def test_mapped_tokens_match_document(text_path):
+  doc = _read(text_path)
+  doc.tokenize()
+  with raw_text.MappedDocument(text_path, checkpoint=3) as mapped:
+    assert mapped.tokenize() == len(doc.tokens)
+    assert mapped.tokens == doc.tokens
+    assert mapped.span_to_tokens((5, 30)) == doc.span_to_tokens((5, 30))
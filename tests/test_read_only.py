@@ -0,0 +1,70 @@
+from conftest import annotation_xml
+from anafora4python import corpus
+
+E1, E2 = "1@e@ID001_clinic_001@gold", "2@e@ID001_clinic_001@gold"
+R1, R3 = "1@r@ID001_clinic_001@gold", "3@r@ID001_clinic_001@gold"
+
+def _released(doc):
+  return doc._soup is None and all(ann._soup is None for ann in doc.get_entities() + doc.get_all_relations())
+
+def _contents(doc):
+  return ([(ent.id, ent.span_string, ent.type, ent.parentsType, ent.property_items()) for ent in doc.get_entities()],
+          [(rel.id, rel.type, rel.parentsType, rel.property_items()) for rel in doc.get_all_relations()])
+
+
+def test_read_only_reads_like_a_document(make_document):
+  doc, read_only = make_document(), make_document(read_only=True)
+  assert _released(read_only)
+  assert _contents(read_only) == _contents(doc)
+  assert (read_only.status, read_only.savetime) == (doc.status, doc.savetime)
+  rel = read_only.relations_dict[R1]
+  assert (rel.get_source().id, rel.get_target().id) == (E1, E2)
+  assert read_only.relations_dict[R3].get_first_instance().id == E1
+  assert [ent.id for ent in read_only.query(type="EVENT", prop=("DocTimeRel", "BEFORE"))] == [
+    E1, "4@e@ID001_clinic_001@ann1"]
+  assert read_only.entities_dict[E1].get_property("ContextualModality") == "ACTUAL"
+  # None of that needed the tree
+  assert _released(read_only)
+
+def test_pp_rebuilds_the_same_xml(make_document):
+  read_only = make_document(read_only=True)
+  assert read_only.pp() == make_document().pp()
+  assert read_only._soup is not None
+
+def test_annotation_soup_restores_the_document(make_document):
+  doc = make_document(read_only=True)
+  ent = doc.entities_dict[E1]
+  assert ent.soup.id.get_text() == E1
+  assert doc._soup is not None
+  assert not _released(doc)
+
+def test_release_keeps_edits(document):
+  ent = document.entities_dict[E1]
+  ent.properties[0].value = "AFTER"
+  document.release_soup()
+  assert _released(document)
+  assert ent.property_items() == [("DocTimeRel", "AFTER"), ("ContextualModality", "ACTUAL")]
+  # And edits made while released
+  ent.type = "TIMEX3"
+  document.relations_dict[R1].update_subtype("BEFORE")
+  document.restore_soup()
+  xml = document.pp()
+  assert "<DocTimeRel>AFTER</DocTimeRel>" in xml
+  assert "<type>TIMEX3</type>" in xml
+  assert "<Type>BEFORE</Type>" in xml
+  document.release_soup()
+  document.release_soup()
+  assert _released(document)
+
+def test_changes_to_a_read_only_document(make_document):
+  doc = make_document(read_only=True)
+  doc.add_entity("ann2", (50, 55), "TIMEX3", "TemporalEntities")
+  assert doc._soup is not None
+  assert len(doc.get_entities()) == 5
+  assert "<span>50,55</span>" in doc.pp()
+
+def test_load_annotation_read_only(write_note):
+  path, = write_note([("Temporal-Relation.gold.completed.xml", annotation_xml())])
+  doc = corpus.load_annotation(path, read_only=True)
+  assert _released(doc)
+  assert _contents(doc) == _contents(corpus.load_annotation(path))
@@ -0,0 +1,74 @@
+import pytest
+
+from conftest import ENTITIES, annotation_xml
+from anafora4python import annotation, corpus, registry
+
+GOLD = "Temporal-Relation.gold.completed.xml"
+OTHER_ENTITIES = [("5@e@ID002_clinic_002@gold", "0,7", "EVENT", [])]
+# Chained across the notes
+OTHER_RELATIONS = [("1@r@ID002_clinic_002@gold", "Identical",
+                    [("FirstInstance", "1@e@ID001_clinic_001@gold"), ("Coreferring_String", "5@e@ID002_clinic_002@gold")])]
+
+@pytest.fixture
+def paths(tmp_path, write_note):
+  paths = write_note([(GOLD, annotation_xml())])
+  paths += write_note([(GOLD, annotation_xml(OTHER_ENTITIES, OTHER_RELATIONS))], note="ID002_clinic_002")
+  return paths
+
+
+def test_reads_ids_without_loading(paths, tmp_path):
+  entities = registry.EntityRegistry(str(tmp_path))
+  assert len(entities) == 5
+  assert "5@e@ID002_clinic_002@gold" in entities
+  assert "9@e@ID002_clinic_002@gold" not in entities
+  assert (entities.loads, entities.resident(), entities.errors) == (0, [], {})
+  handle = entities.handle("5@e@ID002_clinic_002@gold")
+  assert (handle.id, handle.path) == ("5@e@ID002_clinic_002@gold", paths[1])
+  assert entities.handle("9@e@ID002_clinic_002@gold") is None
+  assert handle.resolve().spans == [(0, 7)]
+  assert entities.loads == 1
+
+def test_relations_resolve_through_the_registry(paths):
+  entities = registry.EntityRegistry(paths)
+  doc = entities.document(paths[1])
+  assert doc.registry is entities
+  chain = doc.get_identical_chains()[0]
+  first = chain.get_first_instance()
+  assert (first.id, first.type) == ("1@e@ID001_clinic_001@gold", "EVENT")
+  assert first is entities.document(paths[0]).entities_dict["1@e@ID001_clinic_001@gold"]
+  assert entities.loads == 2
+  assert entities.get("9@e@ID002_clinic_002@gold") is None
+
+  # Without a registry the entity is not found
+  alone = corpus.load_annotation(paths[1])
+  assert alone.get_identical_chains()[0].get_first_instance() is None
+  assert entities.attach(alone).get_identical_chains()[0].get_first_instance() is first
+
+def test_least_recently_used_documents_are_dropped(paths):
+  entities = registry.EntityRegistry(paths, max_documents=1)
+  first = entities.get("1@e@ID001_clinic_001@gold")
+  assert entities.resident() == [paths[0]]
+  entities.get("5@e@ID002_clinic_002@gold")
+  assert entities.resident() == [paths[1]]
+  assert entities.get("1@e@ID001_clinic_001@gold") is not first
+  assert entities.loads == 3
+  entities.get("2@e@ID001_clinic_001@gold")
+  assert entities.loads == 3
+  entities.clear()
+  assert (entities.resident(), len(entities)) == ([], 5)
+
+def test_first_file_added_wins(paths, write_note):
+  copy, = write_note([("Temporal-Relation.ann1.completed.xml", annotation_xml(ENTITIES[:1], []))], note="ID003_clinic_003")
+  entities = registry.EntityRegistry()
+  assert entities.add_files(paths + [copy]) == 5
+  assert entities.handle("1@e@ID001_clinic_001@gold").path == paths[0]
+  assert entities.add_files([str(copy) + ".missing"], jobs=2) == 0
+  assert list(entities.errors) == [str(copy) + ".missing"]
+
+def test_loading_options(paths):
+  ids = annotation.IDTable()
+  entities = registry.EntityRegistry(paths, read_only=False, ids=ids)
+  doc = entities.document(paths[0])
+  assert doc._soup is not None
+  assert doc.entities_dict["1@e@ID001_clinic_001@gold"].id is ids("1@e@ID001_clinic_001@gold")
+  assert registry.EntityRegistry(paths).document(paths[0])._soup is None
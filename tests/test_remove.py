@@ -0,0 +1,64 @@
+import pytest
+
+E1, E2, E3, E4 = ("1@e@ID001_clinic_001@gold", "2@e@ID001_clinic_001@gold",
+                  "3@e@ID001_clinic_001@ann1", "4@e@ID001_clinic_001@ann1")
+R1, R2, R3 = "1@r@ID001_clinic_001@gold", "2@r@ID001_clinic_001@gold", "3@r@ID001_clinic_001@gold"
+
+def _xml(doc):
+  doc.update_soup()
+  return doc.pp()
+
+
+def test_remove_without_cascade(document):
+  removed = document.remove_annotations([document.entities_dict[E2], document.entities_dict[E4]])
+  assert len(removed) == 2
+  assert sorted(document.entities_dict) == [E1, E3]
+  assert document.query(type="TIMEX3") == []
+  assert document.query(span_within=(30, 50)) == []
+  # The relation pointing at E2 is kept, dangling
+  assert R1 in document.relations_dict
+  assert document.dangling_entity_ids() == {E2: {R1}}
+  xml = _xml(document)
+  assert E4 not in xml
+  assert "<id>%s</id>" % E2 not in xml
+
+def test_remove_cascade_remove(document):
+  document.remove_annotations([document.entities_dict[E1]], cascade="remove")
+  assert sorted(document.relations_dict) == []
+  assert document.get_relations_with_entity(E3) == []
+  assert document.dangling_entity_ids() == {}
+  assert "<relation>" not in _xml(document)
+
+def test_remove_cascade_prune(document):
+  document.remove_annotations([document.entities_dict[E2]], cascade="prune")
+  rel = document.relations_dict[R1]
+  assert rel.entity_ids() == [E1]
+  assert rel.get_property("Target") == ""
+  assert [r.id for r in document.get_relations_with_entity(E1) if r.id == R1] == [R1]
+  assert document.dangling_entity_ids() == {}
+  assert "<Target>%s</Target>" % E2 not in _xml(document)
+
+def test_remove_relations_and_entities_together(document):
+  document.remove_annotations([document.relations_dict[R2], document.entities_dict[E3], document.relations_dict[R3]])
+  assert sorted(document.relations_dict) == [R1]
+  assert document.get_relations_with_entity(E3) == []
+  assert [r.id for r in document.get_relations_with_entity(E1)] == [R1]
+
+def test_remove_through_annotations(document):
+  document.relations_dict[R1].remove()
+  assert R1 not in document.relations_dict
+  document.entities_dict[E4].remove()
+  assert E4 not in document.entities_dict
+  assert document.query(annotator="ann1") == [document.entities_dict[E3]]
+
+def test_remove_read_only(make_document):
+  doc = make_document(read_only=True)
+  doc.remove_annotations([doc.entities_dict[E1]], cascade="remove")
+  assert sorted(doc.entities_dict) == [E2, E3, E4]
+  assert doc.relations_dict == {}
+  assert E1 not in _xml(doc)
+
+def test_remove_bad_cascade(document):
+  with pytest.raises(ValueError):
+    document.remove_annotations([document.entities_dict[E1]], cascade="all")
+  assert E1 in document.entities_dict
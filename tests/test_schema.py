@@ -0,0 +1,113 @@
+import pytest
+from bs4 import BeautifulSoup as soup
+
+from conftest import ENTITIES, RELATIONS, annotation_xml
+from anafora4python import schema
+
+SCHEMA = """<?xml version="1.0" encoding="UTF-8"?>
+<schema>
+<defaultattribute><required>True</required></defaultattribute>
+<definition>
+  <entities type="TemporalEntities">
+    <entity type="EVENT">
+      <properties>
+        <property type="DocTimeRel" input="choice">BEFORE,OVERLAP,AFTER</property>
+        <property type="ContextualModality" input="choice" required="False">ACTUAL,HYPOTHETICAL</property>
+      </properties>
+    </entity>
+    <entity type="TIMEX3">
+      <properties>
+        <property type="Class" input="choice">DATE,TIME</property>
+      </properties>
+    </entity>
+  </entities>
+  <relations type="TemporalRelations">
+    <relation type="TLINK">
+      <properties>
+        <property type="Source" input="list" instanceOf="EVENT,TIMEX3" maxlink="1"/>
+        <property type="Type" input="choice">BEFORE,CONTAINS,CONTAINS-SUBEVENT</property>
+        <property type="Target" input="list" instanceOf="EVENT,TIMEX3" maxlink="1"/>
+      </properties>
+    </relation>
+  </relations>
+  <relations type="CoreferenceRelations">
+    <relation type="Identical">
+      <properties>
+        <property type="FirstInstance" input="list" instanceOf="EVENT"/>
+        <property type="Coreferring_String" input="list" instanceOf="EVENT" required="False"/>
+      </properties>
+    </relation>
+  </relations>
+</definition>
+</schema>
+"""
+
+@pytest.fixture
+def compiled():
+  return schema.CompiledSchema.from_soup(soup(SCHEMA, "xml"))
+
+def _violations(doc, compiled):
+  return [(v.code, v.annotation_id, v.prop) for v in schema.validate_document(doc, compiled)]
+
+
+def test_compile(compiled):
+  assert sorted(compiled.entity_types) == ["EVENT", "TIMEX3"]
+  assert sorted(compiled.relation_types) == ["Identical", "TLINK"]
+  event = compiled.entity_types["EVENT"]
+  assert event.parentsType == "TemporalEntities"
+  assert [prop.name for prop in event.required] == ["DocTimeRel"]
+  assert event.properties["DocTimeRel"].choices == frozenset(["BEFORE", "OVERLAP", "AFTER"])
+  source = compiled.relation_types["TLINK"].properties["Source"]
+  assert (source.is_link(), source.instance_of, source.maxlink) == (True, frozenset(["EVENT", "TIMEX3"]), 1)
+  assert compiled.relation_types["Identical"].parentsType == "CoreferenceRelations"
+  assert compiled.relation_types["Identical"].properties["FirstInstance"].maxlink is None
+
+def test_valid_document(document, compiled):
+  assert schema.validate_document(document, compiled) == []
+
+def test_entity_violations(make_document, compiled):
+  entities = [
+    ("1@e@ID001_clinic_001@gold", "0,7", "EVENT", [("DocTimeRel", "SOMETIME"), ("Polarity", "NEG")]),
+    ("2@e@ID001_clinic_001@gold", "10,20", "TIMEX3", []),
+    ("3@e@ID001_clinic_001@gold", "25,30", "SECTIONTIME", []),
+  ]
+  violations = schema.validate_document(make_document(entities, []), compiled)
+  assert [(v.code, v.annotation_id, v.prop) for v in violations] == [
+    ("invalid_value", "1@e@ID001_clinic_001@gold", "DocTimeRel"),
+    ("unknown_property", "1@e@ID001_clinic_001@gold", "Polarity"),
+    ("missing_property", "2@e@ID001_clinic_001@gold", "Class"),
+    ("unknown_type", "3@e@ID001_clinic_001@gold", None),
+  ]
+  assert str(violations[0]) == "1@e@ID001_clinic_001@gold has DocTimeRel SOMETIME, not one of AFTER, BEFORE, OVERLAP"
+  assert violations[2].to_dict() == {"code": "missing_property", "id": "2@e@ID001_clinic_001@gold",
+                                     "property": "Class", "message": "is missing required property Class"}
+
+def test_relation_violations(make_document, compiled):
+  relations = [
+    ("1@r@ID001_clinic_001@gold", "TLINK", [("Source", "1@e@ID001_clinic_001@gold"), ("Source", "3@e@ID001_clinic_001@ann1"),
+                                            ("Type", "CONTAINS"), ("Target", "9@e@ID001_clinic_001@gold")]),
+    ("3@r@ID001_clinic_001@gold", "Identical", [("FirstInstance", "2@e@ID001_clinic_001@gold")]),
+  ]
+  assert _violations(make_document(ENTITIES, relations), compiled) == [
+    ("too_many_links", "1@r@ID001_clinic_001@gold", "Source"),
+    ("missing_entity", "1@r@ID001_clinic_001@gold", "Target"),
+    ("wrong_entity_type", "3@r@ID001_clinic_001@gold", "FirstInstance"),
+  ]
+
+def test_wrong_parents_type(make_document, compiled):
+  doc = make_document(ENTITIES[:1], [])
+  doc.entities_dict["1@e@ID001_clinic_001@gold"].parentsType = "CoreferenceEntities"
+  assert _violations(doc, compiled) == [("wrong_parents_type", "1@e@ID001_clinic_001@gold", None)]
+
+def test_validate_files(tmp_path, write_note):
+  schema_path = tmp_path / "temporal.schema.xml"
+  schema_path.write_text(SCHEMA)
+  paths = write_note([("Temporal-Relation.gold.completed.xml", annotation_xml()),
+                      ("Temporal-Relation.ann1.completed.xml", annotation_xml(ENTITIES + [
+                        ("5@e@ID001_clinic_001@ann1", "50,55", "DOCTIME", [])], RELATIONS)),
+                      ("Temporal-Relation.ann2.completed.xml", "<data><annotations><entity>")])
+  results = dict(schema.validate_files(paths, str(schema_path), jobs=2))
+  assert results[paths[0]] == []
+  assert [v.code for v in results[paths[1]]] == ["unknown_type"]
+  assert isinstance(results[paths[2]], str)
+  assert schema.cached_schema(str(schema_path)) is schema.cached_schema(str(schema_path))
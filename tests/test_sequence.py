@@ -0,0 +1,87 @@
+import io
+
+import pytest
+
+from anafora4python import annotation_text, raw_text, sequence
+
+TEXT = ('[start section id="20112"]\nChest pain since Monday. No fever.\n[end section id="20112"]\n'
+        '[start section id="20103"]\nStart aspirin.\n[end section id="20103"]\n')
+
+def _span(string, after=0):
+  start = TEXT.index(string, after)
+  return "%d,%d" % (start, start + len(string))
+
+ENTITIES = [
+  ("1@e@ID001_clinic_001@gold", _span("Chest pain"), "EVENT", [("DocTimeRel", "OVERLAP")]),
+  ("2@e@ID001_clinic_001@gold", _span("Monday"), "TIMEX3", [("Class", "DATE")]),
+  ("3@e@ID001_clinic_001@gold", _span("fever"), "EVENT", []),
+  # Overlaps the first entity, which starts first
+  ("4@e@ID001_clinic_001@gold", _span("pain"), "EVENT", [("DocTimeRel", "BEFORE")]),
+  # A disjoint entity, each span a chunk of its own
+  ("5@e@ID001_clinic_001@gold", "%s;%s" % (_span("Start", 100), _span("aspirin")), "EVENT", [("DocTimeRel", "AFTER")]),
+  # Outside of the sections
+  ("6@e@ID001_clinic_001@gold", _span("start"), "EVENT", []),
+]
+
+@pytest.fixture
+def text_doc(make_document):
+  return annotation_text.Document(make_document(ENTITIES, []), raw_text.Document(TEXT))
+
+def _tags(sequences):
+  return [(section_id, [(token, tag) for token, _, tag in labelled]) for section_id, labelled in sequences]
+
+
+def test_bio(text_doc):
+  assert _tags(sequence.iter_sequences(text_doc)) == [
+    ("20112", [("Chest", "B-EVENT"), ("pain", "I-EVENT"), ("since", "O"), ("Monday", "B-TIMEX3"), (".", "O"),
+               ("No", "O"), ("fever", "B-EVENT"), (".", "O")]),
+    ("20103", [("Start", "B-EVENT"), ("aspirin", "B-EVENT"), (".", "O")])]
+
+def test_bioes(text_doc):
+  assert _tags(sequence.iter_sequences(text_doc, scheme="BIOES")) == [
+    ("20112", [("Chest", "B-EVENT"), ("pain", "E-EVENT"), ("since", "O"), ("Monday", "S-TIMEX3"), (".", "O"),
+               ("No", "O"), ("fever", "S-EVENT"), (".", "O")]),
+    ("20103", [("Start", "S-EVENT"), ("aspirin", "S-EVENT"), (".", "O")])]
+
+def test_token_offsets(text_doc):
+  for _, labelled in sequence.iter_sequences(text_doc):
+    for token, (start, end), _ in labelled:
+      assert TEXT[start:end] == token
+
+def test_labels_and_filters(text_doc):
+  by_property = _tags(sequence.iter_sequences(text_doc, label="DocTimeRel"))
+  assert [tag for _, tag in by_property[0][1]] == ["B-OVERLAP", "I-OVERLAP", "O", "O", "O", "O", "O", "O"]
+  assert [tag for _, tag in by_property[1][1]] == ["B-AFTER", "B-AFTER", "O"]
+
+  by_function = _tags(sequence.iter_sequences(text_doc, label=lambda ent: "X" if ent.type == "TIMEX3" else None))
+  assert [tag for _, tag in by_function[0][1]] == ["O", "O", "O", "B-X", "O", "O", "O", "O"]
+
+  timex = _tags(sequence.iter_sequences(text_doc, types={"TIMEX3"}))
+  assert timex == _tags(sequence.iter_sequences(text_doc, label=lambda ent: ent.type if ent.type == "TIMEX3" else None))
+  assert all(tag == "O" for _, labelled in _tags(sequence.iter_sequences(text_doc, doc_id="ID002_clinic_002"))
+             for _, tag in labelled)
+
+def test_sentences(text_doc):
+  sentences = _tags(sequence.iter_sequences(text_doc, sentences=True))
+  assert [(section_id, [token for token, _ in tokens]) for section_id, tokens in sentences] == [
+    ("20112", ["Chest", "pain", "since", "Monday", "."]), ("20112", ["No", "fever", "."]),
+    ("20103", ["Start", "aspirin", "."])]
+
+def test_no_sections(make_document):
+  text = "Chest pain\n\nsince Monday"
+  entities = [("1@e@ID001_clinic_001@gold", "0,10", "EVENT", []), ("2@e@ID001_clinic_001@gold", "18,24", "TIMEX3", [])]
+  text_doc = annotation_text.Document(make_document(entities, []), raw_text.Document(text))
+  assert _tags(sequence.iter_sequences(text_doc)) == [
+    (None, [("Chest", "B-EVENT"), ("pain", "I-EVENT"), ("since", "O"), ("Monday", "B-TIMEX3")])]
+  # A blank line ends a sentence
+  assert len(list(sequence.iter_sequences(text_doc, sentences=True))) == 2
+
+def test_write_conll(text_doc):
+  out = io.StringIO()
+  assert sequence.write_conll(sequence.iter_sequences(text_doc, types={"TIMEX3"}), out) == 2
+  assert out.getvalue() == ("Chest\tO\npain\tO\nsince\tO\nMonday\tB-TIMEX3\n.\tO\nNo\tO\nfever\tO\n.\tO\n\n"
+                            "Start\tO\naspirin\tO\n.\tO\n\n")
+
+def test_bad_scheme(text_doc):
+  with pytest.raises(ValueError):
+    list(sequence.iter_sequences(text_doc, scheme="IOB2"))
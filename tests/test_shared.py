@@ -0,0 +1,104 @@
+import pickle
+from multiprocessing import Pool
+
+import pytest
+
+from conftest import ENTITIES, RELATIONS, annotation_xml
+from anafora4python import shared
+
+GOLD = "Temporal-Relation.gold.completed.xml"
+
+# A second copy of the note, by another annotator, sharing the ID of its first entity
+OTHER = [("1@e@ID001_clinic_001@gold", "0,7", "TIMEX3", []), ("5@e@ID001_clinic_001@ann2", "50,55", "EVENT", [])]
+# One argument is not in the document
+OTHER_RELATIONS = [("1@r@ID001_clinic_001@ann2", "TLINK",
+                    [("Source", "5@e@ID001_clinic_001@ann2"), ("Type", "BEFORE"), ("Target", "9@e@ID002_clinic_002@gold")])]
+
+@pytest.fixture
+def documents(make_document):
+  return [make_document(), make_document(OTHER, OTHER_RELATIONS, "ID001_clinic_001.Temporal-Relation.ann2.completed.xml")]
+
+@pytest.fixture
+def shared_corpus(documents):
+  shared_corpus = shared.SharedCorpus.from_documents(documents)
+  yield shared_corpus
+  shared_corpus.unlink()
+
+def _entities(doc):
+  return [(ent.id, ent.type, ent.parentsType, ent.spans, ent.span_string,
+           [(prop.name, prop.value) for prop in ent.properties]) for ent in doc.get_entities()]
+
+def _relations(doc):
+  return [(rel.id, rel.type, rel.parentsType, rel.subtype, rel.entity_ids(), rel.is_cross_doc(),
+           sorted((prop.name, prop.value) for prop in rel.properties)) for rel in doc.get_all_relations()]
+
+def _summary(args):
+  shared_corpus, index = args
+  doc = shared_corpus.document(index)
+  return doc.filename, len(doc.get_entities()), [ent.id for ent in shared_corpus.find_entities("1@e@ID001_clinic_001@gold")]
+
+
+def test_views_match_documents(shared_corpus, documents):
+  assert len(shared_corpus) == 2
+  for doc, view in zip(documents, shared_corpus.documents()):
+    assert view.filename == doc.filename
+    assert _entities(view) == _entities(doc)
+    assert _relations(view) == _relations(doc)
+
+def test_relation_arguments(shared_corpus):
+  rel = shared_corpus.document(0).get_all_relations()[0]
+  assert [ent.id for ent in rel.get_entities()] == ["1@e@ID001_clinic_001@gold", "2@e@ID001_clinic_001@gold"]
+  # Entity arguments come first
+  assert [prop.name for prop in rel.properties] == ["Source", "Target", "Type"]
+  dangling = shared_corpus.document(1).get_all_relations()[0]
+  assert [ent and ent.id for ent in dangling.get_entities()] == ["5@e@ID001_clinic_001@ann2", None]
+  assert dangling.is_cross_doc()
+
+def test_find_entities(shared_corpus):
+  found = shared_corpus.find_entities("1@e@ID001_clinic_001@gold")
+  assert [(ent.type, ent.spans) for ent in found] == [("EVENT", [(0, 7)]), ("TIMEX3", [(0, 7)])]
+  assert found[0] == shared_corpus.document(0).get_entities()[0]
+  assert [ent.span_string for ent in shared_corpus.find_entities("4@e@ID001_clinic_001@ann1")] == ["32,35;40,44"]
+  assert shared_corpus.find_entities("9@e@ID002_clinic_002@gold") == []
+  assert shared_corpus.find_entities("not an ID") == []
+
+def test_strings(shared_corpus):
+  for string in ("EVENT", "CONTAINS-SUBEVENT", "ID001_clinic_001.Temporal-Relation.ann2.completed.xml"):
+    assert shared_corpus.string(shared_corpus.string_code(string)) == string
+  assert shared_corpus.string_code("") == -1
+  assert shared_corpus.string_code("ZZZ") == -1
+
+def test_pickling_attaches(shared_corpus):
+  attached = pickle.loads(pickle.dumps(shared_corpus))
+  assert attached.shm.name == shared_corpus.shm.name
+  assert _entities(attached.document(1)) == _entities(shared_corpus.document(1))
+  attached.close()
+  # The block outlives a process detaching from it
+  assert shared_corpus.document(0).filename == "ID001_clinic_001.Temporal-Relation.gold.completed.xml"
+
+def test_workers_read_the_block(shared_corpus):
+  with Pool(2) as pool:
+    results = pool.map(_summary, [(shared_corpus, i) for i in range(len(shared_corpus))])
+  ids = ["1@e@ID001_clinic_001@gold"] * 2
+  assert results == [("ID001_clinic_001.Temporal-Relation.gold.completed.xml", 4, ids),
+                     ("ID001_clinic_001.Temporal-Relation.ann2.completed.xml", 2, ids)]
+
+def test_from_files(write_note):
+  paths = write_note([(GOLD, annotation_xml()), ("Temporal-Relation.ann2.completed.xml", "<data><annotations><entity>"),
+                      ("Temporal-Relation.ann3.completed.xml", annotation_xml(OTHER, []))])
+  for jobs in (1, 2):
+    shared_corpus = shared.SharedCorpus.from_files(paths, jobs=jobs)
+    try:
+      assert [doc.filename.split(".")[2] for doc in shared_corpus.documents()] == ["gold", "ann3"]
+      assert list(shared_corpus.errors) == [paths[1]]
+      assert len(shared_corpus.find_entities("1@e@ID001_clinic_001@gold")) == 2
+    finally:
+      shared_corpus.unlink()
+
+def test_empty_corpus():
+  shared_corpus = shared.SharedCorpus.from_documents([])
+  try:
+    assert len(shared_corpus) == 0
+    assert shared_corpus.find_entities("1@e@ID001_clinic_001@gold") == []
+  finally:
+    shared_corpus.unlink()
@@ -0,0 +1,105 @@
+import pickle
+import threading
+
+from anafora4python import annotation
+
+
+def test_records(document):
+  snapshot = document.snapshot()
+  assert snapshot.version == document.version == 0
+  assert [record.id for record in snapshot.get_entities()] == ["1@e@ID001_clinic_001@gold", "2@e@ID001_clinic_001@gold",
+                                                               "3@e@ID001_clinic_001@ann1", "4@e@ID001_clinic_001@ann1"]
+  assert snapshot.get_entity("4@e@ID001_clinic_001@ann1") == annotation.EntityRecord(
+    "4@e@ID001_clinic_001@ann1", ((32, 35), (40, 44)), "EVENT", "TemporalEntities", (("DocTimeRel", "BEFORE"),))
+  relation = snapshot.get_relation("1@r@ID001_clinic_001@gold")
+  assert (relation.type, relation.entity_ids) == ("TLINK", ("1@e@ID001_clinic_001@gold", "2@e@ID001_clinic_001@gold"))
+  assert snapshot.get_entity("9@e@ID001_clinic_001@gold") is None
+
+def test_indexes_match_the_document(document):
+  snapshot = document.snapshot()
+  assert [record.id for record in snapshot.get_entities_of_type("EVENT")] == [ent.id for ent in document.query(type="EVENT")]
+  assert snapshot.get_entities_of_type("SECTIONTIME") == []
+  for span in [(0, 7), (0, 30), (30, 44), (32, 40), (5, 20)]:
+    assert [record.id for record in snapshot.get_annotations_by_span(span)] == [
+      ent.id for ent in document.get_annotations_by_span(span)]
+  assert snapshot.get_annotations_by_span((0, 30), "ID002") == []
+  assert sorted(record.id for record in snapshot.get_relations_with_entity("1@e@ID001_clinic_001@gold")) == [
+    "1@r@ID001_clinic_001@gold", "2@r@ID001_clinic_001@gold", "3@r@ID001_clinic_001@gold"]
+
+def test_unchanged_documents_keep_their_snapshot(document):
+  assert document.snapshot() is document.snapshot()
+
+def test_changes_make_new_versions(document):
+  before = document.snapshot()
+  document.add_entity("ann2", (60, 65), "TIMEX3", "TemporalEntities")
+  assert document.version == 1
+  after = document.snapshot()
+  assert after.version == 1
+  assert len(after.get_entities()) == 5
+  # The old snapshot did not change, and the records of what did not change are shared
+  assert len(before.get_entities()) == 4
+  assert after.get_entity("1@e@ID001_clinic_001@gold") is before.get_entity("1@e@ID001_clinic_001@gold")
+
+  document.remove_annotations([document.entities_dict["2@e@ID001_clinic_001@gold"]], cascade="prune")
+  assert document.version == 2
+  latest = document.snapshot()
+  assert latest.get_entity("2@e@ID001_clinic_001@gold") is None
+  assert latest.get_relation("1@r@ID001_clinic_001@gold").entity_ids == ("1@e@ID001_clinic_001@gold",)
+  assert after.get_relation("1@r@ID001_clinic_001@gold").entity_ids == ("1@e@ID001_clinic_001@gold",
+                                                                         "2@e@ID001_clinic_001@gold")
+
+def test_changes_in_place(document):
+  before = document.snapshot()
+  ent = document.entities_dict["1@e@ID001_clinic_001@gold"]
+  [prop for prop in ent.properties if prop.name == "DocTimeRel"][0].value = "AFTER"
+  after = document.snapshot()
+  assert after.version > before.version
+  assert after.get_entity(ent.id).properties == (("DocTimeRel", "AFTER"), ("ContextualModality", "ACTUAL"))
+  assert before.get_entity(ent.id).properties == (("DocTimeRel", "BEFORE"), ("ContextualModality", "ACTUAL"))
+
+  document.relations_dict["1@r@ID001_clinic_001@gold"].update_subtype("BEFORE")
+  assert document.snapshot().get_relation("1@r@ID001_clinic_001@gold").properties[1] == ("Type", "BEFORE")
+
+def test_writing_makes_one_version(document):
+  with document.writing() as doc:
+    assert doc is document
+    doc.add_entity("ann2", (60, 65), "TIMEX3", "TemporalEntities")
+    doc.add_tlink("1@e@ID001_clinic_001@gold", "5@e@ID001_clinic_001@ann2", "TemporalRelations", "BEFORE")
+  snapshot = document.snapshot()
+  # The changes inside count too, but nothing sees the versions in between
+  assert snapshot.version == document.version
+  assert len(snapshot.get_entities()) == 5
+  assert len(snapshot.get_all_relations()) == 4
+
+def test_pickle(document):
+  document.snapshot()
+  loaded = pickle.loads(pickle.dumps(document))
+  assert loaded.lock is not document.lock
+  with loaded.writing():
+    pass
+  assert loaded.snapshot().version == document.version + 1
+
+def test_readers_see_whole_versions(document):
+  errors = []
+  done = threading.Event()
+
+  def read():
+    while not done.is_set():
+      snapshot = document.snapshot()
+      # Every entity added in a version comes with its relation
+      entities, relations = len(snapshot.get_entities()), len(snapshot.get_all_relations())
+      if entities - 4 != relations - 3:
+        errors.append((snapshot.version, entities, relations))
+
+  readers = [threading.Thread(target=read) for _ in range(4)]
+  for reader in readers:
+    reader.start()
+  for i in range(30):
+    with document.writing():
+      document.add_entity("ann2", (60 + i, 61 + i), "TIMEX3", "TemporalEntities")
+      document.add_tlink("1@e@ID001_clinic_001@gold", "%d@e@ID001_clinic_001@ann2" % (5 + i), "TemporalRelations", "BEFORE")
+  done.set()
+  for reader in readers:
+    reader.join()
+  assert errors == []
+  assert len(document.snapshot().get_entities()) == 34
@@ -0,0 +1,94 @@
+import pytest
+
+from conftest import ENTITIES, RELATIONS, annotation_xml
+from anafora4python import stats
+
+GOLD = "Temporal-Relation.gold.completed.xml"
+
+# An entity of another note, and a relation between the two notes
+OTHER_NOTE = [("5@e@ID002_clinic_002@gold", "0,4", "EVENT", [("DocTimeRel", "AFTER")])]
+CROSS_DOC = [("4@r@ID001_clinic_001@gold", "TLINK",
+              [("Source", "1@e@ID001_clinic_001@gold"), ("Type", "BEFORE"), ("Target", "5@e@ID002_clinic_002@gold")])]
+
+
+def test_document_summary(document):
+  summary = stats.DocumentSummary.from_document(document)
+  assert (summary.status, summary.savetime, summary.annotations()) == ("completed", document.savetime, 7)
+  assert summary.to_dict() == {
+    "files": 1, "statuses": {"completed": 1},
+    "entity_types": {"EVENT": 3, "TIMEX3": 1},
+    "property_values": {"DocTimeRel": {"BEFORE": 2, "AFTER": 1}, "ContextualModality": {"ACTUAL": 1, "HYPOTHETICAL": 1},
+                        "Class": {"DATE": 1}},
+    "relation_types": {"TLINK": {"count": 2, "cross_doc": 0, "within_doc": 2, "cross_doc_ratio": 0.0},
+                       "Identical": {"count": 1, "cross_doc": 0, "within_doc": 1, "cross_doc_ratio": 0.0}},
+    "relation_subtypes": {"TLINK": {"CONTAINS": 1, "CONTAINS-SUBEVENT": 1}},
+    # The disjoint entity counts the length of both its spans
+    "span_lengths": {"5": 1, "7": 2, "10": 1}}
+
+def test_cross_doc_relations(make_document):
+  summary = stats.DocumentSummary.from_document(make_document(ENTITIES + OTHER_NOTE, RELATIONS + CROSS_DOC))
+  assert summary.to_dict()["relation_types"]["TLINK"] == {"count": 3, "cross_doc": 1, "within_doc": 2,
+                                                          "cross_doc_ratio": pytest.approx(1 / 3.0)}
+
+def test_summaries_add_and_subtract(make_document):
+  first = stats.DocumentSummary.from_document(make_document())
+  second = stats.DocumentSummary.from_document(make_document(ENTITIES[:2], RELATIONS[:1]))
+  total = first + second
+  assert (total.status, total.savetime) == (None, None)
+  assert total.files == 2
+  assert total.entity_types == {"EVENT": 4, "TIMEX3": 2}
+  assert first.files == 1
+  total -= first
+  assert total.to_dict() == second.to_dict()
+  # Counts that drop to zero are removed
+  assert "Identical" not in total.relation_types
+
+
+@pytest.fixture
+def corpus_files(write_note):
+  paths = write_note([(GOLD, annotation_xml())])
+  paths += write_note([(GOLD, annotation_xml(OTHER_NOTE, []))], note="ID002_clinic_002")
+  return paths
+
+def test_corpus_stats_update(corpus_files):
+  corpus_stats = stats.CorpusStats()
+  assert corpus_stats.update(corpus_files) == corpus_files
+  assert corpus_stats.total.files == 2
+  assert corpus_stats.total.entity_types == {"EVENT": 4, "TIMEX3": 1}
+  # Nothing changed
+  assert corpus_stats.update(corpus_files) == []
+
+  with open(corpus_files[1], "w") as f:
+    f.write(annotation_xml([("5@e@ID002_clinic_002@gold", "0,4", "TIMEX3", [])], []))
+  assert corpus_stats.update(corpus_files) == [corpus_files[1]]
+  assert corpus_stats.total.entity_types == {"EVENT": 3, "TIMEX3": 2}
+
+  assert corpus_stats.update(corpus_files[:1]) == []
+  assert corpus_stats.total.to_dict() == corpus_stats.summaries[corpus_files[0]][1].to_dict()
+  assert sorted(corpus_stats.summaries) == corpus_files[:1]
+
+def test_corpus_stats_errors(corpus_files, write_note):
+  bad, = write_note([(GOLD, "<data><annotations><entity>")], note="ID003_clinic_003")
+  corpus_stats = stats.CorpusStats()
+  corpus_stats.update(corpus_files + [bad])
+  assert list(corpus_stats.errors) == [bad]
+  assert corpus_stats.total.files == 2
+  # A file that could not be loaded is dropped with the others when it goes
+  corpus_stats.update(corpus_files)
+  assert corpus_stats.errors == {}
+
+def test_corpus_stats_save_and_load(corpus_files, tmp_path):
+  corpus_stats = stats.CorpusStats()
+  corpus_stats.update(corpus_files, jobs=2)
+  cache = str(tmp_path / "stats.pickle")
+  corpus_stats.save(cache)
+  loaded = stats.CorpusStats.load(cache)
+  assert loaded.total.to_dict() == corpus_stats.total.to_dict()
+  assert loaded.update(corpus_files) == []
+
+def test_summarize_file(corpus_files, tmp_path):
+  summary, error = stats.summarize_file(corpus_files[0])
+  assert (summary.annotations(), error) == (7, None)
+  summary, error = stats.summarize_file(str(tmp_path / "missing.xml"))
+  assert summary is None
+  assert error.startswith("FileNotFoundError")
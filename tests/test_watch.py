@@ -0,0 +1,107 @@
+import os
+import shutil
+
+import pytest
+
+from conftest import ENTITIES, NOTE, annotation_xml
+from anafora4python import stats, watch
+
+GOLD = "Temporal-Relation.gold.completed.xml"
+
+def _watcher(paths, inotify):
+  try:
+    return watch.Watcher(paths, inotify=inotify)
+  except OSError:
+    pytest.skip("inotify is not available")
+
+@pytest.fixture(params=[False, True], ids=["rescan", "inotify"])
+def inotify(request):
+  return request.param
+
+@pytest.fixture
+def project(tmp_path, write_note):
+  write_note([(GOLD, annotation_xml(status="inprogress"))])
+  return tmp_path
+
+
+def test_refresh_only_parses_changes(project, write_note, inotify):
+  with _watcher(str(project), inotify) as watcher:
+    assert watcher.uses_inotify() == inotify
+    path = str(project / NOTE / (NOTE + "." + GOLD))
+    assert watcher.refresh() == ([path], [])
+    assert watcher.documents()[path].status == "inprogress"
+    assert watcher.refresh() == ([], [])
+
+    with open(path, "w") as f:
+      f.write(annotation_xml(ENTITIES[:1], []))
+    assert watcher.refresh() == ([path], [])
+    assert watcher.documents()[path].status == "completed"
+    assert watcher.stats.total.entity_types == {"EVENT": 1}
+
+    # A new note directory
+    new, = write_note([(GOLD, annotation_xml(ENTITIES[1:2], []))], note="ID002_clinic_002")
+    assert watcher.refresh() == ([new], [])
+    assert watcher.stats.total.entity_types == {"EVENT": 1, "TIMEX3": 1}
+
+    os.remove(path)
+    assert watcher.refresh() == ([], [path])
+    assert sorted(watcher.documents()) == [new]
+
+def test_moves_and_removed_directories(project, write_note, inotify):
+  with _watcher(str(project), inotify) as watcher:
+    watcher.refresh()
+    path = str(project / NOTE / (NOTE + "." + GOLD))
+    moved = path.replace(".gold.", ".ann1.")
+    os.rename(path, moved)
+    assert watcher.refresh() == ([moved], [path])
+
+    shutil.rmtree(str(project / NOTE))
+    assert watcher.refresh() == ([], [moved])
+    assert watcher.stats.total.files == 0
+
+def test_other_files_are_ignored(project, inotify):
+  with _watcher(str(project), inotify) as watcher:
+    watcher.refresh()
+    (project / NOTE / NOTE).write_text("raw text")
+    assert watcher.refresh() == ([], [])
+
+def test_errors(project, write_note, inotify):
+  with _watcher(str(project), inotify) as watcher:
+    bad, = write_note([(GOLD, "<data><annotations><entity>")], note="ID003_clinic_003")
+    watcher.refresh()
+    assert list(watcher.stats.errors) == [bad]
+    with open(bad, "w") as f:
+      f.write(annotation_xml([], []))
+    assert watcher.refresh() == ([bad], [])
+    assert watcher.stats.errors == {}
+
+def test_wait(project, inotify):
+  with _watcher(str(project), inotify) as watcher:
+    watcher.refresh()
+    if inotify:
+      assert not watcher.wait(0)
+    (project / NOTE / ("%s.%s" % (NOTE, GOLD))).write_text(annotation_xml([], []))
+    assert watcher.wait(0.5)
+    assert len(watcher.refresh()[0]) == 1
+
+def test_watch_calls_back(project):
+  calls = []
+
+  def callback(watcher, summarized, removed):
+    calls.append((len(summarized), removed))
+    return False
+
+  with _watcher(str(project), None) as watcher:
+    watcher.watch(callback, interval=0.01)
+  assert calls == [(1, [])]
+
+def test_start_from_saved_stats(project, tmp_path):
+  corpus_stats = stats.CorpusStats()
+  corpus_stats.update([str(project / NOTE / (NOTE + "." + GOLD))])
+  with _watcher(str(project), False) as watcher:
+    watcher.stats = corpus_stats
+    assert watcher.refresh() == ([], [])
+
+def test_inotify_needs_directories(project):
+  with pytest.raises(OSError):
+    watch.Watcher(str(project / NOTE / (NOTE + "." + GOLD)), inotify=True)
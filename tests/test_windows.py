@@ -0,0 +1,128 @@
+import random
+
+import pytest
+
+from anafora4python import annotation_text, raw_text, windows
+
+# Lines up with the spans of the ENTITIES
+TEXT = "Patient - 2020-01-01 had fever, ran and left."
+SECTIONS = '[start section id="A"]\nPatient had fever\n[end section id="A"]\n[start section id="B"]\nran and left\n[end section id="B"]\n'
+
+@pytest.fixture
+def text_doc(document):
+  return annotation_text.Document(document, raw_text.Document(TEXT))
+
+def _windows(text_doc, *args, **kwargs):
+  return [(window.start, window.end) for window in windows.iter_windows(text_doc, *args, **kwargs)]
+
+
+def test_char_windows(text_doc):
+  found = list(windows.iter_windows(text_doc, 15, overlap=5))
+  assert [(window.index, window.text) for window in found] == [
+    (0, "Patient - 2020-"), (1, "2020-01-01 had "), (2, "had fever, ran "), (3, "ran and left.")]
+  assert [[ent.id.num for ent in window.entities] for window in found] == [["1"], ["2"], ["3"], ["4"]]
+  # Without aligning to tokens, windows start exactly overlap characters back
+  assert _windows(text_doc, 15, overlap=5, align_tokens=False) == [(0, 15), (10, 25), (20, 35), (30, 45)]
+
+def test_windows_end_before_the_token_they_would_cut(text_doc):
+  assert _windows(text_doc, 12) == [(0, 10), (10, 21), (21, 32), (32, 44), (44, 45)]
+  # Unless the token is longer than the window
+  assert _windows(text_doc, 4)[:2] == [(0, 4), (4, 8)]
+
+def test_token_windows(text_doc):
+  found = list(windows.iter_windows(text_doc, 4, overlap=1, unit="token"))
+  assert [window.text for window in found] == ["Patient - 2020-", "-01-01", "01 had fever,", ", ran and left", "left."]
+  assert [len(window.tokens()) for window in found] == [4, 4, 4, 4, 2]
+  assert found[2].tokens()[:2] == [("01", (0, 2)), ("had", (3, 6))]
+
+def test_relations_between_entities_in_the_window(text_doc):
+  first = next(windows.iter_windows(text_doc, 30))
+  assert [ent.id.num for ent in first.entities] == ["1", "2", "3"]
+  assert sorted(rel.id.num for rel in first.relations) == ["1", "2", "3"]
+  # The spans of a window's entities must all be inside it
+  assert [[ent.id.num for ent in window.entities] for window in windows.iter_windows(text_doc, 38)] == [
+    ["1", "2", "3"], []]
+
+def test_offsets(text_doc):
+  window = list(windows.iter_windows(text_doc, 15, overlap=5))[3]
+  ent = window.entities[0]
+  assert window.entity_spans(ent) == [(0, 3), (8, 12)]
+  assert [window.text[start:end] for start, end in window.entity_spans(ent)] == ["ran", "left"]
+  assert window.to_document((8, 12)) == (40, 44)
+  assert repr(window) == "Window(3, 32, 45)"
+
+def test_sections(document):
+  text_doc = annotation_text.Document(document, raw_text.Document(SECTIONS))
+  found = list(windows.iter_windows(text_doc, 100, sections=True))
+  assert [(window.section_id, window.text) for window in found] == [("A", "Patient had fever"), ("B", "ran and left")]
+  assert [(window.section_id, window.text) for window in windows.iter_windows(text_doc, 2, unit="token", sections=True)] == [
+    ("A", "Patient had"), ("A", "fever"), ("B", "ran and"), ("B", "left")]
+  assert len(list(windows.iter_windows(text_doc, 1000))) == 1
+
+def test_documents(text_doc):
+  assert list(windows.iter_windows(text_doc, 100, doc_id="ID002_clinic_002"))[0].entities == []
+  assert len(list(windows.iter_windows(text_doc, 100, doc_id="ID001_clinic_001"))[0].entities) == 4
+  without = annotation_text.Document(None, raw_text.Document(TEXT))
+  assert [window.entities for window in windows.iter_windows(without, 30)] == [[], []]
+
+def test_errors(text_doc):
+  with pytest.raises(ValueError):
+    list(windows.iter_windows(text_doc, 10, unit="word"))
+  with pytest.raises(ValueError):
+    list(windows.iter_windows(text_doc, 10, overlap=10))
+
+@pytest.mark.parametrize("unit, align_tokens", [("char", True), ("char", False), ("token", True)])
+def test_windows_cover_the_text(unit, align_tokens):
+  rng = random.Random(11)
+  text = " ".join("".join(rng.choice("abc") for _ in range(rng.randrange(1, 8))) for _ in range(200))
+  raw = raw_text.Document(text)
+  raw.tokenize()
+  text_doc = annotation_text.Document(None, raw)
+  for size, overlap in [(20, 0), (20, 7), (50, 10), (5, 2)]:
+    found = _windows(text_doc, size, overlap, unit, align_tokens)
+    # Every window has text past the one before
+    for (start, end), (next_start, next_end) in zip(found, found[1:]):
+      assert start < next_start and end < next_end
+    if unit == "token":
+      tokens = [raw.span_to_tokens(window) for window in found]
+      assert max(stop - first for first, stop in tokens) <= size
+      assert all(next_first == stop - overlap for (_, stop), (next_first, _) in zip(tokens, tokens[1:]))
+      assert (tokens[0][0], tokens[-1][1]) == (0, len(raw.tokens))
+    else:
+      assert max(end - start for start, end in found) <= size
+      assert found[0][0] == 0 and found[-1][1] == len(text)
+      assert all(next_start <= end for (_, end), (next_start, _) in zip(found, found[1:]))
+      if align_tokens:
+        # Windows end between tokens, unless a token starting before them is longer than size
+        for start, end in found:
+          token = raw.char_to_token(end)
+          assert token is None or raw.token_starts[token] == end or raw.token_starts[token] <= start
+
+def test_merge_keeps_repeated_predictions_once(text_doc):
+  first, second = list(windows.iter_windows(text_doc, 15, overlap=5))[:2]
+  assert windows.merge_predictions([(first, [(10, 14, "DATE")]), (second, [(0, 4, "DATE"), (11, 14, "EVENT")])]) == [
+    (10, 14, "DATE"), (21, 24, "EVENT")]
+
+def test_merge_keeps_the_prediction_with_most_context():
+  first, second = windows.Window(None, 0, 0, 100), windows.Window(None, 1, 80, 180)
+  # 2 characters from the end of the first window, and 10 from the start of the second
+  assert windows.merge_predictions([(first, [(85, 98, "A")]), (second, [(10, 20, "B")])]) == [(90, 100, "B")]
+  assert windows.merge_predictions([(first, [(70, 90, "A")]), (second, [(5, 20, "B")])]) == [(70, 90, "A")]
+  # Predictions of one window may overlap, as may those that do not overlap each other
+  assert windows.merge_predictions([(first, [(10, 20, "A"), (15, 25, "B")]), (second, [(30, 40, "C")])]) == [
+    (10, 20, "A"), (15, 25, "B"), (110, 120, "C")]
+
+def test_merge_ties_go_to_the_earlier_window():
+  first, second = windows.Window(None, 0, 0, 100), windows.Window(None, 1, 50, 150)
+  assert windows.merge_predictions([(second, [(20, 30, "B")]), (first, [(65, 75, "A")])]) == [(65, 75, "A")]
+
+def test_merged_windows_give_back_the_entities(text_doc):
+  predictions = []
+  for window in windows.iter_windows(text_doc, 4, overlap=2, unit="token"):
+    predictions.append((window, [span + (ent.type,) for ent in window.entities for span in window.entity_spans(ent)]))
+  # The date is longer than any window
+  assert windows.merge_predictions(predictions) == [(0, 7, "EVENT"), (25, 30, "EVENT"), (32, 35, "EVENT"), (40, 44, "EVENT")]
+  predictions = [(window, [span + (ent.type,) for ent in window.entities for span in window.entity_spans(ent)])
+                 for window in windows.iter_windows(text_doc, 15, overlap=5)]
+  assert windows.merge_predictions(predictions) == [(0, 7, "EVENT"), (10, 20, "TIMEX3"), (25, 30, "EVENT"),
+                                                    (32, 35, "EVENT"), (40, 44, "EVENT")]
@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+from anafora4python import corpus
+
+XML = """<?xml version="1.0" encoding="UTF-8"?>
+<data>
+<info>
+  <savetime>10:10:10 01-01-2020</savetime>
+  <progress>in-progress</progress>
+</info>
+<schema path="./" protocol="file">temporal.schema.xml</schema>
+<annotations>
+  <entity>
+    <id>1@e@ID001_clinic_001@gold</id>
+    <span>74,85</span>
+    <type>EVENT</type>
+    <parentsType>TemporalEntities</parentsType>
+    <properties>
+      <DocTimeRel>BEFORE</DocTimeRel>
+    </properties>
+  </entity>
+</annotations>
+</data>
+"""
+
+def test_write_document_keeps_edits(tmp_path):
+  source = tmp_path / "ID001_clinic_001.Temporal-Relation.gold.completed.xml"
+  source.write_text(XML)
+  target = str(tmp_path / "out.xml")
+  doc = corpus.load_annotation(str(source))
+  assert corpus.write_document(doc, target)[0] == "written"
+  assert corpus.write_document(doc, target)[0] == "unchanged"
+
+  doc.get_entities()[0].type = "TIMEX3"
+  doc.status = "completed"
+  assert corpus.write_document(doc, target)[0] == "written"
+  with open(target) as f:
+    written = f.read()
+  assert "<type>TIMEX3</type>" in written
+  assert "<progress>completed</progress>" in written
+  assert "EVENT" not in written
+
+  reloaded = corpus.load_annotation(target)
+  assert reloaded.get_entities()[0].type == "TIMEX3"
+  assert reloaded.status == "completed"
+
+def test_write_atomic(tmp_path):
+  path = str(tmp_path / "note.xml")
+  corpus.write_atomic(path, b"old")
+  with open(path, "rb") as f:
+    assert f.read() == b"old"
+  os.chmod(path, 0o640)
+  corpus.write_atomic(path, b"new", fsync=False)
+  with open(path, "rb") as f:
+    assert f.read() == b"new"
+  assert os.stat(path).st_mode & 0o777 == 0o640
+  assert os.listdir(str(tmp_path)) == ["note.xml"]
+
+def test_write_atomic_failure_keeps_the_old_file(tmp_path):
+  path = str(tmp_path / "note.xml")
+  corpus.write_atomic(path, b"old")
+  with pytest.raises(TypeError):
+    corpus.write_atomic(path, "not bytes")
+  with open(path, "rb") as f:
+    assert f.read() == b"old"
+  assert os.listdir(str(tmp_path)) == ["note.xml"]
+
+def test_same_content(tmp_path):
+  path = tmp_path / "note.xml"
+  path.write_bytes(b"abc")
+  assert corpus.same_content(str(path), b"abc")
+  assert not corpus.same_content(str(path), b"abd")
+  assert not corpus.same_content(str(path), b"abcd")
+  assert not corpus.same_content(str(tmp_path / "missing.xml"), b"abc")
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_write_documents(tmp_path, make_document, jobs):
+  items = [(make_document(), str(tmp_path / "out" / ("%d.xml" % i))) for i in range(5)]
+  summary = corpus.write_documents(items[:3], jobs=jobs, fsync=False)
+  assert sorted(summary.written) == [path for _, path in items[:3]]
+  assert (summary.unchanged, summary.errors) == ([], {})
+  assert summary.bytes == 3 * len(items[0][0].pp().encode("utf-8"))
+
+  (tmp_path / "out" / "4.xml").mkdir()
+  summary = corpus.write_documents(items, jobs=jobs, fsync=False)
+  assert sorted(summary.unchanged) == [path for _, path in items[:3]]
+  assert summary.written == [items[3][1]]
+  assert list(summary.errors) == [items[4][1]]
+  assert str(summary).startswith("1 written, 3 unchanged, 1 failed")
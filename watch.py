@@ -0,0 +1,239 @@
+"""
+Keeping the statistics of an Anafora project directory current while annotators work in it.
+
+A Watcher holds a stats.CorpusStats, whose per-file summaries include each document's status and savetime,
+and on refresh() re-parses only the annotation files that were saved, created or removed since the last one.
+On Linux the changes are taken from inotify, so a refresh costs nothing for the files that did not change.
+Elsewhere, or when inotify runs out of watches or its queue overflows, the directories are rescanned
+and files compared by modification time and size, which still only re-parses the changed files.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import fnmatch
+import os
+import select
+import struct
+import time
+
+from anafora4python import corpus, stats
+
+class Watcher(object):
+  """
+  paths: the directories (or files) of the project
+  inotify: True to require inotify, False to always rescan, None to use it when it is available
+  corpus_stats: a CorpusStats to start from, such as one loaded from a cache, so that the first refresh
+                only parses the files that changed since it was saved
+  """
+  def __init__(self, paths, pattern="*.xml", jobs=1, inotify=None, corpus_stats=None):
+    self.paths = [paths] if isinstance(paths, str) else list(paths)
+    self.pattern = pattern
+    self.jobs = jobs
+    self.stats = corpus_stats if corpus_stats is not None else stats.CorpusStats()
+    self._inotify = None
+    self._rescan = True
+    # Changes read by wait(), for the next refresh()
+    self._pending = None
+    if inotify is not False and all(os.path.isdir(path) for path in self.paths):
+      try:
+        self._inotify = _Inotify()
+        for path in self.paths:
+          self._inotify.add_tree(path)
+      except OSError:
+        if self._inotify is not None:
+          self._inotify.close()
+          self._inotify = None
+        if inotify:
+          raise
+    elif inotify:
+      raise OSError(errno.EINVAL, "inotify can only watch directories")
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  def close(self):
+    if self._inotify is not None:
+      self._inotify.close()
+      self._inotify = None
+
+  def uses_inotify(self):
+    return self._inotify is not None
+
+  def refresh(self):
+    """
+    Brings the statistics up to date with the files, rescanning the directories
+    the first time, and then whenever inotify is not used or lost events
+
+    Return: a tuple of (list of the paths that were summarized, list of the paths that were removed)
+    """
+    if self._rescan or self._inotify is None:
+      if self._inotify is not None:
+        # Events queued so far are covered by the scan, but directories created since the last one
+        # may not be watched yet, so every directory is watched again (which keeps existing watches)
+        self._pending = None
+        self._inotify.read_events(0)
+        try:
+          for path in self.paths:
+            self._inotify.add_tree(path)
+        except OSError:
+          self.close()
+      self._rescan = False
+      found = corpus.find_annotation_files(self.paths, self.pattern)
+      found_set = set(found)
+      removed = [path for path in list(self.stats.summaries) + list(self.stats.errors) if path not in found_set]
+      changed = self.stats.stale_files(found)
+    else:
+      written, removed = self._events(0)
+      if self._rescan:
+        return self.refresh()
+      known = set(self.stats.summaries) | set(self.stats.errors)
+      removed = sorted(path for path in removed if path in known)
+      changed = self.stats.stale_files(sorted(path for path in written if os.path.isfile(path)))
+
+    return self.stats.update_paths(changed, removed, self.jobs), removed
+
+  def wait(self, timeout):
+    """
+    Waits up to timeout seconds for a file to change, or just sleeps for that long without inotify
+
+    Return: whether there may be changes for refresh()
+    """
+    if self._inotify is None:
+      time.sleep(timeout)
+      return True
+    written, removed = self._events(timeout)
+    self._pending = (written, removed)
+    return bool(written or removed) or self._rescan
+
+  def watch(self, callback, interval=2.0):
+    """
+    Refreshes the statistics whenever files change, checking at most every interval seconds,
+    and calls callback(watcher, summarized paths, removed paths) after the first refresh
+    and every one that changed anything, until callback returns False
+    """
+    summarized, removed = self.refresh()
+    if callback(self, summarized, removed) is False:
+      return
+    while True:
+      started = time.time()
+      if self.wait(interval):
+        summarized, removed = self.refresh()
+        if (summarized or removed) and callback(self, summarized, removed) is False:
+          return
+      time.sleep(max(0, interval - (time.time() - started)))
+
+  def documents(self):
+    """
+    Return: a dict of {path: DocumentSummary} of the files that could be loaded
+    """
+    return dict((path, summary) for path, (_, summary) in self.stats.summaries.items())
+
+  def _events(self, timeout):
+    """
+    Return: the sets of (written paths, removed paths) since the last call, including any left by wait()
+    """
+    written, removed = set(), set()
+    if self._pending is not None:
+      written, removed = self._pending
+      self._pending = None
+    for kind, path in self._inotify.read_events(timeout):
+      if kind == "overflow":
+        self._rescan = True
+      elif kind == "dir":
+        # A new directory: watch it, and take any files already in it
+        try:
+          self._inotify.add_tree(path)
+        except OSError:
+          self._rescan = True
+        for found in corpus.find_annotation_files(path, self.pattern):
+          written.add(found)
+          removed.discard(found)
+      elif fnmatch.fnmatch(os.path.basename(path), self.pattern):
+        if kind == "written":
+          written.add(path)
+          removed.discard(path)
+        else:
+          removed.add(path)
+          written.discard(path)
+    return written, removed
+
+
+class _Inotify(object):
+  """
+  The few inotify calls needed by Watcher, through ctypes, so that there is nothing to install
+  """
+  IN_CLOSE_WRITE = 0x8
+  IN_MOVED_FROM = 0x40
+  IN_MOVED_TO = 0x80
+  IN_CREATE = 0x100
+  IN_DELETE = 0x200
+  IN_Q_OVERFLOW = 0x4000
+  IN_ISDIR = 0x40000000
+  MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+  EVENT = struct.Struct("iIII")
+
+  def __init__(self):
+    name = ctypes.util.find_library("c")
+    libc = ctypes.CDLL(name, use_errno=True)
+    if not hasattr(libc, "inotify_init1"):
+      raise OSError(errno.ENOSYS, "inotify is not available")
+    self._libc = libc
+    self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    if self.fd < 0:
+      raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+    # {watch descriptor: directory}
+    self.dirs = {}
+
+  def close(self):
+    if self.fd >= 0:
+      os.close(self.fd)
+      self.fd = -1
+
+  def add_tree(self, root):
+    for dirpath, _, _ in os.walk(root):
+      wd = self._libc.inotify_add_watch(self.fd, os.fsencode(dirpath), self.MASK)
+      if wd < 0:
+        raise OSError(ctypes.get_errno(), "inotify_add_watch failed for %s" % dirpath)
+      self.dirs[wd] = dirpath
+
+  def read_events(self, timeout):
+    """
+    Waits up to timeout seconds for events, and reads all the queued ones
+
+    Return: a list of (kind, path), where kind is "written", "removed", "dir" for a new directory,
+    or "overflow" when events were lost
+    """
+    events = []
+    ready, _, _ = select.select([self.fd], [], [], timeout)
+    while ready:
+      try:
+        data = os.read(self.fd, 65536)
+      except BlockingIOError:
+        break
+      offset = 0
+      while offset < len(data):
+        wd, mask, _, length = self.EVENT.unpack_from(data, offset)
+        offset += self.EVENT.size
+        name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+        offset += length
+        if mask & self.IN_Q_OVERFLOW:
+          events.append(("overflow", None))
+          continue
+        if wd not in self.dirs:
+          continue
+        path = os.path.join(self.dirs[wd], name)
+        if mask & self.IN_ISDIR:
+          if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+            events.append(("dir", path))
+          elif mask & self.IN_MOVED_FROM:
+            # The files under it are gone from where they were
+            events.append(("overflow", None))
+        elif mask & (self.IN_CLOSE_WRITE | self.IN_MOVED_TO):
+          events.append(("written", path))
+        elif mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+          events.append(("removed", path))
+    return events
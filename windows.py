@@ -0,0 +1,210 @@
+"""
+Fixed-size, overlapping windows over the text of an annotation_text.Document, for models that take
+a bounded input, with the annotations that fall in each, and the merging of predictions made on windows
+back into offsets of the note.
+
+Windows are yielded one at a time as the text is walked, and the entities of each are found through the
+span index of the annotation Document (Document.query with span_within), so that making a window
+costs a bisection and the annotations in it, not a scan of the note:
+
+  predictions = []
+  for window in windows.iter_windows(text_doc, 256, overlap=32, unit="token", sections=True):
+    predictions.append((window, model(window.tokens())))
+  spans = windows.merge_predictions(predictions)
+"""
+
+from bisect import bisect_left, insort
+
+UNITS = ("char", "token")
+
+class Window(object):
+  """
+  The text from start to end, character offsets into the note, of a section if section_id is not None.
+
+  entities: the entities all of whose spans are inside the window, in document order
+  relations: the relations between those entities only
+  """
+  def __init__(self, document, index, start, end, section_id=None):
+    self.document = document
+    self.index = index
+    self.start = start
+    self.end = end
+    self.section_id = section_id
+    self.entities = []
+    self.relations = []
+
+  def __repr__(self):
+    return "Window(%d, %d, %d)" % (self.index, self.start, self.end)
+
+  @property
+  def text(self):
+    return self.document.raw.find_string_by_span((self.start, self.end))
+
+  def to_window(self, span):
+    """
+    Return: span, offsets into the note, as offsets into the text of the window
+    """
+    return (span[0] - self.start, span[1] - self.start)
+
+  def to_document(self, span):
+    """
+    Return: span, offsets into the text of the window, as offsets into the note
+    """
+    return (span[0] + self.start, span[1] + self.start)
+
+  def entity_spans(self, entity):
+    return [self.to_window(span) for span in entity.spans]
+
+  def tokens(self):
+    """
+    Return: a list of (token, (start, end)) of the tokens of the raw text in the window, with offsets into the window
+    """
+    raw = self.document.raw
+    tokens = raw.span_to_tokens((self.start, self.end))
+    if tokens is None:
+      return []
+    return [(raw.tokens[t], self.to_window((raw.token_starts[t], raw.token_ends[t]))) for t in range(*tokens)\
+            if self.start <= raw.token_starts[t] and raw.token_ends[t] <= self.end]
+
+
+def iter_windows(text_doc, size, overlap=0, unit="char", align_tokens=True, sections=False, doc_id=None):
+  """
+  Cuts the text of text_doc into windows of at most size units, each starting overlap units before the end
+  of the one before.
+
+  unit: "char" to count characters, or "token" to count the tokens of raw_text.Document.tokenize,
+        with windows from the start of a token to the end of one
+  align_tokens: with "char", end windows before a token they would cut, and start them at the start of one,
+                unless a single token is longer than size
+  sections: cut each section of text_doc on its own, leaving out the section marker lines,
+            rather than the whole text
+  doc_id: the document the raw text is of, for annotation files spanning several
+
+  Yields: Windows, in the order of the text
+  """
+  if unit not in UNITS:
+    raise ValueError("unit must be one of %s, not %r" % (", ".join(UNITS), unit))
+  if not 0 <= overlap < size:
+    raise ValueError("overlap must be at least 0 and less than size (%r), not %r" % (size, overlap))
+  raw = text_doc.raw
+  if sections and text_doc.sections:
+    regions = sorted((section.content_start, section.content_end, section.id) for section in text_doc.sections)
+  else:
+    regions = [(0, len(raw.text), None)]
+
+  index = 0
+  for region_start, region_end, section_id in regions:
+    if unit == "token":
+      spans = _token_windows(raw, region_start, region_end, size, overlap)
+    else:
+      spans = _char_windows(raw, region_start, region_end, size, overlap, align_tokens)
+    for start, end in spans:
+      window = Window(text_doc, index, start, end, section_id)
+      if text_doc.annotation is not None:
+        _add_annotations(window, text_doc.annotation, doc_id)
+      index += 1
+      yield window
+
+def merge_predictions(predictions):
+  """
+  predictions: an iterable of (Window, list of (start, end, label)), with offsets into the text of the window
+  and hashable labels, such as the entity types a model tagged in each window
+
+  The predictions are moved to offsets into the note. One predicted in several windows is kept once.
+  Where predictions of different windows overlap otherwise, as they may in the overlap of two windows,
+  the one farthest from the edges of its window, which had the most context, is kept.
+
+  Return: a sorted list of (start, end, label), with offsets into the note
+  """
+  found = {}
+  for window, window_predictions in predictions:
+    for start, end, label in window_predictions:
+      start, end = window.to_document((start, end))
+      margin = min(start - window.start, window.end - end)
+      key = (start, end, label)
+      if key not in found or margin > found[key][0]:
+        found[key] = (margin, window.index)
+
+  # Sorted (start, end, window index) of the predictions kept so far
+  kept = []
+  longest = 0
+  merged = []
+  for (start, end, label), (margin, window_index) in sorted(found.items(), key=lambda item: (-item[1][0], item[0][:2], item[1][1])):
+    i = bisect_left(kept, (end,))
+    conflict = False
+    while i > 0 and kept[i - 1][0] >= start - longest:
+      i -= 1
+      kept_start, kept_end, kept_window = kept[i]
+      if kept_window != window_index and kept_start < end and start < kept_end:
+        conflict = True
+        break
+    if not conflict:
+      insort(kept, (start, end, window_index))
+      longest = max(longest, end - start)
+      merged.append((start, end, label))
+  return sorted(merged, key=lambda prediction: prediction[:2])
+
+
+def _token_windows(raw, region_start, region_end, size, overlap):
+  tokens = raw.span_to_tokens((region_start, region_end))
+  if tokens is None:
+    return
+  first, stop = tokens
+  # Tokens sticking out of the region are left out
+  if raw.token_starts[first] < region_start:
+    first += 1
+  if stop > first and raw.token_ends[stop - 1] > region_end:
+    stop -= 1
+  i = first
+  while i < stop:
+    j = min(i + size, stop)
+    yield (raw.token_starts[i], raw.token_ends[j - 1])
+    if j == stop:
+      break
+    i = j - overlap
+
+def _char_windows(raw, region_start, region_end, size, overlap, align_tokens):
+  start = region_start
+  last_end = None
+  while start < region_end:
+    end = _char_window_end(raw, start, region_end, size, align_tokens)
+    if last_end is not None and end <= last_end:
+      # The token after the window before does not fit after the overlap, so this window starts where that one ended
+      start = last_end
+      end = _char_window_end(raw, start, region_end, size, align_tokens)
+    yield (start, end)
+    if end == region_end:
+      break
+    last_end = end
+    next_start = end - overlap
+    if align_tokens:
+      # Back to the start of the token next_start is in, or else on to the next token that starts before end
+      token = raw.char_to_token(next_start)
+      if token is None or raw.token_starts[token] <= start:
+        tokens = raw.span_to_tokens((next_start, end))
+        token = None
+        if tokens is not None:
+          token = tokens[0] if raw.token_starts[tokens[0]] >= next_start else tokens[0] + 1
+          if token >= tokens[1] or raw.token_starts[token] <= start:
+            token = None
+      next_start = raw.token_starts[token] if token is not None else end
+    start = max(next_start, start + 1)
+
+def _char_window_end(raw, start, region_end, size, align_tokens):
+  end = min(start + size, region_end)
+  if align_tokens and end < region_end:
+    token = raw.char_to_token(end)
+    if token is not None and start < raw.token_starts[token] < end:
+      end = raw.token_starts[token]
+  return end
+
+def _add_annotations(window, ann_doc, doc_id):
+  window.entities = [ent for ent in ann_doc.query(span_within=(window.start, window.end), doc_id=doc_id)\
+                     if all(window.start <= start and end <= window.end for start, end in ent.spans)]
+  ids = set(ent.id for ent in window.entities)
+  relations = {}
+  for ent in window.entities:
+    for rel in ann_doc.get_relations_with_entity(ent.id):
+      if rel.id not in relations and all(ent_id in ids for ent_id in rel.entity_ids()):
+        relations[rel.id] = rel
+  window.relations = list(relations.values())